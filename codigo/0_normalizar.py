@@ -1,6 +1,11 @@
 import os
 import glob
-import subprocess
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import traza
+from utils.decodificador import FS_SALIDA, convertir_a_wav, decodificar_a_memoria
+from utils.manifiesto import DIR_DATA, Manifiesto, ruta_relativa
 
 # --- CONFIGURACIÓN DE RUTAS RELATIVAS ---
 # Base: Donde está este script (carpeta 'codigo')
@@ -15,67 +20,225 @@ DIR_DESTINO = os.path.join(BASE_DIR, "..", "data", "1_input")
 PREFIX_NOMBRE = "paciente_A"  # Ejemplo: paciente_A_1.wav
 
 
-def normalizar():
+def convertir_archivo(archivo_ogg, ruta_salida):
+    """
+    Convierte un solo OGG a WAV (mono, 44100 Hz).
+    Primero decodifica en proceso (soundfile + soxr); solo si libsndfile no
+    reconoce el formato se lanza FFMPEG.
+    Regresa (ok, mensaje) en lugar de lanzar excepciones, para que el lote
+    pueda seguir con los demás archivos.
+    """
+    try:
+        with traza.archivo("normalizar", ruta_relativa(archivo_ogg)):
+            with traza.paso("decodificar"):
+                motor = convertir_a_wav(archivo_ogg, ruta_salida)
+                traza.leido(archivo_ogg)
+                traza.escrito(ruta_salida)
+                traza.anotar(motor=motor)
+        return True, f"OK ({motor})"
+
+    except FileNotFoundError:
+        return False, "No tienes ffmpeg instalado. Ejecuta: sudo pacman -S ffmpeg"
+    except Exception as e:
+        return False, f"Falló la conversión: {e}"
+
+
+def asignar_nombres(archivos, manifiesto=None, forzar=False, reservados=()):
+    """
+    Decide el WAV de salida de cada OGG y si hay que convertirlo.
+
+    - OGG ya registrado: conserva su nombre; se omite si no cambió.
+    - OGG nuevo cuyo contenido coincide con un registro huérfano (archivo
+      renombrado): hereda ese nombre.
+    - OGG nuevo: recibe el siguiente número libre, en orden alfabético.
+      'reservados' son nombres ya prometidos que aún no están en el
+      manifiesto (p. ej. conversiones en cola del vigilante).
+
+    Regresa (trabajos, omitidos), ambas listas de (ogg, nombre, huella).
+    """
+    if manifiesto is None:
+        trabajos = [
+            (archivo_ogg, f"{PREFIX_NOMBRE}_{i + 1}.wav", None)
+            for i, archivo_ogg in enumerate(archivos)
+        ]
+        return trabajos, []
+
+    registros = manifiesto.etapa("normalizar")
+    claves_actuales = {ruta_relativa(a) for a in archivos}
+
+    # Nombres ya reservados y registros cuyo OGG ya no existe (por hash)
+    usados = set(reservados)
+    huerfanos = {}
+    for clave, reg in registros.items():
+        nombre = os.path.basename(reg["salidas"][0])
+        usados.add(nombre)
+        if clave not in claves_actuales and not os.path.exists(
+            os.path.join(DIR_DATA, clave)
+        ):
+            huella = next(iter(reg["entradas"].values()))
+            huerfanos.setdefault(huella["hash"], (clave, nombre))
+
+    def siguiente_libre():
+        n = 1
+        while f"{PREFIX_NOMBRE}_{n}.wav" in usados:
+            n += 1
+        nombre = f"{PREFIX_NOMBRE}_{n}.wav"
+        usados.add(nombre)
+        return nombre
+
+    trabajos, omitidos = [], []
+    for archivo_ogg in archivos:
+        clave = ruta_relativa(archivo_ogg)
+        reg = manifiesto.registro("normalizar", clave)
+        previa = next(iter(reg["entradas"].values())) if reg else None
+        huella = manifiesto.huella(archivo_ogg, previa)
+
+        if reg is not None:
+            nombre = os.path.basename(reg["salidas"][0])
+            ruta_salida = os.path.join(DIR_DESTINO, nombre)
+            if (
+                not forzar
+                and huella["hash"] == previa["hash"]
+                and os.path.exists(ruta_salida)
+            ):
+                # Refrescar mtime para no volver a calcular el hash
+                manifiesto.registrar(
+                    "normalizar",
+                    clave,
+                    [archivo_ogg],
+                    [ruta_salida],
+                    huellas={archivo_ogg: huella},
+                )
+                omitidos.append((archivo_ogg, nombre, huella))
+                continue
+        elif huella["hash"] in huerfanos:
+            clave_vieja, nombre = huerfanos.pop(huella["hash"])
+            del registros[clave_vieja]
+        else:
+            nombre = siguiente_libre()
+
+        trabajos.append((archivo_ogg, nombre, huella))
+
+    return trabajos, omitidos
+
+
+def normalizar(max_workers=1, incremental=True, forzar=False):
     """
-    Convierte OGG a WAV usando FFMPEG directamente.
-    Evita errores de pydub/audioop en Python 3.13.
+    Convierte OGG a WAV sin pydub (evita errores de audioop en Python 3.13).
+
+    max_workers: número de conversiones simultáneas (1 = secuencial).
+    incremental: usa data/manifiesto.json para convertir solo lo nuevo o
+    modificado y mantener estables los nombres paciente_A_N.wav.
+    forzar: reconvierte todo, pero conservando los nombres ya asignados.
+    Regresa una lista de (archivo_ogg, nombre_salida, ok, mensaje) en el
+    mismo orden que los archivos de entrada.
     """
     # 1. Crear carpeta de destino si no existe
     if not os.path.exists(DIR_DESTINO):
         os.makedirs(DIR_DESTINO)
         print(f"Carpeta creada: {DIR_DESTINO}")
 
-    # 2. Buscar archivos OGG
+    # 2. Buscar archivos OGG (ordenados para que los nombres sean reproducibles)
     patron = os.path.join(DIR_ORIGEN, "*.ogg")
-    archivos = glob.glob(patron)
+    archivos = sorted(glob.glob(patron))
 
     if not archivos:
         print(f"No encontré archivos .ogg en: {DIR_ORIGEN}")
-        return
+        return []
 
-    print(f"Procesando {len(archivos)} archivos...")
+    # 3. Asignar nombres ANTES de lanzar los trabajos:
+    # ../data/1_input/paciente_A_1.wav, paciente_A_2.wav, ...
+    # El manifiesto conserva el nombre de cada OGG ya visto, así que agregar
+    # un archivo nuevo no recorre los nombres de los anteriores.
+    manifiesto = Manifiesto() if incremental else None
+    trabajos, omitidos = asignar_nombres(archivos, manifiesto, forzar)
 
-    contador = 1
-    for archivo_ogg in archivos:
-        # Construir nombre de salida: ../data/1_input/paciente_A_1.wav
-        nombre_salida = f"{PREFIX_NOMBRE}_{contador}.wav"
-        ruta_salida = os.path.join(DIR_DESTINO, nombre_salida)
-
-        print(f" -> Convirtiendo: {os.path.basename(archivo_ogg)} ...")
-
-        # Llamada al sistema (FFmpeg)
-        # -i: entrada, -ac 1: mono, -ar 44100: sample rate
-        try:
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-y",  # -y para sobreescribir sin preguntar
-                    "-i",
-                    archivo_ogg,  # Archivo original
-                    "-ac",
-                    "1",  # Convertir a MONO (Importante para análisis)
-                    "-ar",
-                    "44100",  # Estandarizar frecuencia
-                    ruta_salida,  # Archivo final
-                ],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-
-            print(f"    [OK] Guardado en: {nombre_salida}")
-            contador += 1
-
-        except FileNotFoundError:
-            print(
-                "    [ERROR] No tienes ffmpeg instalado. Ejecuta: sudo pacman -S ffmpeg"
-            )
-            break
-        except Exception as e:
-            print(f"    [ERROR] Falló la conversión: {e}")
+    for archivo_ogg, nombre_salida, _ in omitidos:
+        print(f" -> {os.path.basename(archivo_ogg)}: sin cambios ({nombre_salida})")
+
+    resultados = {
+        archivo_ogg: (archivo_ogg, nombre_salida, True, "Sin cambios")
+        for archivo_ogg, nombre_salida, _ in omitidos
+    }
+
+    if not trabajos:
+        print("Nada nuevo que convertir.")
+        if manifiesto is not None:
+            manifiesto.guardar()
+        return [resultados[a] for a in archivos]
+
+    max_workers = max(1, int(max_workers))
+    print(f"Procesando {len(trabajos)} archivos ({max_workers} en paralelo)...")
+
+    # libsndfile, soxr y ffmpeg liberan el GIL, así que basta con hilos para
+    # mantener ocupados varios núcleos.
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {
+            pool.submit(
+                convertir_archivo, archivo_ogg, os.path.join(DIR_DESTINO, nombre)
+            ): i
+            for i, (archivo_ogg, nombre, _) in enumerate(trabajos)
+        }
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            archivo_ogg, nombre_salida, huella = trabajos[i]
+            ok, mensaje = futuro.result()
+            resultados[archivo_ogg] = (archivo_ogg, nombre_salida, ok, mensaje)
+
+            if ok:
+                if manifiesto is not None:
+                    manifiesto.registrar(
+                        "normalizar",
+                        ruta_relativa(archivo_ogg),
+                        [archivo_ogg],
+                        [os.path.join(DIR_DESTINO, nombre_salida)],
+                        huellas={archivo_ogg: huella},
+                    )
+                print(
+                    f" -> {os.path.basename(archivo_ogg)}\n"
+                    f"    [OK] Guardado en: {nombre_salida}"
+                )
+            else:
+                print(f" -> {os.path.basename(archivo_ogg)}\n    [ERROR] {mensaje}")
+
+    if manifiesto is not None:
+        manifiesto.guardar()
+
+    resultados = [resultados[a] for a in archivos]
+    errores = sum(1 for r in resultados if not r[2])
+    print(
+        f"Resumen: {len(trabajos) - errores} convertidos, "
+        f"{len(omitidos)} sin cambios, {errores} con error."
+    )
+    return resultados
+
+
+def normalizar_en_memoria(archivo):
+    """
+    Etapa 0 para un solo archivo SIN escribir WAV: regresa (datos, 44100)
+    con el audio mono listo para la siguiente etapa.
+    """
+    return decodificar_a_memoria(archivo), FS_SALIDA
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Etapa 0: OGG -> WAV mono 44.1 kHz")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Conversiones simultáneas (default: número de núcleos)",
+    )
+    parser.add_argument(
+        "--forzar",
+        action="store_true",
+        help="Reconvertir aunque el manifiesto diga que no hubo cambios",
+    )
+    traza.agregar_argumentos(parser)
+    args = parser.parse_args()
+    traza.configurar_desde_args(args)
+
     print("--- INICIO DE NORMALIZACIÓN (ETAPA 0) ---")
-    normalizar()
+    normalizar(max_workers=args.jobs, forzar=args.forzar)
     print("--- FIN ---")
@@ -1,9 +1,25 @@
 import numpy as np
+import scipy.fft
 import scipy.signal
 import soundfile as sf
 import os
-import subprocess
 import sys
+import argparse
+import glob
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+
+from utils import cache_espectral, exportador, traza, vad, wav_mmap, wiener
+from utils.manifiesto import Manifiesto, ruta_relativa
+from utils.precision import (
+    agregar_argumentos,
+    configurar_desde_args,
+    dtype_real,
+    fft_workers,
+    precision,
+    sesion_fft,
+    usar_vad,
+)
 
 # --- CONFIGURACIÓN DE RUTAS RELATIVAS ---
 BASE_DIR = os.path.dirname(
@@ -15,91 +31,614 @@ DATA_DIR = "../data"
 INPUT_DIR = os.path.join(BASE_DIR, DATA_DIR, "1_input")  # Ruta actualizada
 OUTPUT_DIR = os.path.join(BASE_DIR, DATA_DIR, "2_output")  # Ruta actualizada
 
+# Parámetros de la STFT y del filtro de Wiener
+NPERSEG = 2048
+NOVERLAP = 1536
+ALPHA = 2.0  # Factor de sobre-sustracción del ruido
+STREAM_BLOCK_FRAMES = 64  # Tramas STFT por lote en modo streaming
+NOISE_MODES = ("percentile", "adaptive")  # Estimadores de ruido disponibles
+# Con --vad: las pausas no pasan por Wiener, solo se atenúan; el ruido se
+# mide en ellas si suman al menos RUIDO_MIN_SEGUNDOS
+GANANCIA_PAUSA_DB = -30
+RUIDO_MIN_SEGUNDOS = 0.5
+AUDIO_EXTENSIONS = (".wav", ".ogg", ".flac")
+
 
 def load_audio(filepath):
-    """Carga el audio directamente a un array de numpy usando soundfile."""
-    try:
-        data, samplerate = sf.read(filepath)
-    except Exception as e:
-        print(f"Error cargando archivo: {e}")
-        return None, None
+    """
+    Carga el audio. Los WAV PCM se abren por memory-map (vista perezosa:
+    la caché espectral los convierte solo si tiene que calcular); el resto
+    se lee completo con soundfile.
+    """
+    with traza.paso("cargar"):
+        traza.leido(filepath)
+        senal = wav_mmap.abrir(filepath)
+        if senal is not None:
+            return senal, senal.samplerate
+        try:
+            data, samplerate = sf.read(filepath, dtype=precision())
+        except Exception as e:
+            traza.avisar(f"[ERROR] Error cargando archivo: {e}")
+            return None, None
 
-    # Si es estéreo, convertir a mono
-    if data.ndim > 1:
-        data = np.mean(data, axis=1)
+        # Si es estéreo, convertir a mono
+        if data.ndim > 1:
+            data = np.mean(data, axis=1)
+        traza.arreglo("audio", data)
 
-    return data, samplerate
+        return data, samplerate
 
 
 def save_audio_wav(output_path, samples, sample_rate):
     """Guarda el array de numpy como WAV."""
     samples = np.clip(samples, -1.0, 1.0)
-    print(f" -> Exportando WAV a {os.path.basename(output_path)}...")
-    sf.write(output_path, samples, sample_rate)
+    with traza.paso(
+        "exportar_wav", f" -> Exportando WAV a {os.path.basename(output_path)}..."
+    ):
+        sf.write(output_path, samples, sample_rate)
+        traza.escrito(output_path)
 
 
 def convert_to_mp3(wav_path, mp3_path):
-    """Convierte WAV a MP3 usando el ffmpeg del sistema."""
-    print(f" -> Exportando MP3 a {os.path.basename(mp3_path)}...")
-    try:
-        subprocess.run(
-            ["ffmpeg", "-y", "-i", wav_path, "-b:a", "192k", mp3_path],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-    except FileNotFoundError:
-        print(" [ERROR] ffmpeg no encontrado. Instálalo con: sudo pacman -S ffmpeg")
-    except Exception as e:
-        print(f" [ERROR] Falló conversión MP3: {e}")
+    """Convierte WAV a MP3 mandando las muestras a ffmpeg por pipe."""
+    with traza.paso(
+        "exportar_mp3", f" -> Exportando MP3 a {os.path.basename(mp3_path)}..."
+    ):
+        error = exportador.wav_a_mp3(wav_path, mp3_path)
+        traza.leido(wav_path)
+        traza.escrito(mp3_path)
+    if error:
+        traza.avisar(f" [ERROR] Falló conversión MP3: {error}")
+
+
+def export_wav_mp3(wav_path, mp3_path, samples, sample_rate):
+    """
+    WAV + MP3 en una sola invocación de ffmpeg (muestras por stdin).
+    Regresa None si todo salió bien o el mensaje de error.
+    """
+    with traza.paso(
+        "exportar",
+        f" -> Exportando WAV + MP3 a {os.path.basename(wav_path)}"
+        f" / {os.path.basename(mp3_path)}...",
+    ):
+        error = exportador.exportar(samples, sample_rate, wav_path, mp3_path)
+        traza.escrito(wav_path, mp3_path)
+    return error  # Lo reporta procesar_archivo (sin MP3 no es fatal)
+
+
+def wiener_gain(psd_signal_noisy, psd_noise, alpha=ALPHA):
+    """
+    Ganancia de Wiener con sobre-sustracción (alpha) del ruido estimado.
+    Fórmula de referencia: el filtrado usa utils.wiener.aplicar_ganancia,
+    que calcula lo mismo sin arreglos intermedios.
+    """
+    estimated_clean_psd = np.maximum(psd_signal_noisy - (alpha * psd_noise), 0)
+    return estimated_clean_psd / (estimated_clean_psd + psd_noise + 1e-10)
+
+
+class AdaptiveNoiseTracker:
+    """
+    Estimador de ruido de UNA pasada (MCRA: promediado recursivo controlado
+    por mínimos, Cohen & Berdugo).
+
+    Por cada trama y cada frecuencia:
+      1. Suaviza el periodograma:      S = as*S + (1-as)*|Y|^2
+      2. Busca su mínimo en una ventana deslizante de ~2*window tramas
+      3. Probabilidad de voz:          p = ap*p + (1-ap)*[S/S_min > delta]
+      4. Actualiza el ruido solo donde probablemente no hay voz:
+         a = ad + (1-ad)*p;  N = min(a*N + (1-a)*|Y|^2, delta*S_min)
+
+    No necesita ver el archivo completo, así que sigue ruido que cambia
+    durante la grabación y permite procesar en streaming.
+    window=125 tramas son ~1.5 s con hop de 512 muestras a 44.1 kHz.
+    Se inicializa con la primera trama (las notas de voz casi siempre
+    empiezan en silencio); si la grabación arranca hablando, esa voz se
+    atenúa de más hasta que aparece la primera pausa.
+    """
+
+    def __init__(self, alpha_s=0.8, alpha_d=0.95, alpha_p=0.2, delta=5.0, window=125):
+        self.alpha_s = alpha_s
+        self.alpha_d = alpha_d
+        self.alpha_p = alpha_p
+        self.delta = delta
+        self.window = window
+        self.noise_psd = None
+
+    def update(self, psd_frames):
+        """
+        psd_frames: (m, n_freqs) con |Y|^2 de m tramas consecutivas.
+        Regresa (m, n_freqs) con la PSD de ruido estimada para cada trama.
+        """
+        out = np.empty_like(psd_frames)
+        for i, psd in enumerate(psd_frames):
+            if self.noise_psd is None:
+                self.noise_psd = psd.copy()
+                self._smooth = psd.copy()
+                self._minimum = psd.copy()
+                self._candidate = psd.copy()
+                self._presence = np.zeros_like(psd)
+                self._count = 0
+
+            self._smooth = self.alpha_s * self._smooth + (1 - self.alpha_s) * psd
+
+            # Mínimo de estadística por ventanas (Martin): cada 'window'
+            # tramas el mínimo se reinicia con el candidato acumulado
+            self._minimum = np.minimum(self._minimum, self._smooth)
+            self._candidate = np.minimum(self._candidate, self._smooth)
+            self._count += 1
+            if self._count == self.window:
+                self._minimum = np.minimum(self._candidate, self._smooth)
+                self._candidate = self._smooth.copy()
+                self._count = 0
+
+            speech = self._smooth > self.delta * (self._minimum + 1e-20)
+            self._presence = self.alpha_p * self._presence + (1 - self.alpha_p) * speech
+
+            alpha = self.alpha_d + (1 - self.alpha_d) * self._presence
+            self.noise_psd = alpha * self.noise_psd + (1 - alpha) * psd
+            # El ruido nunca queda por encima del umbral de voz; así se
+            # recupera rápido si la grabación empezó hablando
+            self.noise_psd = np.minimum(self.noise_psd, self.delta * self._minimum)
+            out[i] = self.noise_psd
+        return out
+
+
+def filtrar_por_voz(Zxx, psd_noise, voz, alpha=ALPHA):
+    """
+    Wiener solo en las tramas con voz (columnas de Zxx con voz[j] True);
+    las pausas se multiplican por GANANCIA_PAUSA_DB, sin calcular la
+    ganancia. psd_noise: (Frecuencias, 1) o (Frecuencias, Tiempo).
+    """
+    salida = Zxx if Zxx.flags.writeable else np.empty_like(Zxx)
+    pausa = dtype_real()(10 ** (GANANCIA_PAUSA_DB / 20))
+    por_trama = psd_noise.shape[1] > 1
+    for a, b, activo in vad.rangos(voz):
+        if activo:
+            ruido = psd_noise[:, a:b] if por_trama else psd_noise
+            wiener.aplicar_ganancia(Zxx[:, a:b], ruido, alpha, salida=salida[:, a:b])
+        else:
+            np.multiply(Zxx[:, a:b], pausa, out=salida[:, a:b])
+    return salida
+
 
+def _hay_ruido_en_pausas(segmentos, n_samples, sample_rate):
+    pausas = n_samples * (1 - vad.fraccion(segmentos, n_samples))
+    return pausas >= RUIDO_MIN_SEGUNDOS * sample_rate
 
-def denoise_audio(audio_data, sample_rate):
+
+def denoise_audio(audio_data, sample_rate, noise_mode="percentile"):
     """
     Algoritmo de reducción de ruido (Dos Pasos).
+    noise_mode="adaptive" estima el ruido trama a trama en una sola pasada
+    (AdaptiveNoiseTracker) en lugar del percentil 10 global.
+    Con --vad (utils.vad) el perfil de ruido sale de las pausas y solo las
+    tramas con voz pasan por Wiener.
     """
-    print(" -> Procesando: Analizando perfil de ruido y filtrando...")
+    nperseg = NPERSEG
+    noverlap = NOVERLAP
+    audio_data = wav_mmap.como_senal(audio_data)
+    voz = None
+    if usar_vad():
+        with traza.paso("vad"):
+            segmentos = vad.segmentos(audio_data, sample_rate)
+            traza.anotar(fraccion_voz=vad.fraccion(segmentos, len(audio_data)))
+    with traza.paso(
+        "stft", " -> Procesando: Analizando perfil de ruido y filtrando..."
+    ):
+        # La STFT sale de la caché espectral si este audio ya se analizó
+        # (3_tomie usa exactamente la misma: 2048 / 1536)
+        freqs, times, Zxx = cache_espectral.stft(
+            audio_data, sample_rate, nperseg, noverlap
+        )
+        traza.arreglo("Zxx", Zxx)
+        if usar_vad():
+            # Centro de cada trama en muestras (boundary='zeros' de scipy)
+            voz = vad.mascara(segmentos, np.arange(len(times)) * (nperseg - noverlap))
+
+    with traza.paso("wiener", kernel="numba" if wiener.usa_numba() else "numpy"):
+        # Sin separar magnitud y fase: Zxx * ganancia(|Zxx|²) en una pasada
+        # (utils.wiener), sobre el mismo Zxx si no viene de la caché
+        psd_signal_noisy = wiener.potencia(Zxx)
+
+        if noise_mode == "adaptive":
+            # Ruido por trama, (Frecuencias, Tiempo) como Zxx
+            psd_noise = AdaptiveNoiseTracker().update(psd_signal_noisy.T).T
+        elif voz is not None and _hay_ruido_en_pausas(
+            segmentos, len(audio_data), sample_rate
+        ):
+            # --- PASO 1 (con VAD): el ruido es lo que suena en las pausas ---
+            noise_profile = np.mean(np.abs(Zxx[:, ~voz]), axis=1, keepdims=True)
+            psd_noise = noise_profile**2
+        else:
+            # --- PASO 1: PERFILADO DE RUIDO ---
+            frame_energy = np.sum(psd_signal_noisy, axis=0)
+            # Asumimos que el 10% con menos energía es ruido
+            threshold = np.percentile(frame_energy, 10)
+            noise_indices = np.where(frame_energy < threshold)[0]
+
+            if len(noise_indices) == 0:
+                noise_frames = Zxx
+            else:
+                noise_frames = Zxx[:, noise_indices]
+            noise_profile = np.mean(np.abs(noise_frames), axis=1, keepdims=True)
+            psd_noise = noise_profile**2
+        del psd_signal_noisy
+
+        # --- PASO 2: FILTRO WIENER ---
+        if voz is None:
+            Zxx_clean = wiener.aplicar_ganancia(Zxx, psd_noise, ALPHA)
+        else:
+            Zxx_clean = filtrar_por_voz(Zxx, psd_noise, voz)
+
+    with traza.paso("istft"), sesion_fft():
+        _, clean_signal = scipy.signal.istft(
+            Zxx_clean, fs=sample_rate, nperseg=nperseg, noverlap=noverlap
+        )
+        traza.arreglo("salida", clean_signal)
 
-    nperseg = 2048
-    noverlap = 1536
-    freqs, times, Zxx = scipy.signal.stft(
-        audio_data, fs=sample_rate, nperseg=nperseg, noverlap=noverlap
-    )
+    return clean_signal
 
-    magnitude = np.abs(Zxx)
-    phase = np.angle(Zxx)
 
-    # --- PASO 1: PERFILADO DE RUIDO ---
-    frame_energy = np.sum(magnitude**2, axis=0)
-    # Asumimos que el 10% con menos energía es ruido
-    threshold = np.percentile(frame_energy, 10)
-    noise_indices = np.where(frame_energy < threshold)[0]
+# --- MODO STREAMING (memoria acotada) ---
+# Reproduce exactamente las tramas de scipy.signal.stft (ventana Hann,
+# boundary='zeros', padded=True) pero leyendo el archivo con sf.blocks, y
+# reconstruye con overlap-add escribiendo la salida conforme se completa.
+# Se conserva la escala 1/sum(ventana) de scipy porque el 1e-10 de la
+# ganancia de Wiener sí depende de la escala del espectro.
 
-    if len(noise_indices) == 0:
-        noise_profile = np.mean(magnitude, axis=1, keepdims=True)
-    else:
-        noise_frames = magnitude[:, noise_indices]
-        noise_profile = np.mean(noise_frames, axis=1, keepdims=True)
 
-    # --- PASO 2: FILTRO WIENER ---
-    psd_noise = noise_profile**2
-    psd_signal_noisy = magnitude**2
+def _stream_frames(filepath, nperseg, noverlap, block_frames):
+    """
+    Genera lotes de tramas ventaneadas de forma (m, nperseg).
+    Solo mantiene en memoria ~block_frames tramas a la vez.
+    """
+    hop = nperseg - noverlap
+    dtype = dtype_real()
+    window = scipy.signal.get_window("hann", nperseg).astype(dtype)
+
+    n_samples = sf.info(filepath).frames
+    pad = nperseg // 2
+    total = n_samples + 2 * pad
+    total += (-(total - nperseg) % hop) % nperseg  # padded=True de scipy
+
+    def padded_chunks():
+        yield np.zeros(pad, dtype=dtype)
+        for block in sf.blocks(
+            filepath, blocksize=hop * block_frames, dtype=precision(), always_2d=True
+        ):
+            yield block.mean(axis=1)
+        yield np.zeros(total - n_samples - pad, dtype=dtype)
+
+    buffer = np.zeros(0, dtype=dtype)
+    for chunk in padded_chunks():
+        buffer = np.concatenate([buffer, chunk])
+        if len(buffer) < nperseg:
+            continue
+        count = (len(buffer) - nperseg) // hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, nperseg)[::hop]
+        yield frames[:count] * window
+        buffer = buffer[count * hop :]
 
-    alpha = 2.0
-    estimated_clean_psd = np.maximum(psd_signal_noisy - (alpha * psd_noise), 0)
-    wiener_filter = estimated_clean_psd / (estimated_clean_psd + psd_noise + 1e-10)
 
-    clean_magnitude = magnitude * wiener_filter
-    Zxx_clean = clean_magnitude * np.exp(1j * phase)
+def _stream_spectra(
+    filepath, nperseg=NPERSEG, noverlap=NOVERLAP, block_frames=STREAM_BLOCK_FRAMES
+):
+    """Lotes de espectros (m, nperseg//2 + 1), uno por trama."""
+    scale = dtype_real()(scipy.signal.get_window("hann", nperseg).sum())
+    for frames in _stream_frames(filepath, nperseg, noverlap, block_frames):
+        yield scipy.fft.rfft(frames, axis=1, workers=fft_workers()) / scale
+
+
+def _stream_istft_write(spectra, out_file, n_samples, nperseg, noverlap):
+    """
+    Overlap-add incremental equivalente a scipy.signal.istft (boundary=True).
+    Cada lote libera las muestras que ya no recibirán más tramas y las
+    escribe en out_file, recortando el relleno inicial y final.
+    """
+    hop = nperseg - noverlap
+    dtype = dtype_real()
+    window = scipy.signal.get_window("hann", nperseg).astype(dtype)
+    win_sq = window**2
+
+    acc = np.zeros(nperseg, dtype=dtype)
+    norm = np.zeros(nperseg, dtype=dtype)
+    pos = 0  # Posición (en la señal con relleno) de acc[0]
+    start, stop = nperseg // 2, nperseg // 2 + n_samples
+
+    def emit(samples, pos):
+        lo, hi = max(start, pos), min(stop, pos + len(samples))
+        if hi > lo:
+            out_file.write(np.clip(samples[lo - pos : hi - pos], -1.0, 1.0))
+
+    for Z in spectra:
+        frames = (
+            scipy.fft.irfft(Z * window.sum(), n=nperseg, axis=1, workers=fft_workers())
+            * window
+        )
+        m = frames.shape[0]
+        needed = (m - 1) * hop + nperseg
+        if len(acc) < needed:
+            acc = np.concatenate([acc, np.zeros(needed - len(acc), dtype=dtype)])
+            norm = np.concatenate([norm, np.zeros(needed - len(norm), dtype=dtype)])
+        for i in range(m):
+            acc[i * hop : i * hop + nperseg] += frames[i]
+            norm[i * hop : i * hop + nperseg] += win_sq
+
+        # Las primeras m*hop muestras ya no cambian (la siguiente trama
+        # empieza justo ahí)
+        done = m * hop
+        ready = acc[:done] / np.where(norm[:done] > 1e-10, norm[:done], 1.0)
+        emit(ready, pos)
+        pos += done
+        acc, norm = acc[done:], norm[done:]
+
+    tail = acc / np.where(norm > 1e-10, norm, 1.0)
+    emit(tail, pos)
+
+
+def _write_streaming_output(spectra, output_path, mp3_path, info, nperseg, noverlap):
+    """
+    Reconstruye y escribe. Con mp3_path, las muestras van por pipe a un
+    solo ffmpeg que genera WAV y MP3 a la vez; sin él, directo a WAV.
+    Regresa None si todo salió bien o el mensaje de error de ffmpeg.
+    """
+    if mp3_path is None:
+        with traza.paso(
+            "filtrar_exportar",
+            f" -> Exportando WAV a {os.path.basename(output_path)}...",
+        ), sf.SoundFile(
+            output_path, "w", samplerate=info.samplerate, channels=1
+        ) as out_file:
+            _stream_istft_write(spectra, out_file, info.frames, nperseg, noverlap)
+        traza.escrito(output_path)
+        return None
+
+    with traza.paso(
+        "filtrar_exportar",
+        f" -> Exportando WAV a {os.path.basename(output_path)}...\n"
+        f" -> Exportando MP3 a {os.path.basename(mp3_path)}...",
+    ):
+        with exportador.EscritorFfmpeg(info.samplerate, output_path, mp3_path) as out:
+            _stream_istft_write(spectra, out, info.frames, nperseg, noverlap)
+        traza.escrito(output_path, mp3_path)
+    return out.error  # Lo reporta procesar_archivo
+
+
+def denoise_file_streaming(
+    input_path,
+    output_path,
+    nperseg=NPERSEG,
+    noverlap=NOVERLAP,
+    block_frames=STREAM_BLOCK_FRAMES,
+    noise_mode="percentile",
+    mp3_path=None,
+):
+    """
+    Versión de memoria acotada de denoise_audio para grabaciones largas.
+    Mismo algoritmo (percentil 10 de energía + Wiener), hecho en tres
+    pasadas de lectura sobre el archivo:
+      1. Energía por trama (solo un escalar por trama en memoria).
+      2. Perfil de ruido con las tramas bajo el percentil 10.
+      3. Filtrado + ISTFT por overlap-add, escribiendo WAV incrementalmente.
+    Si se da mp3_path, el MP3 sale del mismo pipe que el WAV.
+    Con noise_mode="adaptive" las pasadas 1 y 2 desaparecen: el ruido se
+    estima trama a trama y todo se hace en una sola lectura. Con --vad la
+    pasada 1 también sobra: el ruido se mide en las pausas del índice.
+    La salida tiene exactamente la duración de la entrada (denoise_audio
+    regresa además el relleno de la STFT).
+    Regresa None si todo salió bien o el mensaje de error de la exportación.
+    """
+    with traza.paso(
+        "abrir", " -> Procesando (streaming): Analizando perfil de ruido y filtrando..."
+    ):
+        info = sf.info(input_path)
+    hop = nperseg - noverlap
+    segmentos = None
+    if usar_vad():
+        with traza.paso("vad"):
+            segmentos = vad.indice(input_path)["segmentos"]
+
+    def spectra():
+        traza.leido(input_path)
+        return _stream_spectra(input_path, nperseg, noverlap, block_frames)
+
+    def voice(first, count):
+        """Máscara de voz de las tramas [first, first + count)."""
+        return vad.mascara(segmentos, (first + np.arange(count)) * hop)
+
+    def apply_gain(Z, noise, first):
+        """Z: (m, n_freqs). noise: (n_freqs,) o (m, n_freqs)."""
+        if segmentos is None:
+            return wiener.aplicar_ganancia(Z, noise, ALPHA)
+        noise = noise.T if noise.ndim == 2 else noise[:, np.newaxis]
+        return filtrar_por_voz(Z.T, noise, voice(first, len(Z))).T
+
+    if noise_mode == "adaptive":
+        tracker = AdaptiveNoiseTracker()
+
+        def filtered():
+            idx = 0
+            for Z in spectra():
+                psd = wiener.potencia(Z)
+                yield apply_gain(Z, tracker.update(psd), idx)
+                idx += len(Z)
+
+        return _write_streaming_output(
+            filtered(), output_path, mp3_path, info, nperseg, noverlap
+        )
+
+    # Con VAD el ruido es lo que suena en las pausas: sin pasada 1
+    pauses = segmentos is not None and _hay_ruido_en_pausas(
+        segmentos, info.frames, info.samplerate
+    )
+
+    # --- PASADA 1: ENERGÍA POR TRAMA ---
+    if not pauses:
+        with traza.paso("energia"):
+            frame_energy = np.concatenate(
+                [np.sum(np.abs(Z) ** 2, axis=1) for Z in spectra()]
+            )
+            threshold = np.percentile(frame_energy, 10)
+
+    # --- PASADA 2: PERFIL DE RUIDO ---
+    with traza.paso("perfil_ruido"):
+        noise_sum = np.zeros(nperseg // 2 + 1, dtype=dtype_real())
+        total_sum = np.zeros(nperseg // 2 + 1, dtype=dtype_real())
+        n_noise = 0
+        idx = 0
+        for Z in spectra():
+            magnitude = np.abs(Z)
+            if pauses:
+                is_noise = ~voice(idx, len(Z))
+            else:
+                is_noise = frame_energy[idx : idx + len(Z)] < threshold
+            noise_sum += magnitude[is_noise].sum(axis=0)
+            total_sum += magnitude.sum(axis=0)
+            n_noise += int(is_noise.sum())
+            idx += len(Z)
+
+    if n_noise == 0:
+        noise_profile = total_sum / idx
+    else:
+        noise_profile = noise_sum / n_noise
+    psd_noise = noise_profile**2
+
+    # --- PASADA 3: FILTRO WIENER + RECONSTRUCCIÓN ---
+    def filtered():
+        idx = 0
+        for Z in spectra():
+            yield apply_gain(Z, psd_noise, idx)
+            idx += len(Z)
 
-    _, clean_signal = scipy.signal.istft(
-        Zxx_clean, fs=sample_rate, nperseg=nperseg, noverlap=noverlap
+    return _write_streaming_output(
+        filtered(), output_path, mp3_path, info, nperseg, noverlap
     )
 
-    return clean_signal
+
+def manifest_params(noise_mode):
+    """Parámetros que, si cambian, obligan a reprocesar un archivo."""
+    params = {"noise_mode": noise_mode, "precision": precision()}
+    if usar_vad():
+        params["vad"] = vad.VERSION
+    return params
+
+
+def output_paths(input_path):
+    """Rutas de salida (WAV, MP3) que le tocan a un archivo de entrada."""
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    wav_out = os.path.join(OUTPUT_DIR, f"{base_name}_clean.wav")
+    mp3_out = os.path.join(OUTPUT_DIR, f"{base_name}_clean.mp3")
+    return wav_out, mp3_out
 
 
-def main():
+def salidas_en_disco(input_path):
+    """
+    Salidas de output_paths que existen, para el manifiesto. El MP3 es
+    opcional (sin ffmpeg solo sale el WAV): un registro sin MP3 sigue al
+    día mientras el MP3 siga sin existir.
+    """
+    return [p for p in output_paths(input_path) if os.path.exists(p)]
+
+
+def procesar_archivo(
+    input_path,
+    manifiesto=None,
+    forzar=False,
+    streaming=False,
+    noise_mode="percentile",
+    export_queue=None,
+):
+    """
+    Cadena completa para un archivo: cargar -> limpiar -> WAV -> MP3.
+    Con streaming=True se usa denoise_file_streaming (memoria constante).
+    noise_mode: "percentile" (dos pasos) o "adaptive" (una pasada).
+    export_queue: ColaExportacion para codificar en segundo plano.
+    Si se pasa un manifiesto y la entrada no cambió desde la última vez
+    (y las salidas siguen en disco), no se vuelve a procesar.
+    Regresa True si el archivo quedó procesado (ahora o antes) y False si
+    falló la carga o no se escribió el WAV; sin MP3 (p. ej. sin ffmpeg)
+    solo se avisa. Con export_queue regresa un Future
+    con ese mismo resultado, que se resuelve al terminar de codificar.
+    """
+    wav_out, mp3_out = output_paths(input_path)
+    clave = ruta_relativa(input_path)
+    params = manifest_params(noise_mode)
+
+    if (
+        manifiesto is not None
+        and not forzar
+        and manifiesto.esta_al_dia(
+            "denoiser", clave, [input_path], salidas_en_disco(input_path), params
+        )
+    ):
+        traza.avisar(
+            f" [SKIP] {os.path.basename(input_path)} no cambió desde la última vez."
+        )
+        return True
+
+    def finish(error):
+        # Éxito (y registro) si quedó el WAV; sin MP3 solo se avisa
+        name = os.path.basename(input_path)
+        if not os.path.exists(wav_out):
+            traza.avisar(f" [ERROR] No se exportó {name}: {error or 'falta el WAV'}")
+            return False
+        if error is not None or not os.path.exists(mp3_out):
+            traza.avisar(f" [AVISO] {name} quedó sin MP3: {error or 'falta el MP3'}")
+        if manifiesto is not None:
+            manifiesto.registrar(
+                "denoiser", clave, [input_path], salidas_en_disco(input_path), params
+            )
+            manifiesto.guardar()
+        print(f"¡Éxito! Procesado: {os.path.basename(input_path)}")
+        return True
+
+    # Salidas viejas fuera: tras exportar, un WAV en disco es de esta corrida
+    for ruta in (wav_out, mp3_out):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    with traza.archivo("denoiser", clave, streaming=streaming, noise_mode=noise_mode):
+        if streaming:
+            try:
+                error = denoise_file_streaming(
+                    input_path, wav_out, noise_mode=noise_mode, mp3_path=mp3_out
+                )
+            except Exception as e:
+                traza.avisar(f"[ERROR] Error procesando archivo: {e}")
+                return False
+            return finish(error)
+
+        # Cargar
+        raw_data, rate = load_audio(input_path)
+        if raw_data is None:
+            return False
+
+        # Procesar
+        clean_data = denoise_audio(raw_data, rate, noise_mode=noise_mode)
+
+        # Guardar (WAV + MP3 en un solo ffmpeg)
+        if export_queue is None:
+            return finish(export_wav_mp3(wav_out, mp3_out, clean_data, rate))
+        else:
+            # En segundo plano: el siguiente archivo se procesa mientras esto
+            # se codifica
+            with traza.paso(
+                "encolar",
+                f" -> Encolando exportación de {os.path.basename(wav_out)}...",
+            ):
+                future = export_queue.encolar(clean_data, rate, wav_out, mp3_out)
+
+            resultado = Future()
+
+            def on_done(f):
+                error = str(f.exception()) if f.exception() else f.result()
+                resultado.set_result(finish(error))
+
+            future.add_done_callback(on_done)
+            return resultado
+
+
+def main(forzar=False, streaming=False, noise_mode="percentile"):
     # Asegurar que las carpetas existan
     if not os.path.exists(INPUT_DIR):
         os.makedirs(INPUT_DIR)
@@ -118,15 +657,17 @@ def main():
 
     # Listar archivos disponibles automáticamente
     archivos = [
-        f
-        for f in os.listdir(INPUT_DIR)
-        if f.lower().endswith((".wav", ".ogg", ".flac"))
+        f for f in os.listdir(INPUT_DIR) if f.lower().endswith(AUDIO_EXTENSIONS)
     ]
 
     if not archivos:
         print(" [!] No hay archivos de audio en la carpeta 'Input'.")
         return
 
+    manifiesto = Manifiesto()
+    export_queue = exportador.ColaExportacion()
+    resultados = []  # (archivo, bool o Future de procesar_archivo)
+
     print("Archivos disponibles:")
     for i, f in enumerate(archivos):
         print(f" {i + 1}. {f}")
@@ -162,24 +703,218 @@ def main():
                 print(f"Error: No se encuentra '{user_input}' en la carpeta Input.")
                 continue
 
-        # Cargar
-        raw_data, rate = load_audio(input_path)
-        if raw_data is None:
-            continue
+        resultados.append(
+            (
+                user_input,
+                procesar_archivo(
+                    input_path,
+                    manifiesto,
+                    forzar=forzar,
+                    streaming=streaming,
+                    noise_mode=noise_mode,
+                    export_queue=export_queue,
+                ),
+            )
+        )
+        manifiesto.guardar()
 
-        # Procesar
-        clean_data = denoise_audio(raw_data, rate)
+    if export_queue.pendientes():
+        print(" -> Esperando exportaciones pendientes...")
+    export_queue.cerrar()
+    manifiesto.guardar()
 
-        # Guardar
-        base_name = os.path.splitext(user_input)[0]
-        wav_out = os.path.join(OUTPUT_DIR, f"{base_name}_clean.wav")
-        mp3_out = os.path.join(OUTPUT_DIR, f"{base_name}_clean.mp3")
+    for nombre, r in resultados:
+        if not (r.result() if isinstance(r, Future) else r):
+            print(f" [ERROR] No se pudo procesar: {nombre}")
 
-        save_audio_wav(wav_out, clean_data, rate)
-        convert_to_mp3(wav_out, mp3_out)
 
-        print(f"¡Éxito! Procesado: {user_input}")
+# --- MODO BATCH (sin input(), para cron/scheduler) ---
+
+
+def list_batch_inputs(target):
+    """Acepta un directorio (todos sus audios) o un patrón glob."""
+    if os.path.isdir(target):
+        candidates = glob.glob(os.path.join(target, "*"))
+    else:
+        candidates = glob.glob(target)
+    return sorted(
+        f
+        for f in candidates
+        if os.path.isfile(f) and f.lower().endswith(AUDIO_EXTENSIONS)
+    )
+
+
+def _batch_worker(input_path, streaming, noise_mode):
+    """Corre en un proceso hijo. Regresa un dict con el resultado."""
+    start = time.perf_counter()
+    try:
+        ok = procesar_archivo(input_path, streaming=streaming, noise_mode=noise_mode)
+        error = "" if ok else "falló la carga o la exportación del WAV"
+    except Exception as e:
+        ok, error = False, str(e)
+    try:
+        audio_seconds = sf.info(input_path).duration
+    except Exception:
+        audio_seconds = 0.0
+    return {
+        "archivo": input_path,
+        "ok": ok,
+        "error": error,
+        "segundos_audio": audio_seconds,
+        "segundos_proceso": time.perf_counter() - start,
+    }
+
+
+def print_batch_summary(results, wall_seconds):
+    """Tabla resumen + throughput del lote."""
+    name_width = max([len(os.path.basename(r["archivo"])) for r in results] + [7])
+    print("\n" + "-" * (name_width + 40))
+    print(
+        f"{'Archivo':<{name_width}}  {'Estado':<7} {'Audio(s)':>9} {'Tiempo(s)':>9} {'xRT':>6}"
+    )
+    print("-" * (name_width + 40))
+    for r in results:
+        if r.get("omitido"):
+            estado = "SKIP"
+        else:
+            estado = "OK" if r["ok"] else "ERROR"
+        xrt = (
+            r["segundos_audio"] / r["segundos_proceso"]
+            if r["segundos_proceso"] > 0
+            else 0
+        )
+        print(
+            f"{os.path.basename(r['archivo']):<{name_width}}  {estado:<7} "
+            f"{r['segundos_audio']:>9.1f} {r['segundos_proceso']:>9.2f} {xrt:>6.1f}"
+        )
+        if r["error"]:
+            print(f"    [ERROR] {r['error']}")
+    print("-" * (name_width + 40))
+
+    processed = [r for r in results if r["ok"] and not r.get("omitido")]
+    audio_total = sum(r["segundos_audio"] for r in processed)
+    print(
+        f"Procesados: {len(processed)}  "
+        f"Omitidos: {sum(1 for r in results if r.get('omitido'))}  "
+        f"Errores: {sum(1 for r in results if not r['ok'])}"
+    )
+    if wall_seconds > 0:
+        print(
+            f"Tiempo total: {wall_seconds:.2f} s  |  "
+            f"{len(processed) / wall_seconds:.2f} archivos/s  |  "
+            f"{audio_total / wall_seconds:.1f} s de audio por segundo"
+        )
+
+
+def batch_main(
+    target, workers=None, forzar=False, streaming=False, noise_mode="percentile"
+):
+    """
+    Procesa todos los archivos de 'target' en un pool de procesos
+    (load_audio -> denoise_audio -> save_audio_wav -> convert_to_mp3).
+    El manifiesto se consulta y se actualiza solo en el proceso principal.
+    Regresa la lista de resultados (mismo orden que los archivos).
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    files = list_batch_inputs(target)
+    if not files:
+        print(f" [!] No hay archivos de audio en: {target}")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    manifiesto = Manifiesto()
+    params = manifest_params(noise_mode)
+
+    results = {}
+    pending = []
+    for f in files:
+        if not forzar and manifiesto.esta_al_dia(
+            "denoiser", ruta_relativa(f), [f], salidas_en_disco(f), params
+        ):
+            results[f] = {
+                "archivo": f,
+                "ok": True,
+                "omitido": True,
+                "error": "",
+                "segundos_audio": 0.0,
+                "segundos_proceso": 0.0,
+            }
+        else:
+            pending.append(f)
+
+    print(
+        f"--- Batch: {len(pending)} por procesar, {len(results)} sin cambios, "
+        f"{workers} procesos ---"
+    )
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_batch_worker, f, streaming, noise_mode): f for f in pending
+        }
+        for future in as_completed(futures):
+            r = future.result()
+            results[r["archivo"]] = r
+            if r["ok"] and os.path.exists(output_paths(r["archivo"])[0]):
+                manifiesto.registrar(
+                    "denoiser",
+                    ruta_relativa(r["archivo"]),
+                    [r["archivo"]],
+                    salidas_en_disco(r["archivo"]),
+                    params,
+                )
+                manifiesto.guardar()
+    wall = time.perf_counter() - start
+
+    ordered = [results[f] for f in files]
+    print_batch_summary(ordered, wall)
+    return ordered
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Etapa 1: reducción de ruido")
+    parser.add_argument(
+        "--forzar",
+        action="store_true",
+        help="Procesar aunque el manifiesto diga que la entrada no cambió",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Memoria acotada: lee y escribe por bloques (grabaciones largas)",
+    )
+    parser.add_argument(
+        "--ruido",
+        choices=NOISE_MODES,
+        default="percentile",
+        help="Estimador de ruido: percentil 10 global o adaptativo de una pasada",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="RUTA",
+        help="Modo sin preguntas: directorio o patrón glob (ej. '../data/1_input/*.wav')",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos del pool en modo batch (default: número de núcleos)",
+    )
+    agregar_argumentos(parser)
+    traza.agregar_argumentos(parser)
+    args = parser.parse_args()
+    configurar_desde_args(args)
+    traza.configurar_desde_args(args)
+
+    if args.batch:
+        results = batch_main(
+            args.batch,
+            workers=args.workers,
+            forzar=args.forzar,
+            streaming=args.streaming,
+            noise_mode=args.ruido,
+        )
+        sys.exit(0 if all(r["ok"] for r in results) else 1)
+    else:
+        main(forzar=args.forzar, streaming=args.streaming, noise_mode=args.ruido)
@@ -1,9 +1,29 @@
+import argparse
+import glob
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy.signal
 import soundfile as sf
 
+from utils import (
+    cache_espectral,
+    descriptores,
+    f0,
+    traza,
+    vad,
+    wav_mmap,
+    welch_incremental,
+)
+from utils.manifiesto import hash_archivo, ruta_relativa
+from utils.precision import (
+    agregar_argumentos,
+    configurar_desde_args,
+    fs_analisis,
+    precision,
+    usar_vad,
+)
+
 # --- CONFIGURACIÓN DE RUTAS RELATIVAS ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -12,26 +32,71 @@ DIR_INPUT = os.path.join(BASE_DIR, "..", "data", "1_input")
 
 # Salida: Directamente a la carpeta de imágenes del reporte
 DIR_IMG_OUT = os.path.join(BASE_DIR, "..", "docs", "reporte", "imagenes")
-# Salida de datos (CSV) por si los necesitas
+# Salida de datos: tabla de descriptores (ver utils/descriptores.py)
 DIR_DATA_OUT = os.path.join(BASE_DIR, "..", "data", "3_analysis")
 
 # --- ESTILO VISUAL (Dark Theme) ---
-plt.style.use("dark_background")
+ESTILO = "dark_background"
 COLOR_PRE = "#61afef"  # Azul OneDark
 COLOR_POST = "#e06c75"  # Rojo OneDark
 COLOR_GRID = "#4b5263"
+COLOR_F0 = "#56b6c2"  # Cian OneDark
+
+# --- ESPECTROGRAMA DE BANDA ESTRECHA ---
+NFFT_ESPECTROGRAMA = 4096  # Ventana grande para ver las rayitas
+NOVERLAP_ESPECTROGRAMA = 3000
+FMAX_VISTA = 5000  # Enfocamos en la voz humana (0-5kHz)
+DPI = 150
+# Cada panel de la figura 2 (12x5 in a 150 dpi, dos paneles) mide menos de
+# 600x900 px: en modo reporte no se dibujan más celdas que píxeles
+PIXELES_ESPECTROGRAMA = (600, 900)  # (filas, columnas)
+
+
+plt = None  # matplotlib.pyplot: se importa al dibujar por primera vez
+
+
+def _pyplot():
+    """
+    Importa pyplot y aplica el estilo la primera vez que hace falta: el
+    análisis numérico (PSD, distancias) no paga el import de matplotlib.
+    """
+    global plt
+    if plt is None:
+        import matplotlib.pyplot
+
+        matplotlib.pyplot.style.use(ESTILO)
+        plt = matplotlib.pyplot
+    return plt
 
 
 def cargar_audio(ruta):
-    try:
-        data, samplerate = sf.read(ruta)
-        # Asegurar Mono
-        if data.ndim > 1:
-            data = np.mean(data, axis=1)
-        return data, samplerate
-    except Exception as e:
-        print(f"Error cargando {ruta}: {e}")
-        return None, None
+    """
+    Los WAV PCM se abren por memory-map (vista perezosa, sin decodificar);
+    el resto se lee completo con soundfile.
+    """
+    with traza.paso("cargar"):
+        traza.leido(ruta)
+        senal = wav_mmap.abrir(ruta)
+        if senal is not None:
+            return senal, senal.samplerate
+        try:
+            data, samplerate = sf.read(ruta, dtype=precision())
+            # Asegurar Mono
+            if data.ndim > 1:
+                data = np.mean(data, axis=1)
+            traza.arreglo("audio", data)
+            return data, samplerate
+        except Exception as e:
+            traza.avisar(f"[ERROR] Error cargando {ruta}: {e}")
+            return None, None
+
+
+def _welch(data, fs):
+    """
+    PSD de Welch lineal a la tasa de análisis (--fs-analisis) y, con
+    --vad, sin los silencios.
+    """
+    return cache_espectral.welch_analisis(data, fs, 4096)
 
 
 def calcular_espectro_medio(data, fs):
@@ -39,28 +104,145 @@ def calcular_espectro_medio(data, fs):
     Calcula la Transformada de Fourier (PSD) promediada en el tiempo.
     Nos dice QUÉ frecuencias están presentes globalmente.
     """
-    freqs, psd = scipy.signal.welch(data, fs, nperseg=4096)
+    freqs, psd = _welch(data, fs)
     # Convertir a dB
     psd_db = 10 * np.log10(psd + 1e-10)  # +epsilon para evitar log(0)
     return freqs, psd_db
 
 
-def plot_espectrograma_banda_estrecha(ax, data, fs, titulo):
+def calcular_espectro_medio_cohorte(rutas, por_archivo=True):
     """
-    Configuración específica para ver ARMÓNICOS (La 'Escalera').
-    Ventana grande (NFFT alto) = Mejor resolución de frecuencia.
+    Igual que calcular_espectro_medio, pero promediando varias grabaciones
+    (p. ej. todos los PRE o todos los POST) en una pasada por bloques.
+    Regresa (freqs, psd_db, varianza lineal por frecuencia).
+    """
+    acumulador = welch_incremental.perfil_cohorte(
+        rutas, nperseg=4096, con_vad=usar_vad()
+    )
+    freqs, psd = acumulador.promedio(por_archivo)
+    _, varianza = acumulador.varianza(por_archivo)
+    return freqs, 10 * np.log10(psd + 1e-10), varianza
+
+
+def guardar_cohorte(rutas, dir_salida=None):
     """
-    Pxx, freqs, bins, im = ax.specgram(
-        data,
-        NFFT=4096,  # Ventana grande para ver las rayitas
-        Fs=fs,
-        noverlap=3000,
-        cmap="inferno",
+    Espectro medio de una cohorte en <dir_salida>/cohorte.csv: frecuencia,
+    PSD media (dB) y desviación estándar de la PSD entre archivos (lineal,
+    mismas unidades que la PSD). Regresa la ruta del CSV, o None si los
+    audios no se pueden promediar (p. ej. tasas de muestreo distintas).
+    """
+    dir_salida = dir_salida or DIR_DATA_OUT
+    try:
+        with traza.paso(
+            "cohorte", f" -> Promediando el espectro de {len(rutas)} audio(s)..."
+        ):
+            freqs, psd_db, varianza = calcular_espectro_medio_cohorte(rutas)
+    except ValueError as e:
+        traza.avisar(f"[ERROR] No se pudo promediar la cohorte: {e}")
+        return None
+    os.makedirs(dir_salida, exist_ok=True)
+    ruta_csv = os.path.join(dir_salida, "cohorte.csv")
+    with open(ruta_csv, "w", encoding="utf-8") as f:
+        f.write("frecuencia_hz,psd_db,desviacion\n")
+        for fr, db, var in zip(freqs, psd_db, varianza):
+            f.write(f"{fr:.3f},{db:.3f},{np.sqrt(var):.6e}\n")
+    print(f" [CSV] Espectro medio de la cohorte en: {ruta_csv}")
+    return ruta_csv
+
+
+def calcular_espectrograma(data, fs):
+    """
+    Mismo cálculo que ax.specgram (PSD por segmento), reutilizable desde
+    la caché, a la tasa de análisis. Regresa {"Pxx", "freqs", "bins",
+    "pad", "nfft", "fs"} (pad = medio hop, s).
+    """
+    data, fs = cache_espectral.para_analisis(data, fs)
+    nfft = cache_espectral.ventana(NFFT_ESPECTROGRAMA, fs)
+    # El hop (no el traslape) es el que conserva la resolución en segundos
+    hop = NFFT_ESPECTROGRAMA - NOVERLAP_ESPECTROGRAMA
+    if nfft != NFFT_ESPECTROGRAMA:
+        hop = max(1, int(round(hop * fs / cache_espectral.FS_REFERENCIA)))
+    noverlap = max(0, nfft - hop)
+    Pxx, freqs, bins = cache_espectral.specgram(data, fs, NFFT=nfft, noverlap=noverlap)
+    pad = (nfft - noverlap) / fs / 2
+    return {
+        "Pxx": Pxx,
+        "freqs": freqs,
+        "bins": bins,
+        "pad": pad,
+        "nfft": nfft,
+        "fs": fs,
+    }
+
+
+def reducir_espectrograma(esp, filas, columnas, fmax=FMAX_VISTA):
+    """
+    Recorta a 0..fmax (lo único que se ve) y promedia la potencia en
+    bloques enteros hasta quedar cerca de filas x columnas: la imagen ya
+    llega a la resolución en píxeles con la que se va a guardar.
+    """
+    Pxx, freqs, bins = esp["Pxx"], esp["freqs"], esp["bins"]
+    k = min(len(freqs), int(np.searchsorted(freqs, fmax, side="right")) + 1)
+    Pxx, freqs = Pxx[:k], freqs[:k]
+
+    fr = max(1, Pxx.shape[0] // filas)
+    fc = max(1, Pxx.shape[1] // columnas)
+    n_f = Pxx.shape[0] // fr * fr
+    n_t = Pxx.shape[1] // fc * fc
+    if n_f == 0 or n_t == 0:
+        return dict(esp, Pxx=Pxx, freqs=freqs)
+    Pxx = Pxx[:n_f, :n_t].reshape(n_f // fr, fr, n_t // fc, fc).mean(axis=(1, 3))
+    return {
+        "Pxx": Pxx,
+        "freqs": freqs[:n_f].reshape(-1, fr).mean(axis=1),
+        "bins": bins[:n_t].reshape(-1, fc).mean(axis=1),
+        "pad": esp["pad"] * fc,
+    }
+
+
+def dibujar_espectrograma(ax, esp, titulo, pista=None):
+    """
+    Dibujo equivalente a ax.specgram (dB, origen arriba, extent con medio
+    hop). Con la pista de F0 (utils.f0.seguir) se superpone el contorno
+    de F0 y su resumen va en el título.
+    """
+    Pxx, freqs, bins = esp["Pxx"], esp["freqs"], esp["bins"]
+    extent = (
+        np.min(bins) - esp["pad"],
+        np.max(bins) + esp["pad"],
+        freqs[0],
+        freqs[-1],
+    )
+    ax.imshow(
+        np.flipud(10.0 * np.log10(Pxx)), cmap="inferno", extent=extent, origin="upper"
     )
+    ax.axis("auto")
+    if pista is not None:
+        limites = ax.get_xlim()
+        ax.plot(pista["tiempo"], pista["f0"], color=COLOR_F0, linewidth=1)
+        ax.set_xlim(limites)
+        r = f0.resumen(pista)
+        titulo = (
+            f"{titulo}\nF0 {r['f0_mediana']:.0f} Hz, {100 * r['frac_sonora']:.0f} % "
+            f"sonoro, periodicidad {r['periodicidad']:.2f}"
+        )
     ax.set_title(titulo, color="white", fontsize=10)
     ax.set_ylabel("Frecuencia (Hz)")
     ax.set_xlabel("Tiempo (s)")
-    ax.set_ylim(0, 5000)  # Enfocamos en la voz humana (0-5kHz)
+    ax.set_ylim(0, FMAX_VISTA)
+
+
+def plot_espectrograma_banda_estrecha(ax, data, fs, titulo):
+    """
+    Configuración específica para ver ARMÓNICOS (La 'Escalera').
+    Ventana grande (NFFT alto) = Mejor resolución de frecuencia.
+    """
+    dibujar_espectrograma(
+        ax,
+        calcular_espectrograma(data, fs),
+        titulo,
+        f0.seguir(*cache_espectral.para_analisis(data, fs)),
+    )
 
 
 def generar_analisis(archivo_pre, archivo_post):
@@ -68,18 +250,62 @@ def generar_analisis(archivo_pre, archivo_post):
         f" -> Analizando: \n    A) {os.path.basename(archivo_pre)}\n    B) {os.path.basename(archivo_post)}"
     )
 
-    # 1. Cargar
-    y_pre, sr_pre = cargar_audio(archivo_pre)
-    y_post, sr_post = cargar_audio(archivo_post)
+    with traza.archivo(
+        "cordie", ruta_relativa(archivo_post), pre=ruta_relativa(archivo_pre)
+    ):
+        # 1. Cargar
+        y_pre, sr_pre = cargar_audio(archivo_pre)
+        y_post, sr_post = cargar_audio(archivo_post)
 
-    if y_pre is None or y_post is None:
-        return
+        if y_pre is None or y_post is None:
+            return
 
-    # 2. Calcular Espectros Medios (PSD)
-    f_pre, mag_pre = calcular_espectro_medio(y_pre, sr_pre)
-    f_post, mag_post = calcular_espectro_medio(y_post, sr_post)
+        graficar_analisis(y_pre, sr_pre, y_post, sr_post)
+
+
+def analizar_audio(data, fs, pixeles=None):
+    """
+    PSD media + espectrograma de un audio: todo lo que necesitan las
+    figuras. Con pixeles=(filas, columnas) el espectrograma sale ya
+    reducido a esa rejilla (modo reporte).
+    """
+    with traza.paso("psd"):
+        freqs, psd_db = calcular_espectro_medio(data, fs)
+    with traza.paso("espectrograma"):
+        esp = calcular_espectrograma(data, fs)
+        traza.arreglo("Pxx", esp["Pxx"])
+        if pixeles is not None:
+            esp = reducir_espectrograma(esp, *pixeles)
+    with traza.paso("f0"):
+        pista = f0.seguir(*cache_espectral.para_analisis(data, fs))
+    return {"freqs": freqs, "psd_db": psd_db, "espectrograma": esp, "f0": pista}
+
+
+def graficar_analisis(y_pre, sr_pre, y_post, sr_post):
+    """
+    Genera las dos figuras a partir de audio ya cargado en memoria.
+    Regresa las rutas de las imágenes guardadas.
+    """
+    return dibujar_analisis(
+        analizar_audio(y_pre, sr_pre),
+        analizar_audio(y_post, sr_post),
+        os.path.join(DIR_IMG_OUT, "analisis_espectral_comparativo.png"),
+        os.path.join(DIR_IMG_OUT, "evidencia_visual_armonicos.png"),
+    )
+
+
+def dibujar_analisis(a_pre, a_post, ruta_fig1, ruta_fig2, etiquetas=None):
+    """
+    Dibuja y guarda las dos figuras a partir de análisis ya calculados
+    (analizar_audio). etiquetas=(pre, post) agrega los nombres como
+    título general. Regresa (ruta_fig1, ruta_fig2).
+    """
+    # 2. Espectros Medios (PSD)
+    f_pre, mag_pre = a_pre["freqs"], a_pre["psd_db"]
+    f_post, mag_post = a_post["freqs"], a_post["psd_db"]
 
     # --- GRÁFICA 1: COMPARATIVA DE ESPECTROS (Cuantitativa) ---
+    _pyplot()
     fig1, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
 
     # Plot Superpuesto
@@ -129,9 +355,12 @@ def generar_analisis(archivo_pre, archivo_post):
     ax2.legend()
     ax2.grid(color=COLOR_GRID, linestyle=":", alpha=0.5)
 
-    plt.tight_layout()
-    ruta_fig1 = os.path.join(DIR_IMG_OUT, "analisis_espectral_comparativo.png")
-    plt.savefig(ruta_fig1, dpi=150)
+    if etiquetas:
+        fig1.suptitle(f"{etiquetas[0]}  vs  {etiquetas[1]}", fontsize=11)
+    with traza.paso("render_espectro"):
+        plt.tight_layout()
+        plt.savefig(ruta_fig1, dpi=DPI)
+        traza.escrito(ruta_fig1)
     print(f" [IMG] Guardada comparativa espectral en: {ruta_fig1}")
     plt.close()
 
@@ -139,19 +368,445 @@ def generar_analisis(archivo_pre, archivo_post):
     # Esta es la imagen "Escalera vs Niebla" para tu diapo
     fig2, (ax3, ax4) = plt.subplots(1, 2, figsize=(12, 5), sharey=True)
 
-    plot_espectrograma_banda_estrecha(
-        ax3, y_pre, sr_pre, "PRE: Estructura Armónica (Líneas definidas)"
+    dibujar_espectrograma(
+        ax3,
+        a_pre["espectrograma"],
+        "PRE: Estructura Armónica (Líneas definidas)",
+        a_pre.get("f0"),
     )
-    plot_espectrograma_banda_estrecha(
-        ax4, y_post, sr_post, "POST: Ruido de Banda Ancha (Difuso/Niebla)"
+    dibujar_espectrograma(
+        ax4,
+        a_post["espectrograma"],
+        "POST: Ruido de Banda Ancha (Difuso/Niebla)",
+        a_post.get("f0"),
     )
 
-    plt.tight_layout()
-    ruta_fig2 = os.path.join(DIR_IMG_OUT, "evidencia_visual_armonicos.png")
-    plt.savefig(ruta_fig2, dpi=150)
+    if etiquetas:
+        fig2.suptitle(f"{etiquetas[0]}  vs  {etiquetas[1]}", fontsize=11)
+    with traza.paso("render_armonicos"):
+        plt.tight_layout()
+        plt.savefig(ruta_fig2, dpi=DPI)
+        traza.escrito(ruta_fig2)
     print(f" [IMG] Guardada evidencia visual en: {ruta_fig2}")
     plt.close()
 
+    return ruta_fig1, ruta_fig2
+
+
+# --- MODO REPORTE: muchos pares, sin ventanas, en paralelo ---
+# Fase 1: un proceso por archivo calcula su PSD y su espectrograma (ya
+#         reducido a la rejilla de píxeles) UNA sola vez.
+# Fase 2: un proceso por par solo dibuja con esos resultados.
+
+
+def _inicializar_trabajador():
+    _pyplot().switch_backend("Agg")
+
+
+def _analizar_archivo(ruta):
+    with traza.archivo("cordie", ruta_relativa(ruta), fase="analisis"):
+        y, fs = cargar_audio(ruta)
+        if y is None:
+            return ruta, None
+        return ruta, analizar_audio(y, fs, PIXELES_ESPECTROGRAMA)
+
+
+def _renderizar_par(a_pre, a_post, nombre_pre, nombre_post, dir_salida):
+    base = os.path.join(dir_salida, f"{nombre_pre}__vs__{nombre_post}")
+    with traza.archivo("cordie", nombre_post, fase="dibujo", pre=nombre_pre):
+        return dibujar_analisis(
+            a_pre,
+            a_post,
+            f"{base}_espectro.png",
+            f"{base}_armonicos.png",
+            etiquetas=(nombre_pre, nombre_post),
+        )
+
+
+def listar_audios(rutas):
+    """Archivos, directorios (sus .wav) o patrones glob -> lista ordenada."""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            ruta = os.path.join(ruta, "*.wav")
+        archivos.extend(f for f in glob.glob(ruta) if os.path.isfile(f))
+    return sorted(set(archivos))
+
+
+def pares_de(archivos, matriz=False):
+    """
+    Pares (pre, post): cada combinación una vez (i < j), o con matriz=True
+    todas las ordenadas (i != j), es decir la matriz N x N sin diagonal.
+    """
+    return [
+        (a, b)
+        for i, a in enumerate(archivos)
+        for j, b in enumerate(archivos)
+        if (i != j if matriz else i < j)
+    ]
+
+
+def distancia_espectral(a_pre, a_post, fmin=80, fmax=FMAX_VISTA):
+    """RMS de la diferencia de PSD (dB) en la banda de voz."""
+    f = a_pre["freqs"]
+    diff = a_pre["psd_db"] - np.interp(f, a_post["freqs"], a_post["psd_db"])
+    banda = (f >= fmin) & (f <= fmax)
+    return float(np.sqrt(np.mean(diff[banda] ** 2)))
+
+
+def dibujar_matriz(nombres, analisis, dir_salida):
+    """Mapa de calor + CSV de distancias espectrales entre todos los audios."""
+    n = len(nombres)
+    m = np.zeros((n, n))
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                m[i, j] = distancia_espectral(analisis[i], analisis[j])
+
+    ruta_csv = os.path.join(dir_salida, "matriz_diferencias.csv")
+    with open(ruta_csv, "w", encoding="utf-8") as f:
+        f.write("archivo," + ",".join(nombres) + "\n")
+        for nombre, fila in zip(nombres, m):
+            f.write(nombre + "," + ",".join(f"{v:.3f}" for v in fila) + "\n")
+
+    lado = max(4, 0.6 * n + 2)
+    _pyplot()
+    fig, ax = plt.subplots(figsize=(lado + 1, lado))
+    im = ax.imshow(m, cmap="inferno")
+    ax.set_xticks(range(n), nombres, rotation=90, fontsize=8)
+    ax.set_yticks(range(n), nombres, fontsize=8)
+    ax.set_title("Diferencia espectral RMS (dB, 80-5000 Hz)", fontsize=12)
+    fig.colorbar(im, ax=ax, label="dB")
+    plt.tight_layout()
+    ruta_png = os.path.join(dir_salida, "matriz_diferencias.png")
+    plt.savefig(ruta_png, dpi=DPI)
+    plt.close(fig)
+    return ruta_png, ruta_csv
+
+
+def generar_reportes(pares, workers=None, dir_salida=None):
+    """
+    Renderiza las figuras de cada par (pre, post) en un pool de procesos
+    con backend Agg. Cada archivo se analiza una sola vez aunque aparezca
+    en muchos pares. Regresa la lista de imágenes escritas.
+    """
+    dir_salida = dir_salida or os.path.join(DIR_DATA_OUT, "reportes")
+    os.makedirs(dir_salida, exist_ok=True)
+    _pyplot().switch_backend("Agg")
+    archivos = sorted({ruta for par in pares for ruta in par})
+    workers = workers or os.cpu_count() or 1
+    print(
+        f"--- Reporte: {len(archivos)} archivos, {len(pares)} pares, "
+        f"{workers} procesos ---"
+    )
+
+    inicio = time.perf_counter()
+    escritos = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_inicializar_trabajador
+    ) as pool:
+        # Fase 1: análisis por archivo
+        analisis = dict(pool.map(_analizar_archivo, archivos))
+        fallidos = [r for r, a in analisis.items() if a is None]
+        t_analisis = time.perf_counter() - inicio
+
+        # Fase 2: dibujo por par
+        nombre = {r: os.path.splitext(os.path.basename(r))[0] for r in archivos}
+        futuros = [
+            pool.submit(
+                _renderizar_par,
+                analisis[pre],
+                analisis[post],
+                nombre[pre],
+                nombre[post],
+                dir_salida,
+            )
+            for pre, post in pares
+            if analisis[pre] is not None and analisis[post] is not None
+        ]
+        for futuro in futuros:
+            escritos.extend(futuro.result())
+
+    validos = [r for r in archivos if analisis[r] is not None]
+    if len(validos) >= 2:
+        escritos.extend(
+            dibujar_matriz(
+                [nombre[r] for r in validos],
+                [analisis[r] for r in validos],
+                dir_salida,
+            )
+        )
+
+    total = time.perf_counter() - inicio
+    print(
+        f" [REPORTE] {len(futuros)} pares en {total:.2f} s "
+        f"(análisis {t_analisis:.2f} s, dibujo {total - t_analisis:.2f} s)"
+    )
+    for r in fallidos:
+        print(f" [ERROR] No se pudo analizar: {r}")
+    print(f" [REPORTE] Imágenes en: {dir_salida}")
+    return escritos
+
+
+# --- DESCRIPTORES EN LOTE (tabla en data/3_analysis) ---
+# Un proceso por archivo: carga (mmap), PSD y espectrograma (de la caché
+# si ya se graficó), descriptores por trama y su resumen. El proceso
+# principal es el único que escribe los CSV.
+
+COLUMNAS_ARCHIVO = [
+    "archivo",
+    "sha256",
+    "mtime_ns",
+    "tamano",
+    "fs",
+    "fs_analisis",
+    "vad",
+    "duracion",
+    "frac_voz",
+    "tramas",
+    "tramas_activas",
+    "centroide",
+    "planitud",
+    "hnr",
+    "f0_mediana",
+    "f0_desv_st",
+    "frac_sonora",
+    "periodicidad",
+    *descriptores.columnas_banda(),
+    "tramas_npz",
+]
+COLUMNAS_PAR = [
+    "pre",
+    "post",
+    "sha256_pre",
+    "sha256_post",
+    "distancia_rms",
+    "dif_centroide",
+    "dif_planitud",
+    "dif_hnr",
+    "dif_periodicidad",
+    *(f"dif_{c}" for c in descriptores.columnas_banda()),
+]
+
+
+def _descriptores_archivo(ruta, dir_tramas):
+    with traza.archivo("cordie", ruta_relativa(ruta), fase="descriptores"):
+        st = os.stat(ruta)
+        sha = hash_archivo(ruta)
+        y, fs = cargar_audio(ruta)
+        if y is None:
+            return ruta, None
+        segmentos = None
+        if usar_vad():
+            with traza.paso("vad"):
+                segmentos = vad.segmentos(y, fs)
+        with traza.paso("psd"):
+            freqs, psd = _welch(y, fs)
+        with traza.paso("espectrograma"):
+            esp = calcular_espectrograma(y, fs)
+        with traza.paso("descriptores"):
+            columnas = descriptores.descriptores_tramas(
+                esp["Pxx"], esp["freqs"], esp["bins"], esp["fs"], esp["nfft"]
+            )
+            voz = None
+            if segmentos is not None:
+                voz = vad.mascara(segmentos, columnas["tiempo"] * fs)
+            fila = descriptores.resumen_archivo(columnas, freqs, psd, voz)
+        with traza.paso("f0"):
+            pista = f0.seguir(*cache_espectral.para_analisis(y, fs))
+            fila.update(f0.resumen(pista))
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        ruta_npz = os.path.join(dir_tramas, f"{nombre}_{sha[:12]}.npz")
+        with traza.paso("guardar"):
+            descriptores.guardar_tramas(
+                ruta_npz,
+                columnas,
+                freqs,
+                10 * np.log10(psd + 1e-10),  # Igual que calcular_espectro_medio
+                pista=pista,
+                archivo=ruta_relativa(ruta),
+                sha256=sha,
+                fs=fs,
+            )
+            traza.escrito(ruta_npz)
+        fila.update(
+            archivo=ruta_relativa(ruta),
+            sha256=sha,
+            mtime_ns=st.st_mtime_ns,
+            tamano=st.st_size,
+            fs=int(fs),
+            fs_analisis=int(esp["fs"]),
+            vad=int(segmentos is not None),
+            duracion=len(y) / fs,
+            frac_voz=(
+                vad.fraccion(segmentos, len(y))
+                if segmentos is not None
+                else float("nan")
+            ),
+            tramas_npz=os.path.relpath(ruta_npz, os.path.dirname(dir_tramas)),
+        )
+        return ruta, fila
+
+
+def leer_previas(dir_salida=None):
+    """
+    Filas de descriptores.csv por archivo. Una tabla de otra versión
+    (columnas distintas) cuenta como vacía: todo se recalcula y
+    agregar_filas la regenera completa, sin perder filas.
+    """
+    ruta_tabla = os.path.join(dir_salida or DIR_DATA_OUT, "descriptores.csv")
+    filas = descriptores.leer_tabla(ruta_tabla)
+    if filas and list(filas[0].keys()) != COLUMNAS_ARCHIVO:
+        return {}
+    return {f["archivo"]: f for f in filas}
+
+
+def _esta_al_dia(fila, ruta, dir_salida):
+    """
+    Misma huella (mtime + tamaño), misma tasa de análisis, mismo --vad y
+    su npz sigue en disco.
+    """
+    if fila is None:
+        return False
+    st = os.stat(ruta)
+    fs = int(fila["fs"])
+    return (
+        fila.get("fs_analisis") == str(min(fs, fs_analisis() or fs))
+        and fila.get("vad") == str(int(usar_vad()))
+        and fila["mtime_ns"] == str(st.st_mtime_ns)
+        and fila["tamano"] == str(st.st_size)
+        and os.path.exists(os.path.join(dir_salida, fila["tramas_npz"]))
+    )
+
+
+def diferencias_pares(pares, filas, dir_salida):
+    """
+    Filas de diferencias.csv (pre - post) a partir de la tabla por
+    archivo y las PSD guardadas: no se decodifica ningún audio. Los pares
+    se calculan juntos, una matriz por rejilla de frecuencias.
+    """
+    por_archivo = {f["archivo"]: f for f in filas}
+    pares = [
+        (pre, post)
+        for pre, post in pares
+        if ruta_relativa(pre) in por_archivo and ruta_relativa(post) in por_archivo
+    ]
+    psd = {}
+    for ruta in {r for par in pares for r in par}:
+        npz = os.path.join(dir_salida, por_archivo[ruta_relativa(ruta)]["tramas_npz"])
+        t = descriptores.cargar_tramas(npz)
+        psd[ruta] = (t["freqs_psd"], t["psd_db"])
+
+    grupos = {}
+    for pre, post in pares:
+        f_pre, db_pre = psd[pre]
+        f_post, db_post = psd[post]
+        # Como distancia_espectral: el post se lleva a la rejilla del pre
+        grupo = grupos.setdefault(f_pre.tobytes(), (f_pre, [], [], []))
+        grupo[1].append((pre, post))
+        grupo[2].append(db_pre)
+        grupo[3].append(np.interp(f_pre, f_post, db_post))
+
+    resultado = []
+    for freqs, lista, db_pre, db_post in grupos.values():
+        difs = descriptores.diferencias(np.array(db_pre), np.array(db_post), freqs)
+        for i, (pre, post) in enumerate(lista):
+            a, b = por_archivo[ruta_relativa(pre)], por_archivo[ruta_relativa(post)]
+            fila = {
+                "pre": a["archivo"],
+                "post": b["archivo"],
+                "sha256_pre": a["sha256"],
+                "sha256_post": b["sha256"],
+            }
+            for campo in ("centroide", "planitud", "hnr", "periodicidad"):
+                fila[f"dif_{campo}"] = float(a[campo]) - float(b[campo])
+            fila.update((k, float(v[i])) for k, v in difs.items())
+            resultado.append(fila)
+    return resultado
+
+
+def guardar_descriptores(nuevas, dir_salida=None, previas=None):
+    """
+    Agrega/actualiza 'nuevas' en descriptores.csv y borra el npz de la
+    versión anterior de cada archivo. Regresa la tabla completa.
+    """
+    dir_salida = dir_salida or DIR_DATA_OUT
+    ruta_tabla = os.path.join(dir_salida, "descriptores.csv")
+    if previas is None:
+        previas = leer_previas(dir_salida)
+    for fila in nuevas:
+        # El npz de la versión anterior del archivo ya no sirve
+        previa = previas.get(fila["archivo"])
+        if previa and previa["tramas_npz"] != fila["tramas_npz"]:
+            vieja = os.path.join(dir_salida, previa["tramas_npz"])
+            if os.path.exists(vieja):
+                os.remove(vieja)
+    return descriptores.agregar_filas(
+        ruta_tabla, COLUMNAS_ARCHIVO, nuevas, clave=lambda f: f["archivo"]
+    )
+
+
+def extraer_descriptores(rutas, pares=(), workers=None, dir_salida=None, forzar=False):
+    """
+    Descriptores de todos los audios 'rutas' (y de los que aparezcan en
+    'pares') en un pool de procesos. Agrega/actualiza una fila por archivo
+    en descriptores.csv (los que no cambiaron se omiten) y una por par
+    en diferencias.csv. Regresa (filas_archivo, filas_par).
+    """
+    dir_salida = dir_salida or DIR_DATA_OUT
+    dir_tramas = os.path.join(dir_salida, "tramas")
+    archivos = sorted(set(rutas) | {r for par in pares for r in par})
+    workers = workers or os.cpu_count() or 1
+
+    previas = leer_previas(dir_salida)
+    pendientes = [
+        r
+        for r in archivos
+        if forzar or not _esta_al_dia(previas.get(ruta_relativa(r)), r, dir_salida)
+    ]
+    print(
+        f"--- Descriptores: {len(pendientes)} por extraer, "
+        f"{len(archivos) - len(pendientes)} sin cambios, {workers} procesos ---"
+    )
+
+    inicio = time.perf_counter()
+    nuevas, fallidos = [], []
+    if pendientes:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = [
+                pool.submit(_descriptores_archivo, r, dir_tramas) for r in pendientes
+            ]
+            for futuro in as_completed(futuros):
+                ruta, fila = futuro.result()
+                if fila is None:
+                    fallidos.append(ruta)
+                    print(f" [ERROR] {os.path.basename(ruta)}")
+                    continue
+                nuevas.append(fila)
+                print(
+                    f" [OK] {os.path.basename(ruta)}  "
+                    f"HNR {fila['hnr']:.1f} dB  centroide {fila['centroide']:.0f} Hz"
+                )
+
+    filas = guardar_descriptores(nuevas, dir_salida, previas)
+
+    filas_par = diferencias_pares(pares, filas, dir_salida)
+    if filas_par:
+        descriptores.agregar_filas(
+            os.path.join(dir_salida, "diferencias.csv"),
+            COLUMNAS_PAR,
+            filas_par,
+            clave=lambda f: (f["pre"], f["post"]),
+        )
+
+    print(
+        f" [DESCRIPTORES] {len(nuevas)} archivos, {len(filas_par)} pares en "
+        f"{time.perf_counter() - inicio:.2f} s -> {dir_salida}"
+    )
+    for r in fallidos:
+        print(f" [ERROR] No se pudo analizar: {r}")
+    return filas, filas_par
+
 
 def main():
     # Crear directorios si no existen
@@ -189,7 +844,77 @@ def main():
         print("[ERROR] Selección inválida.")
 
 
-import glob  # Import tardío para glob
-
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Etapa 2: análisis espectral")
+    parser.add_argument(
+        "--reporte",
+        nargs="+",
+        metavar="RUTA",
+        help="Modo sin preguntas: comparar todos los audios (archivos, "
+        "directorios o patrones glob) entre sí",
+    )
+    parser.add_argument(
+        "--matriz",
+        action="store_true",
+        help="Con --reporte: todos los pares ordenados (N x N), no solo i < j",
+    )
+    parser.add_argument(
+        "--par",
+        nargs=2,
+        action="append",
+        metavar=("PRE", "POST"),
+        help="Par específico a comparar (se puede repetir)",
+    )
+    parser.add_argument(
+        "--descriptores",
+        action="store_true",
+        help="Con --reporte/--par: escribir la tabla de descriptores en "
+        "data/3_analysis en lugar de las figuras",
+    )
+    parser.add_argument(
+        "--cohorte",
+        nargs="+",
+        metavar="RUTA",
+        help="Espectro medio (y su dispersión) de todos estos audios, en "
+        "data/3_analysis/cohorte.csv",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos del pool en modo reporte (default: número de núcleos)",
+    )
+    parser.add_argument(
+        "--salida",
+        default=None,
+        help="Carpeta de imágenes del reporte (default: data/3_analysis/reportes)",
+    )
+    agregar_argumentos(parser)
+    traza.agregar_argumentos(parser)
+    args = parser.parse_args()
+    configurar_desde_args(args)
+    traza.configurar_desde_args(args)
+
+    if args.cohorte:
+        rutas = listar_audios(args.cohorte)
+        if rutas:
+            guardar_cohorte(rutas)
+        else:
+            print("[ERROR] No hay audios para la cohorte.")
+    elif args.reporte or args.par:
+        pares = [tuple(p) for p in args.par or []]
+        if args.reporte:
+            pares += pares_de(listar_audios(args.reporte), matriz=args.matriz)
+        pares = list(dict.fromkeys(pares))  # Sin repetidos, en orden
+        if args.descriptores:
+            # Mismos pares que las figuras: explícitos y los de --reporte
+            extraer_descriptores(
+                listar_audios(args.reporte or []), pares=pares, workers=args.workers
+            )
+        elif not pares:
+            print("[ERROR] Se necesitan al menos 2 audios para comparar.")
+        else:
+            generar_reportes(pares, workers=args.workers, dir_salida=args.salida)
+    else:
+        main()
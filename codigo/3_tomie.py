@@ -1,10 +1,38 @@
 import os
+import sys
 import glob
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 import scipy.signal
 import soundfile as sf
 from scipy.interpolate import interp1d
 
+from utils import (
+    cache_espectral,
+    f0,
+    fir,
+    perfiles,
+    traza,
+    vad,
+    wav_mmap,
+    welch_incremental,
+)
+from utils.manifiesto import Manifiesto, ruta_relativa
+from utils.precision import (
+    agregar_argumentos,
+    como_real,
+    configurar_desde_args,
+    dtype_real,
+    fs_analisis,
+    precision,
+    sesion_fft,
+    usar_vad,
+)
+
 # --- CONFIGURACIÓN DE RUTAS ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -17,116 +45,742 @@ DIR_OUTPUT = os.path.join(BASE_DIR, "..", "data", "2_output")
 FS_TARGET = 44100  # Frecuencia de muestreo estándar
 N_FFT = 2048  # Tamaño de ventana para STFT
 HOP_LEN = 512  # Salto entre ventanas
+MASCARA_MIN_DB = -10  # Máxima atenuación de la máscara
+MASCARA_MAX_DB = 20  # Máx 20dB de boost
+SAVGOL_VENTANA = 51  # Suavizado de la máscara (debe ser impar)
+SAVGOL_ORDEN = 3
+MOTORES = ("stft", "fir", "armonico")
 
 
 def cargar_audio(ruta):
-    try:
-        data, samplerate = sf.read(ruta)
-        # Forzar mono y resampling simple si no coincide (aunque normalizar.py ya lo hizo)
-        if data.ndim > 1:
-            data = np.mean(data, axis=1)
-        return data, samplerate
-    except Exception as e:
-        print(f"[ERROR] No se pudo leer {ruta}: {e}")
-        return None, None
+    """
+    Los WAV PCM se abren por memory-map (vista perezosa, sin decodificar);
+    el resto se lee completo con soundfile.
+    """
+    with traza.paso("cargar"):
+        traza.leido(ruta)
+        senal = wav_mmap.abrir(ruta)
+        if senal is not None:
+            return senal, senal.samplerate
+        try:
+            data, samplerate = sf.read(ruta, dtype=precision())
+            # Forzar mono y resampling simple si no coincide (aunque normalizar.py ya lo hizo)
+            if data.ndim > 1:
+                data = np.mean(data, axis=1)
+            traza.arreglo("audio", data)
+            return data, samplerate
+        except Exception as e:
+            traza.avisar(f"[ERROR] No se pudo leer {ruta}: {e}")
+            return None, None
 
 
 def calcular_perfil_espectral(data, fs):
     """
     Calcula el perfil de energía promedio (PSD) de un audio.
     Nos dice 'cuánta energía hay en cada frecuencia' en promedio.
+    Con --fs-analisis se calcula sobre la copia remuestreada (la rejilla
+    llega solo hasta su Nyquist, con la misma resolución en Hz); con --vad,
+    solo sobre los segmentos con voz.
     """
-    freqs, psd = scipy.signal.welch(data, fs, nperseg=N_FFT)
+    with traza.paso("welch"):
+        freqs, psd = cache_espectral.welch_analisis(data, fs, N_FFT)
     # Convertir a dB, con protección contra log(0)
     psd_db = 10 * np.log10(psd + 1e-12)
     return freqs, psd_db
 
 
+def calcular_perfil_cohorte(rutas, por_archivo=True):
+    """
+    Perfil promedio de VARIAS grabaciones (p. ej. una referencia sana de
+    toda la cohorte) en una sola pasada con memoria constante.
+    por_archivo=True: cada grabación pesa igual, sin importar su duración.
+    Regresa (freqs, psd_db, varianza lineal por frecuencia).
+    """
+    acumulador = welch_incremental.perfil_cohorte(
+        rutas, nperseg=N_FFT, con_vad=usar_vad()
+    )
+    freqs, psd = acumulador.promedio(por_archivo)
+    _, varianza = acumulador.varianza(por_archivo)
+    return freqs, 10 * np.log10(psd + 1e-12), varianza
+
+
 def suavizar_curva(curva):
     """
     Aplica filtro Savitzky-Golay para evitar picos bruscos que suenen robóticos.
     """
-    window_length = 51  # Debe ser impar
-    polyorder = 3
+    window_length = SAVGOL_VENTANA
+    polyorder = SAVGOL_ORDEN
     if len(curva) < window_length:
         window_length = len(curva) // 2 * 2 + 1
     return scipy.signal.savgol_filter(curva, window_length, polyorder)
 
 
-def aplicar_restauracion(archivo_sano, archivo_enfermo):
-    print(f"\n--- Iniciando Restauración ---")
-    print(f"Ref (Sano):    {os.path.basename(archivo_sano)}")
-    print(f"Target (Post): {os.path.basename(archivo_enfermo)}")
-
-    # 1. Cargar Audios
-    y_ref, sr_ref = cargar_audio(archivo_sano)
-    y_tgt, sr_tgt = cargar_audio(archivo_enfermo)
+def perfil_de_audio(y_ref, sr_ref):
+    """Perfil de referencia en memoria (mismo formato que utils.perfiles)."""
+    freqs, perfil_db = calcular_perfil_espectral(y_ref, sr_ref)
+    return {
+        "nombre": None,
+        "freqs": freqs,
+        "perfil_db": perfil_db,
+        "suavizado_db": suavizar_curva(perfil_db),
+        "params": {
+            "n_fft": N_FFT,
+            "savgol": [SAVGOL_VENTANA, SAVGOL_ORDEN],
+            "fs_analisis": fs_analisis(),
+            "vad": usar_vad(),
+        },
+    }
+
+
+def _perfil_de_rutas(rutas):
+    """(perfil sin nombre, fs) de un audio o de una cohorte; None si falla."""
+    if len(rutas) == 1:
+        y_ref, sr_ref = cargar_audio(rutas[0])
+        if y_ref is None:
+            return None
+        return perfil_de_audio(y_ref, sr_ref), sr_ref
+    freqs, perfil_db, _ = calcular_perfil_cohorte(rutas)
+    perfil = {
+        "freqs": freqs,
+        "perfil_db": perfil_db,
+        "suavizado_db": suavizar_curva(perfil_db),
+    }
+    return perfil, sf.info(rutas[0]).samplerate
+
+
+def crear_perfil_referencia(nombre, rutas):
+    """
+    Calcula el perfil de una referencia sana (un archivo, o el promedio de
+    una cohorte si son varios) y lo guarda en data/perfiles/<nombre>.npz.
+    """
+    with traza.paso(
+        "crear_perfil",
+        f" -> Calculando perfil de referencia '{nombre}' ({len(rutas)} audio(s))...",
+        perfil=nombre,
+        audios=len(rutas),
+    ):
+        resultado = _perfil_de_rutas(rutas)
+    if resultado is None:
+        return None
+    perfil, sr_ref = resultado
+    perfil["nombre"] = nombre
+    perfil["params"] = {
+        "n_fft": N_FFT,
+        "savgol": [SAVGOL_VENTANA, SAVGOL_ORDEN],
+        "fs": sr_ref,
+        "fs_analisis": fs_analisis() if len(rutas) == 1 else None,
+        "vad": usar_vad(),
+        "precision": precision(),
+        "fuentes": perfiles.fuentes_con_huella(rutas),
+    }
+    ruta = perfiles.guardar(
+        nombre,
+        perfil["freqs"],
+        perfil["perfil_db"],
+        perfil["suavizado_db"],
+        perfil["params"],
+    )
+    print(f" [EXITO] Perfil guardado en: {ruta}")
+    return perfil
 
-    if y_ref is None or y_tgt is None:
-        return
 
-    # 2. Calcular la Máscara de Transferencia (La "Diferencia")
-    print(" -> Calculando perfiles espectrales...")
-    f_ref, psd_ref = calcular_perfil_espectral(y_ref, sr_ref)
-    f_tgt, psd_tgt = calcular_perfil_espectral(y_tgt, sr_tgt)
+def cargar_perfil_referencia(nombre):
+    """
+    Carga un perfil guardado y verifica que sea compatible con esta versión.
+    Si sus audios fuente cambiaron (o ya no están) solo avisa: el perfil
+    sigue siendo utilizable, pero ya no describe a la referencia actual.
+    """
+    perfil = perfiles.cargar(nombre)
+    params = perfil["params"]
+    if params.get("n_fft") != N_FFT or params.get("savgol") != [
+        SAVGOL_VENTANA,
+        SAVGOL_ORDEN,
+    ]:
+        raise ValueError(
+            f"El perfil '{nombre}' se calculó con otros parámetros "
+            f"(n_fft={params.get('n_fft')}, savgol={params.get('savgol')}); "
+            "vuelve a crearlo con --crear-perfil"
+        )
+    if not perfiles.esta_vigente(perfil):
+        traza.avisar(
+            f" [AVISO] Los audios fuente del perfil '{nombre}' cambiaron o ya no "
+            "existen; vuelve a crearlo con --crear-perfil"
+        )
+    return perfil
+
+
+def _mascara_desde_psd(perfil, f_tgt, psd_tgt_db):
+    """Máscara suavizada y limitada = perfil de referencia - PSD del target."""
+    f_ref = perfil["freqs"]
+    suavizado_ref = perfil["suavizado_db"]
+    # Con tasa de análisis reducida uno de los dos puede llegar a menos Hz:
+    # la máscara solo cubre la banda que ambos vieron
+    if f_tgt[-1] < f_ref[-1]:
+        banda = f_ref <= f_tgt[-1]
+        f_ref, suavizado_ref = f_ref[banda], suavizado_ref[banda]
 
     # Interpolar para asegurar que las frecuencias coincidan exáctamente
-    interp_func = interp1d(f_tgt, psd_tgt, kind="linear", fill_value="extrapolate")
+    interp_func = interp1d(f_tgt, psd_tgt_db, kind="linear", fill_value="extrapolate")
     psd_tgt_aligned = interp_func(f_ref)
 
-    # Calcular diferencia (Sano - Enfermo)
+    # Diferencia suavizada (Sano - Enfermo). Savitzky-Golay es lineal:
+    # suavizar(ref - tgt) == suavizar(ref) - suavizar(tgt), por eso el
+    # perfil guarda la referencia ya suavizada y aquí solo falta el target.
     # Si es positivo, falta energía en el enfermo. Si es negativo, sobra.
-    raw_mask_db = psd_ref - psd_tgt_aligned
-
-    # Suavizar la máscara (Clave para sonido natural)
-    smooth_mask_db = suavizar_curva(raw_mask_db)
+    smooth_mask_db = suavizado_ref - suavizar_curva(psd_tgt_aligned)
 
     # Limitar la ganancia máxima (Para no romper los tímpanos ni saturar)
-    smooth_mask_db = np.clip(smooth_mask_db, -10, 20)  # Máx 20dB de boost
+    smooth_mask_db = np.clip(smooth_mask_db, MASCARA_MIN_DB, MASCARA_MAX_DB)
 
-    print(" -> Aplicando corrección espectral (STFT)...")
+    return f_ref, smooth_mask_db
 
-    # 3. Aplicar al audio enfermo usando STFT
-    # Convertimos audio a frecuencias (Tiempo x Frecuencia)
-    f_stft, t_stft, Zxx = scipy.signal.stft(
-        y_tgt, fs=sr_tgt, nperseg=N_FFT, noverlap=N_FFT - HOP_LEN
-    )
+
+def calcular_mascara_perfil(perfil, y_tgt, sr_tgt):
+    """
+    Máscara de transferencia (Referencia - Enfermo) en dB, suavizada y
+    limitada, a partir de un perfil ya calculado: solo se analiza el target.
+    Regresa (freqs, smooth_mask_db) sobre la rejilla del perfil.
+    """
+    f_tgt, psd_tgt = calcular_perfil_espectral(y_tgt, sr_tgt)
+    return _mascara_desde_psd(perfil, f_tgt, psd_tgt)
+
+
+def calcular_mascara_entre_perfiles(perfil_ref, perfil_tgt):
+    """
+    Máscara entre dos perfiles guardados (p. ej. referencia sana vs perfil
+    de cohorte post-operatoria): no hace falta ver el audio a restaurar,
+    así que sirve para filtrar un stream en vivo.
+    """
+    return _mascara_desde_psd(perfil_ref, perfil_tgt["freqs"], perfil_tgt["perfil_db"])
+
+
+def calcular_mascara(y_ref, sr_ref, y_tgt, sr_tgt):
+    """
+    Máscara de transferencia (Sano - Enfermo) en dB, suavizada y limitada.
+    Regresa (freqs, smooth_mask_db) sobre la rejilla de Welch de la referencia.
+    """
+    with traza.paso("perfil_referencia", " -> Calculando perfiles espectrales..."):
+        perfil = perfil_de_audio(y_ref, sr_ref)
+    return calcular_mascara_perfil(perfil, y_tgt, sr_tgt)
+
+
+def aplicar_mascara_stft(y_tgt, sr_tgt, f_mask, mask_db, pista=None, segmentos=None):
+    """
+    Aplica una máscara en dB (definida sobre f_mask) vía STFT -> ISTFT.
+    Con la pista de F0 del target (utils.f0.seguir) la máscara se pondera
+    por trama con su periodicidad: completa donde hay voz armónica, nada
+    en silencios y tramas sordas (no se sube el ruido de fondo).
+    Con segmentos de voz (utils.vad) las pausas pasan sin ecualizar; las
+    tramas que quedan con peso 0 ni se multiplican.
+    """
+    with traza.paso("stft", " -> Aplicando corrección espectral (STFT)..."):
+        # 3. Aplicar al audio enfermo usando STFT
+        # Convertimos audio a frecuencias (Tiempo x Frecuencia)
+        # (Sale de la caché si el target ya pasó por aquí o por 1_denoiser)
+        f_stft, t_stft, Zxx = cache_espectral.stft(
+            wav_mmap.como_senal(y_tgt), sr_tgt, nperseg=N_FFT, noverlap=N_FFT - HOP_LEN
+        )
+        traza.arreglo("Zxx", Zxx)
 
     # Crear interpolador para mapear nuestra máscara a las frecuencias de la STFT
     mask_interpolator = interp1d(
-        f_ref, smooth_mask_db, kind="linear", fill_value="extrapolate"
+        f_mask, mask_db, kind="linear", fill_value="extrapolate"
     )
     gain_db_per_freq = mask_interpolator(f_stft)
+    # Arriba de la banda analizada (--fs-analisis) se sostiene el último valor
+    gain_db_per_freq[f_stft > f_mask[-1]] = mask_db[-1]
 
     # Convertir dB a Ganancia Lineal (Amplitud)
     # Gain = 10 ^ (dB / 20)
-    gain_linear = 10 ** (gain_db_per_freq / 20.0)
+    gain_linear = como_real(10 ** (gain_db_per_freq / 20.0))
 
     # Expandir dimensiones para multiplicar la matriz STFT
     # Zxx tiene forma (Frecuencias, Tiempo). Gain es (Frecuencias).
     # Necesitamos multiplicar cada columna de tiempo por el vector de ganancia.
-    Zxx_restored = Zxx * gain_linear[:, np.newaxis]
+    peso = None
+    if pista is not None:
+        peso = f0.pesos_sonoridad(pista, t_stft)
+    if segmentos is not None:
+        peso_voz = vad.pesos_tiempo(segmentos, t_stft, sr_tgt)
+        peso = peso_voz if peso is None else peso * peso_voz
+    if peso is None:
+        Zxx_restored = Zxx * gain_linear[:, np.newaxis]
+    else:
+        peso = como_real(peso)
+        traza.anotar(peso_medio=float(np.mean(peso)) if len(peso) else 0.0)
+        # 10^(dB * peso / 20) = ganancia ** peso; con peso 0 queda Zxx tal cual
+        Zxx_restored = np.array(Zxx)
+        for a, b, activo in vad.rangos(peso > 0):
+            if activo:
+                Zxx_restored[:, a:b] *= (
+                    gain_linear[:, np.newaxis] ** peso[np.newaxis, a:b]
+                )
 
     # 4. Reconstruir audio (ISTFT)
-    _, y_restored = scipy.signal.istft(
-        Zxx_restored, fs=sr_tgt, nperseg=N_FFT, noverlap=N_FFT - HOP_LEN
-    )
+    with traza.paso("istft"), sesion_fft():
+        _, y_restored = scipy.signal.istft(
+            Zxx_restored, fs=sr_tgt, nperseg=N_FFT, noverlap=N_FFT - HOP_LEN
+        )
+    return y_restored
+
 
-    # 5. Guardar
+def aplicar_mascara_fir(archivo_enfermo, ruta_salida, f_mask, mask_db, fase="lineal"):
+    """
+    La misma máscara como FIR + convolución overlap-save, leyendo y
+    escribiendo por bloques (memoria constante, sin STFT). Con fase
+    lineal la salida queda alineada y dentro de fir.TOLERANCIA_RMS de la
+    ruta STFT.
+    """
+    with traza.paso(
+        "fir", f" -> Aplicando corrección espectral (FIR fase {fase}, por bloques)..."
+    ):
+        fs = sf.info(archivo_enfermo).samplerate
+        h, retardo = fir.disenar_fir(f_mask, mask_db, fs, fase=fase)
+        fir.filtrar_archivo(
+            archivo_enfermo, ruta_salida, h, retardo, dtype=dtype_real()
+        )
+        traza.leido(archivo_enfermo)
+        traza.escrito(ruta_salida)
+
+
+def restaurar_senal(y_ref, sr_ref, y_tgt, sr_tgt):
+    """
+    Restauración completa en memoria (sin tocar disco): útil para el
+    pipeline de init.py. Regresa el audio restaurado (a sr_tgt).
+    """
+    f_mask, mask_db = calcular_mascara(y_ref, sr_ref, y_tgt, sr_tgt)
+    return aplicar_mascara_stft(y_tgt, sr_tgt, f_mask, mask_db)
+
+
+def _restaurar_a_archivo(perfil_ref, archivo_enfermo, ruta_salida, motor, fase):
+    """
+    Máscara + motor (STFT, FIR o STFT ponderada por F0) + escritura de un
+    target. Regresa (f_mask, mask_db, segundos_audio, resumen de F0 o None)
+    o None si no se pudo cargar.
+    """
+    y_tgt, sr_tgt = cargar_audio(archivo_enfermo)
+    if y_tgt is None:
+        return None
+    f_mask, mask_db = calcular_mascara_perfil(perfil_ref, y_tgt, sr_tgt)
+    armonicidad = None
+    segmentos = None
+    if usar_vad() and motor != "fir":
+        with traza.paso("vad"):
+            segmentos = vad.segmentos(y_tgt, sr_tgt)
+            traza.anotar(fraccion_voz=vad.fraccion(segmentos, len(y_tgt)))
+    if motor == "fir":
+        aplicar_mascara_fir(archivo_enfermo, ruta_salida, f_mask, mask_db, fase)
+    else:
+        pista = None
+        if motor == "armonico":
+            with traza.paso("f0", " -> Siguiendo F0 del target..."):
+                pista = f0.seguir(*cache_espectral.para_analisis(y_tgt, sr_tgt))
+            armonicidad = f0.resumen(pista)
+        y_restored = aplicar_mascara_stft(
+            y_tgt, sr_tgt, f_mask, mask_db, pista, segmentos
+        )
+        with traza.paso("guardar"):
+            sf.write(ruta_salida, y_restored, sr_tgt)
+            traza.escrito(ruta_salida)
+    return f_mask, mask_db, len(y_tgt) / sr_tgt, armonicidad
+
+
+def _trabajo_restauracion(
+    archivo_sano, archivo_enfermo, perfil=None, motor="stft", fase="lineal"
+):
+    """
+    Entradas, clave y parámetros de manifiesto de una restauración.
+    Con perfil, la "referencia" es el .npz: si se regenera, se rehace.
+    """
+    if perfil is not None:
+        ruta_ref = perfiles.ruta_perfil(perfil)
+        referencia = f"perfil:{perfil}"
+    else:
+        ruta_ref = archivo_sano
+        referencia = ruta_relativa(archivo_sano)
     nombre_base = os.path.splitext(os.path.basename(archivo_enfermo))[0]
     ruta_salida = os.path.join(DIR_OUTPUT, f"{nombre_base}_RESTAURADO.wav")
+    params = {
+        "referencia": referencia,
+        "n_fft": N_FFT,
+        "hop": HOP_LEN,
+        "precision": precision(),
+    }
+    if fs_analisis():
+        params["fs_analisis"] = fs_analisis()
+    if usar_vad():
+        params["vad"] = vad.VERSION
+    if motor == "fir":
+        params.update(motor="fir", fase=fase, taps=fir.TAPS_DEFAULT)
+    elif motor == "armonico":
+        params.update(motor="armonico", umbral_f0=f0.UMBRAL)
+    return ruta_ref, [ruta_ref, archivo_enfermo], nombre_base, params, ruta_salida
+
+
+def _esta_al_dia(manifiesto, ruta_ref, entradas, clave, params, ruta_salida):
+    return os.path.exists(ruta_ref) and manifiesto.esta_al_dia(
+        "tomie", clave, entradas, [ruta_salida], params
+    )
+
+
+def aplicar_restauracion(
+    archivo_sano,
+    archivo_enfermo,
+    manifiesto=None,
+    forzar=False,
+    perfil=None,
+    motor="stft",
+    fase="lineal",
+):
+    """
+    Restaura archivo_enfermo contra archivo_sano, o contra un perfil
+    guardado si se da perfil=<nombre> (entonces archivo_sano se ignora).
+    motor="fir" usa el ecualizador FIR por bloques en lugar de la STFT;
+    motor="armonico" pondera la máscara por trama con la pista de F0.
+    """
+    if perfil is not None:
+        ref = f"Ref (Perfil):  {perfil}"
+    else:
+        ref = f"Ref (Sano):    {os.path.basename(archivo_sano)}"
+    encabezado = (
+        f"\n--- Iniciando Restauración ---\n{ref}\n"
+        f"Target (Post): {os.path.basename(archivo_enfermo)}"
+    )
+
+    # 0. ¿Ya se restauró este par y ninguno de los dos cambió?
+    with traza.paso("preparar", encabezado):
+        ruta_ref, entradas, clave, params, ruta_salida = _trabajo_restauracion(
+            archivo_sano, archivo_enfermo, perfil, motor, fase
+        )
+    if (
+        manifiesto is not None
+        and not forzar
+        and _esta_al_dia(manifiesto, ruta_ref, entradas, clave, params, ruta_salida)
+    ):
+        traza.avisar(
+            " [SKIP] Ni la referencia ni el target cambiaron desde la última vez."
+        )
+        return ruta_salida
+
+    with traza.archivo(
+        "tomie",
+        ruta_relativa(archivo_enfermo),
+        referencia=params["referencia"],
+        motor=motor,
+    ):
+        # 1. Cargar referencia (perfil o audio) y target
+        if perfil is not None:
+            try:
+                perfil_ref = cargar_perfil_referencia(perfil)
+            except (OSError, ValueError) as e:
+                traza.avisar(f"[ERROR] No se pudo cargar el perfil '{perfil}': {e}")
+                return
+        else:
+            y_ref, sr_ref = cargar_audio(archivo_sano)
+            if y_ref is None:
+                return
+            with traza.paso(
+                "perfil_referencia", " -> Calculando perfiles espectrales..."
+            ):
+                perfil_ref = perfil_de_audio(y_ref, sr_ref)
+
+        # 2-5. Máscara + STFT/ISTFT (o FIR) + guardar
+        if (
+            _restaurar_a_archivo(perfil_ref, archivo_enfermo, ruta_salida, motor, fase)
+            is None
+        ):
+            return
+        traza.avisar(f" [EXITO] Audio restaurado guardado en:\n    {ruta_salida}")
+
+    if manifiesto is not None:
+        manifiesto.registrar("tomie", clave, entradas, [ruta_salida], params)
+    return ruta_salida
+
+
+def listar_perfiles():
+    nombres = perfiles.listar()
+    if not nombres:
+        print("No hay perfiles guardados en data/perfiles.")
+        return
+    for nombre in nombres:
+        p = perfiles.cargar(nombre)
+        estado = "vigente" if perfiles.esta_vigente(p) else "FUENTES CAMBIARON"
+        n = len(p["params"].get("fuentes", []))
+        print(f" - {nombre}: {n} audio(s), fs={p['params'].get('fs')} Hz [{estado}]")
+
+
+# --- MODO LOTE: muchos targets contra una sola referencia ---
+
+
+def estadisticas_mascara(f_mask, mask_db):
+    """Resumen de la máscara aplicada (para el índice de resultados)."""
+    voz = (f_mask >= 80) & (f_mask <= 5000)
+    return {
+        "min_db": float(np.min(mask_db)),
+        "max_db": float(np.max(mask_db)),
+        "media_db": float(np.mean(mask_db)),
+        "media_voz_db": float(np.mean(mask_db[voz])) if np.any(voz) else None,
+        "frac_tope_boost": float(np.mean(mask_db >= MASCARA_MAX_DB)),
+        "frac_tope_corte": float(np.mean(mask_db <= MASCARA_MIN_DB)),
+    }
+
+
+def _restaurar_objetivo(perfil_ref, archivo_enfermo, ruta_salida, motor, fase):
+    """Corre en un proceso hijo: máscara + STFT/ISTFT (o FIR) + escritura."""
+    inicio = time.perf_counter()
+    resultado = {
+        "archivo": archivo_enfermo,
+        "salida": ruta_salida,
+        "ok": False,
+        "error": "",
+        "segundos_audio": 0.0,
+        "mascara": None,
+        "armonicidad": None,
+    }
+    try:
+        with traza.archivo(
+            "tomie", ruta_relativa(archivo_enfermo), lote=True, motor=motor
+        ):
+            r = _restaurar_a_archivo(
+                perfil_ref, archivo_enfermo, ruta_salida, motor, fase
+            )
+        if r is None:
+            resultado["error"] = "no se pudo cargar"
+        else:
+            f_mask, mask_db, segundos_audio, armonicidad = r
+            resultado.update(
+                ok=True,
+                segundos_audio=segundos_audio,
+                mascara=estadisticas_mascara(f_mask, mask_db),
+                armonicidad=armonicidad,
+            )
+    except Exception as e:
+        resultado["error"] = str(e)
+    resultado["segundos_proceso"] = time.perf_counter() - inicio
+    return resultado
+
+
+def listar_objetivos(objetivo):
+    """Acepta un directorio (todos sus .wav) o un patrón glob."""
+    if os.path.isdir(objetivo):
+        objetivo = os.path.join(objetivo, "*.wav")
+    return sorted(f for f in glob.glob(objetivo) if os.path.isfile(f))
+
+
+def _cargar_indice(ruta):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return {r["archivo"]: r for r in json.load(f).get("resultados", [])}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def _guardar_indice(ruta, referencia, resultados, motor="stft", fase="lineal"):
+    datos = {
+        "referencia": referencia,
+        "motor": f"fir ({fase})" if motor == "fir" else motor,
+        "n_fft": N_FFT,
+        "hop": HOP_LEN,
+        "precision": precision(),
+        "resultados": resultados,
+    }
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, ruta)
+
+
+def restaurar_lote(
+    objetivos,
+    archivo_sano=None,
+    perfil=None,
+    workers=None,
+    forzar=False,
+    indice=None,
+    motor="stft",
+    fase="lineal",
+):
+    """
+    Restaura todos los 'objetivos' (lista de rutas) contra la misma
+    referencia: un audio sano o un perfil guardado. El perfil se calcula o
+    se carga UNA vez en el proceso principal; la máscara/STFT/ISTFT de
+    cada target corre en un pool de procesos. Escribe un índice JSON con
+    la salida y las estadísticas de la máscara de cada target.
+    Regresa la lista de resultados (mismo orden que 'objetivos').
+    """
+    os.makedirs(DIR_OUTPUT, exist_ok=True)
+    indice = indice or os.path.join(DIR_OUTPUT, "indice_restauracion.json")
+
+    if perfil is not None:
+        perfil_ref = cargar_perfil_referencia(perfil)
+        referencia = f"perfil:{perfil}"
+    else:
+        y_ref, sr_ref = cargar_audio(archivo_sano)
+        if y_ref is None:
+            return []
+        print(" -> Calculando perfil de la referencia (una sola vez)...")
+        perfil_ref = perfil_de_audio(y_ref, sr_ref)
+        referencia = ruta_relativa(archivo_sano)
+        # La referencia no se restaura contra sí misma
+        objetivos = [
+            o for o in objetivos if os.path.abspath(o) != os.path.abspath(archivo_sano)
+        ]
+
+    workers = workers or os.cpu_count() or 1
+    manifiesto = Manifiesto()
+    previos = _cargar_indice(indice)
+    resultados = {}
+    trabajos = {}
+    for objetivo in objetivos:
+        trabajo = _trabajo_restauracion(archivo_sano, objetivo, perfil, motor, fase)
+        ruta_ref, entradas, clave, params, ruta_salida = trabajo
+        if not forzar and _esta_al_dia(
+            manifiesto, ruta_ref, entradas, clave, params, ruta_salida
+        ):
+            previo = previos.get(ruta_relativa(objetivo), {})
+            resultados[objetivo] = {
+                "archivo": objetivo,
+                "salida": ruta_salida,
+                "ok": True,
+                "omitido": True,
+                "error": "",
+                "segundos_audio": previo.get("segundos_audio", 0.0),
+                "segundos_proceso": 0.0,
+                "mascara": previo.get("mascara"),
+                "armonicidad": previo.get("armonicidad"),
+            }
+        else:
+            trabajos[objetivo] = trabajo
+
+    print(
+        f"--- Lote: {len(trabajos)} por restaurar, {len(resultados)} sin cambios, "
+        f"{workers} procesos (ref: {referencia}) ---"
+    )
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(_restaurar_objetivo, perfil_ref, o, t[4], motor, fase): o
+            for o, t in trabajos.items()
+        }
+        for futuro in as_completed(futuros):
+            r = futuro.result()
+            resultados[r["archivo"]] = r
+            ruta_ref, entradas, clave, params, ruta_salida = trabajos[r["archivo"]]
+            if r["ok"]:
+                manifiesto.registrar("tomie", clave, entradas, [ruta_salida], params)
+                manifiesto.guardar()
+            estado = "OK" if r["ok"] else f"ERROR: {r['error']}"
+            print(f" [{estado}] {os.path.basename(r['archivo'])}")
+    total = time.perf_counter() - inicio
+
+    ordenados = [resultados[o] for o in objetivos]
+    _guardar_indice(
+        indice,
+        referencia,
+        [
+            dict(
+                r,
+                archivo=ruta_relativa(r["archivo"]),
+                salida=ruta_relativa(r["salida"]),
+            )
+            for r in ordenados
+        ],
+        motor,
+        fase,
+    )
+    imprimir_resumen_lote(ordenados, total)
+    print(f" [INDICE] {indice}")
+    return ordenados
 
-    sf.write(ruta_salida, y_restored, sr_tgt)
-    print(f" [EXITO] Audio restaurado guardado en:\n    {ruta_salida}")
+
+def imprimir_resumen_lote(resultados, segundos):
+    ancho = max([len(os.path.basename(r["archivo"])) for r in resultados] + [7])
+    print("\n" + "-" * (ancho + 44))
+    print(
+        f"{'Archivo':<{ancho}}  {'Estado':<7} {'Audio(s)':>9} "
+        f"{'Máscara media/máx (dB)':>24}"
+    )
+    print("-" * (ancho + 44))
+    for r in resultados:
+        estado = "SKIP" if r.get("omitido") else ("OK" if r["ok"] else "ERROR")
+        m = r["mascara"]
+        mascara = f"{m['media_db']:+6.1f} / {m['max_db']:+5.1f}" if m else "-"
+        print(
+            f"{os.path.basename(r['archivo']):<{ancho}}  {estado:<7} "
+            f"{r['segundos_audio']:>9.1f} {mascara:>24}"
+        )
+    print("-" * (ancho + 44))
+    hechos = [r for r in resultados if r["ok"] and not r.get("omitido")]
+    print(
+        f"Restaurados: {len(hechos)}  "
+        f"Omitidos: {sum(1 for r in resultados if r.get('omitido'))}  "
+        f"Errores: {sum(1 for r in resultados if not r['ok'])}"
+    )
+    if segundos > 0:
+        audio = sum(r["segundos_audio"] for r in hechos)
+        print(
+            f"Tiempo total: {segundos:.2f} s  |  "
+            f"{audio / segundos:.1f} s de audio por segundo"
+        )
+
+
+def restaurar_stdin(perfil, perfil_objetivo, fase="minima", bloque=None):
+    """
+    Filtra PCM crudo s16le mono de stdin a stdout con el FIR de la máscara
+    entre dos perfiles guardados (referencia sana y perfil post-operatorio,
+    p. ej. de cohorte). Latencia: un bloque + retardo de grupo del FIR.
+    Los mensajes van a stderr para no ensuciar el audio.
+    """
+    with contextlib.redirect_stdout(sys.stderr):  # stdout es el audio
+        perfil_ref = cargar_perfil_referencia(perfil)
+        perfil_tgt = cargar_perfil_referencia(perfil_objetivo)
+    fs = perfil_tgt["params"].get("fs", FS_TARGET)
+    f_mask, mask_db = calcular_mascara_entre_perfiles(perfil_ref, perfil_tgt)
+    h, retardo = fir.disenar_fir(f_mask, mask_db, fs, fase=fase)
+    bloque = bloque or fir.BLOQUE_DEFAULT
+    print(
+        f" [STREAM] {fs} Hz s16le mono, FIR {len(h)} taps fase {fase}, "
+        f"latencia ~{(bloque + retardo) / fs * 1000:.0f} ms",
+        file=sys.stderr,
+    )
+    n = fir.filtrar_stream(
+        sys.stdin.buffer, sys.stdout.buffer, h, bloque, dtype=dtype_real()
+    )
+    print(f" [STREAM] {n / fs:.1f} s de audio procesados", file=sys.stderr)
 
 
-def main():
+def main(forzar=False, perfil=None, motor="stft", fase="lineal"):
     if not os.path.exists(DIR_OUTPUT):
         os.makedirs(DIR_OUTPUT)
 
     print("--- 3_TOMIE.PY: Restauración Espectral ---")
     wavs = sorted(glob.glob(os.path.join(DIR_INPUT, "*.wav")))
 
+    if perfil is not None:
+        # Con perfil guardado solo hace falta elegir el target
+        if not wavs:
+            print("[ERROR] No hay audios en 'data/1_input'.")
+            return
+        for i, w in enumerate(wavs):
+            print(f" [{i}] {os.path.basename(w)}")
+        try:
+            idx_tgt = int(input("\nSelecciona el audio ENFERMO (A restaurar): "))
+            manifiesto = Manifiesto()
+            aplicar_restauracion(
+                None,
+                wavs[idx_tgt],
+                manifiesto,
+                forzar=forzar,
+                perfil=perfil,
+                motor=motor,
+                fase=fase,
+            )
+            manifiesto.guardar()
+        except (ValueError, IndexError):
+            print("[ERROR] Selección inválida.")
+        return
+
     if len(wavs) < 2:
         print("[ERROR] Necesito al menos 2 audios en 'data/1_input'.")
         return
@@ -139,11 +793,129 @@ def main():
         idx_ref = int(input("\n1. Selecciona el audio SANO (Referencia): "))
         idx_tgt = int(input("2. Selecciona el audio ENFERMO (A restaurar): "))
 
-        aplicar_restauracion(wavs[idx_ref], wavs[idx_tgt])
+        manifiesto = Manifiesto()
+        aplicar_restauracion(
+            wavs[idx_ref],
+            wavs[idx_tgt],
+            manifiesto,
+            forzar=forzar,
+            motor=motor,
+            fase=fase,
+        )
+        manifiesto.guardar()
 
     except (ValueError, IndexError):
         print("[ERROR] Selección inválida.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Etapa 3: restauración espectral")
+    parser.add_argument(
+        "--forzar",
+        action="store_true",
+        help="Restaurar aunque el manifiesto diga que nada cambió",
+    )
+    parser.add_argument(
+        "--perfil",
+        metavar="NOMBRE",
+        help="Usar un perfil de referencia guardado en lugar de un audio sano",
+    )
+    parser.add_argument(
+        "--crear-perfil",
+        nargs="+",
+        metavar="ARG",
+        help="NOMBRE AUDIO [AUDIO ...]: guardar el perfil NOMBRE a partir de "
+        "uno o varios audios sanos (varios = promedio de cohorte)",
+    )
+    parser.add_argument(
+        "--lote",
+        metavar="RUTA",
+        help="Modo sin preguntas: restaurar todos los .wav de un directorio o "
+        "patrón glob contra --referencia o --perfil",
+    )
+    parser.add_argument(
+        "--referencia", metavar="AUDIO", help="Audio sano de referencia para --lote"
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos del pool en modo lote (default: número de núcleos)",
+    )
+    parser.add_argument(
+        "--indice",
+        metavar="JSON",
+        default=None,
+        help="Índice de resultados del lote "
+        "(default: data/2_output/indice_restauracion.json)",
+    )
+    parser.add_argument(
+        "--motor",
+        choices=MOTORES,
+        default="stft",
+        help="stft = STFT/ISTFT en memoria; fir = ecualizador FIR por bloques "
+        "(memoria constante, archivos de cualquier tamaño); armonico = STFT "
+        "con la máscara ponderada por trama según la pista de F0",
+    )
+    parser.add_argument(
+        "--fase",
+        choices=fir.FASES,
+        default=None,
+        help="Fase del FIR (default: lineal en archivos, minima en --stdin)",
+    )
+    parser.add_argument(
+        "--stdin",
+        action="store_true",
+        help="Filtrar PCM s16le mono de stdin a stdout (necesita --perfil y "
+        "--perfil-objetivo)",
+    )
+    parser.add_argument(
+        "--perfil-objetivo",
+        metavar="NOMBRE",
+        help="Perfil guardado del audio a restaurar (p. ej. cohorte post-op) "
+        "para --stdin",
+    )
+    parser.add_argument(
+        "--listar-perfiles", action="store_true", help="Mostrar los perfiles guardados"
+    )
+    agregar_argumentos(parser)
+    traza.agregar_argumentos(parser)
+    args = parser.parse_args()
+    configurar_desde_args(args)
+    traza.configurar_desde_args(args)
+    if args.listar_perfiles:
+        listar_perfiles()
+    elif args.lote:
+        if (args.referencia is None) == (args.perfil is None):
+            parser.error("--lote necesita --referencia AUDIO o --perfil NOMBRE")
+        objetivos = listar_objetivos(args.lote)
+        if not objetivos:
+            print(f" [!] No hay archivos .wav en: {args.lote}")
+            sys.exit(1)
+        resultados = restaurar_lote(
+            objetivos,
+            archivo_sano=args.referencia,
+            perfil=args.perfil,
+            workers=args.workers,
+            forzar=args.forzar,
+            indice=args.indice,
+            motor=args.motor,
+            fase=args.fase or "lineal",
+        )
+        sys.exit(0 if resultados and all(r["ok"] for r in resultados) else 1)
+    elif args.crear_perfil:
+        if len(args.crear_perfil) < 2:
+            parser.error("--crear-perfil necesita NOMBRE y al menos un audio")
+        crear_perfil_referencia(args.crear_perfil[0], args.crear_perfil[1:])
+    elif args.stdin:
+        if args.perfil is None or args.perfil_objetivo is None:
+            parser.error("--stdin necesita --perfil y --perfil-objetivo")
+        restaurar_stdin(args.perfil, args.perfil_objetivo, args.fase or "minima")
+    else:
+        main(
+            forzar=args.forzar,
+            perfil=args.perfil,
+            motor=args.motor,
+            fase=args.fase or "lineal",
+        )
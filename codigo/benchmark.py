@@ -0,0 +1,623 @@
+# Benchmarks de todas las etapas con seguimiento de regresiones
+#
+#   python benchmark.py correr [--duraciones 5 30] [--fs 16000 44100] ...
+#       Genera voces sintéticas (pila armónica + ruido), mide cada etapa
+#       (tiempo mínimo/mediana y pico de memoria) y guarda un JSON.
+#   python benchmark.py comparar base.json nuevo.json [--umbral 0.15]
+#       Marca las etapas que se hicieron más lentas, usan más memoria o
+#       cuya salida cambió respecto a la línea base. Sale con código 1 si
+#       hay alguna regresión.
+#   python benchmark.py verificar
+#       Golden checks: las rutas rápidas (streaming, float32, memory-map,
+#       FIR, perfiles guardados...) siguen dando el mismo audio que la
+#       ruta de referencia, dentro de su cota documentada.
+#   python benchmark.py arranque
+#       Tiempo de arranque de cordectomia.py (--help y cada subcomando,
+#       en un proceso nuevo) contra cordectomia.PRESUPUESTO_ARRANQUE.
+#
+# La caché espectral se desactiva para medir el cálculo, no los aciertos.
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ["CORDECTOMIA_CACHE"] = "0"
+
+import numpy as np  # noqa: E402
+import scipy  # noqa: E402
+import soundfile as sf  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_BENCH = os.path.join(BASE_DIR, "..", "data", "benchmarks")
+
+DURACIONES = (5, 30)  # Segundos de audio sintético
+FRECUENCIAS = (16000, 44100)
+REPETICIONES = 3
+UMBRAL = 0.15  # +15 % de tiempo o memoria = regresión
+PISO_SEGUNDOS = 0.005  # Diferencias menores son ruido de medición
+PISO_MB = 1.0
+TOLERANCIA_SALIDA = 1e-4  # Cambio relativo de RMS que cuenta como "otra salida"
+
+ETAPAS = (
+    "normalizar",
+    "denoise_audio",
+    "calcular_perfil_espectral",
+    "aplicar_restauracion",
+    "generar_analisis",
+)
+
+
+# --- SEÑALES SINTÉTICAS ---
+
+
+def voz_sintetica(duracion, fs, f0=140.0, armonicos=30, ruido=0.02, semilla=0):
+    """
+    Pila armónica con vibrato lento y envolvente silábica, más ruido
+    blanco. armonicos bajos + ruido alto ~ voz post-cordectomía.
+    """
+    rng = np.random.default_rng(semilla)
+    t = np.arange(int(duracion * fs)) / fs
+    f_inst = f0 * (1 + 0.03 * np.sin(2 * np.pi * 5.0 * t))
+    fase = 2 * np.pi * np.cumsum(f_inst) / fs
+    x = np.zeros_like(t)
+    for k in range(1, armonicos + 1):
+        if k * f0 * 1.05 >= fs / 2:
+            break
+        x += np.sin(k * fase) / k
+    envolvente = 0.5 + 0.5 * np.sin(2 * np.pi * 3.0 * t) ** 2
+    x = 0.3 * x / np.max(np.abs(x)) * envolvente
+    return np.clip(x + ruido * rng.standard_normal(len(t)), -1.0, 1.0)
+
+
+def preparar_caso(directorio, duracion, fs):
+    """Escribe los archivos de un caso (pre, post, OGG crudo) y los regresa."""
+    pre = voz_sintetica(duracion, fs, armonicos=30, ruido=0.01, semilla=1)
+    post = voz_sintetica(duracion, fs, armonicos=6, ruido=0.05, semilla=2)
+    base = os.path.join(directorio, f"{fs}_{duracion}")
+    caso = {
+        "duracion": duracion,
+        "fs": fs,
+        "pre": pre,
+        "post": post,
+        "wav_pre": f"{base}_pre.wav",
+        "wav_post": f"{base}_post.wav",
+        "ogg": f"{base}_crudo.ogg",
+        "wav_norm": f"{base}_norm.wav",
+    }
+    sf.write(caso["wav_pre"], pre, fs, subtype="PCM_16")
+    sf.write(caso["wav_post"], post, fs, subtype="PCM_16")
+    sf.write(caso["ogg"], post, fs, format="OGG", subtype="VORBIS")
+    return caso
+
+
+# --- ETAPAS ---
+
+
+def cargar_etapas(directorio):
+    """Importa las etapas y redirige sus salidas a 'directorio'."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    sys.path.insert(0, BASE_DIR)
+    mods = {
+        "normalizar": importlib.import_module("0_normalizar"),
+        "denoiser": importlib.import_module("1_denoiser"),
+        "cordie": importlib.import_module("2_cordie"),
+        "tomie": importlib.import_module("3_tomie"),
+    }
+    mods["tomie"].DIR_OUTPUT = directorio
+    mods["cordie"].DIR_IMG_OUT = directorio
+    return mods
+
+
+def funciones_etapa(mods):
+    """etapa -> función(caso) que la ejecuta una vez."""
+    tomie = mods["tomie"]
+    return {
+        "normalizar": lambda c: (
+            mods["normalizar"].convertir_archivo(c["ogg"], c["wav_norm"]),
+            c["wav_norm"],
+        )[1],
+        "denoise_audio": lambda c: mods["denoiser"].denoise_audio(c["post"], c["fs"]),
+        "calcular_perfil_espectral": lambda c: tomie.calcular_perfil_espectral(
+            c["pre"], c["fs"]
+        )[1],
+        "aplicar_restauracion": lambda c: tomie.aplicar_restauracion(
+            c["wav_pre"], c["wav_post"]
+        ),
+        "generar_analisis": lambda c: mods["cordie"].generar_analisis(
+            c["wav_pre"], c["wav_post"]
+        ),
+    }
+
+
+def huella_salida(salida):
+    """Resumen comparable de la salida de una etapa (golden output)."""
+    if salida is None:
+        return None
+    if isinstance(salida, str):
+        salida, _ = sf.read(salida)
+    salida = np.asarray(salida, dtype=np.float64)
+    return {
+        "n": int(salida.size),
+        "rms": float(np.sqrt(np.mean(salida**2))) if salida.size else 0.0,
+    }
+
+
+def medir(funcion, caso, repeticiones):
+    """
+    Una corrida con tracemalloc (pico de memoria, y de paso calienta
+    cachés/imports) y 'repeticiones' corridas cronometradas sin él.
+    """
+    silencio = io.StringIO()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(silencio):
+        salida = funcion(caso)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(silencio):
+            funcion(caso)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos, pico, salida
+
+
+def metadatos():
+    return {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "precision": os.environ.get("CORDECTOMIA_PRECISION", "float64"),
+    }
+
+
+def correr(
+    duraciones=DURACIONES,
+    frecuencias=FRECUENCIAS,
+    repeticiones=REPETICIONES,
+    etapas=ETAPAS,
+):
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="bench_cordectomia_") as tmp:
+        funciones = funciones_etapa(cargar_etapas(tmp))
+        for fs in frecuencias:
+            for duracion in duraciones:
+                caso = preparar_caso(tmp, duracion, fs)
+                for etapa in etapas:
+                    tiempos, pico, salida = medir(funciones[etapa], caso, repeticiones)
+                    mediana = statistics.median(tiempos)
+                    r = {
+                        "etapa": etapa,
+                        "fs": fs,
+                        "duracion": duracion,
+                        "repeticiones": repeticiones,
+                        "segundos_min": min(tiempos),
+                        "segundos_mediana": mediana,
+                        "xrt": duracion / mediana if mediana > 0 else None,
+                        "pico_mb": pico / 1e6,
+                        "salida": huella_salida(salida),
+                    }
+                    resultados.append(r)
+                    print(
+                        f" {etapa:<26} {fs:>6} Hz {duracion:>5} s  "
+                        f"{mediana:>8.3f} s  {r['pico_mb']:>8.1f} MB  "
+                        f"x{r['xrt']:.0f} tiempo real"
+                    )
+    meta = metadatos()
+    meta["rss_max_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"meta": meta, "resultados": resultados}
+
+
+# --- COMPARACIÓN CONTRA LÍNEA BASE ---
+
+
+def comparar(base, nuevo, umbral=UMBRAL):
+    """
+    Regresa la lista de hallazgos [(etapa, fs, duracion, tipo, detalle)].
+    tipo: "TIEMPO", "MEMORIA" o "SALIDA".
+    """
+    clave = lambda r: (r["etapa"], r["fs"], r["duracion"])  # noqa: E731
+    previos = {clave(r): r for r in base["resultados"]}
+    hallazgos = []
+    for r in nuevo["resultados"]:
+        b = previos.get(clave(r))
+        if b is None:
+            continue
+        t0, t1 = b["segundos_mediana"], r["segundos_mediana"]
+        if t1 > t0 * (1 + umbral) and t1 - t0 > PISO_SEGUNDOS:
+            hallazgos.append(
+                (*clave(r), "TIEMPO", f"{t0:.3f} s -> {t1:.3f} s ({t1 / t0 - 1:+.0%})")
+            )
+        m0, m1 = b["pico_mb"], r["pico_mb"]
+        if m1 > m0 * (1 + umbral) and m1 - m0 > PISO_MB:
+            hallazgos.append(
+                (
+                    *clave(r),
+                    "MEMORIA",
+                    f"{m0:.1f} MB -> {m1:.1f} MB ({m1 / m0 - 1:+.0%})",
+                )
+            )
+        s0, s1 = b.get("salida"), r.get("salida")
+        if s0 and s1:
+            rel = abs(s1["rms"] - s0["rms"]) / max(s0["rms"], 1e-12)
+            if s0["n"] != s1["n"] or rel > TOLERANCIA_SALIDA:
+                hallazgos.append(
+                    (
+                        *clave(r),
+                        "SALIDA",
+                        f"n {s0['n']} -> {s1['n']}, RMS {rel:.1e} relativo",
+                    )
+                )
+    return hallazgos
+
+
+def imprimir_comparacion(base, nuevo, hallazgos):
+    clave = lambda r: (r["etapa"], r["fs"], r["duracion"])  # noqa: E731
+    previos = {clave(r): r for r in base["resultados"]}
+    print(f"{'Etapa':<26} {'fs':>6} {'dur':>5}  {'base':>8} {'nuevo':>8} {'cambio':>7}")
+    for r in nuevo["resultados"]:
+        b = previos.get(clave(r))
+        if b is None:
+            continue
+        t0, t1 = b["segundos_mediana"], r["segundos_mediana"]
+        print(
+            f"{r['etapa']:<26} {r['fs']:>6} {r['duracion']:>5}  "
+            f"{t0:>8.3f} {t1:>8.3f} {t1 / t0 - 1:>+7.0%}"
+        )
+    print()
+    if not hallazgos:
+        print(" [OK] Sin regresiones.")
+    for etapa, fs, duracion, tipo, detalle in hallazgos:
+        print(f" [REGRESIÓN {tipo}] {etapa} ({fs} Hz, {duracion} s): {detalle}")
+
+
+# --- GOLDEN CHECKS: rutas rápidas == ruta de referencia ---
+
+
+def verificar(duracion=5, fs=44100):
+    """
+    Compara cada ruta optimizada contra su referencia. Regresa una lista
+    de (nombre, error medido, cota, ok).
+    """
+    import scipy.signal
+
+    from utils import f0, fir, precision, vad, wav_mmap, welch_incremental, wiener
+
+    checks = []
+
+    def check(nombre, error, cota):
+        checks.append((nombre, float(error), cota, bool(error <= cota)))
+
+    with tempfile.TemporaryDirectory(prefix="golden_cordectomia_") as tmp:
+        mods = cargar_etapas(tmp)
+        den, tomie = mods["denoiser"], mods["tomie"]
+        caso = preparar_caso(tmp, duracion, fs)
+        silencio = io.StringIO()
+        with contextlib.redirect_stdout(silencio):
+            # 1. Denoiser en streaming vs en memoria (tras PCM_16: <= 1 LSB)
+            ref = den.denoise_audio(sf.read(caso["wav_post"])[0], fs)
+            salida = os.path.join(tmp, "streaming.wav")
+            den.denoise_file_streaming(caso["wav_post"], salida)
+            y = sf.read(salida)[0]
+            n = min(len(y), len(ref))
+            ref16 = np.round(np.clip(ref[:n], -1, 1) * 32767) / 32767
+            check(
+                "denoise streaming vs memoria", np.max(np.abs(y[:n] - ref16)), 2 / 32768
+            )
+
+            # 2. float32 vs float64
+            precision.configurar("float32")
+            try:
+                y32 = den.denoise_audio(caso["post"], fs)
+            finally:
+                precision.configurar("float64")
+            n = min(len(y32), len(ref))
+            y64 = den.denoise_audio(caso["post"], fs)
+            check(
+                "denoise float32 vs float64",
+                np.max(np.abs(y32[:n] - y64[:n])),
+                precision.COTA_ERROR_FLOAT32,
+            )
+
+            # 3. Kernel de Wiener (numba y NumPy) vs la fórmula de referencia
+            _, _, Z = scipy.signal.stft(caso["post"], fs, nperseg=den.NPERSEG)
+            ruido = np.percentile(np.abs(Z), 10, axis=1, keepdims=True) ** 2
+            ref = np.abs(Z) * den.wiener_gain(np.abs(Z) ** 2, ruido)
+            ref = ref * np.exp(1j * np.angle(Z))
+            previo = os.environ.get("CORDECTOMIA_NUMBA")
+            rutas = ("1", "0") if wiener.usa_numba() else ("0",)
+            for valor in rutas:
+                os.environ["CORDECTOMIA_NUMBA"] = valor
+                y = wiener.aplicar_ganancia(Z.copy(), ruido, den.ALPHA)
+                nombre = "numba" if wiener.usa_numba() else "NumPy"
+                check(
+                    f"ganancia Wiener {nombre} vs fórmula",
+                    np.max(np.abs(y - ref)) / np.max(np.abs(ref)),
+                    1e-12,
+                )
+            if previo is None:
+                os.environ.pop("CORDECTOMIA_NUMBA")
+            else:
+                os.environ["CORDECTOMIA_NUMBA"] = previo
+
+            # 4. Welch por memory-map / acumulador vs scipy
+            x = sf.read(caso["wav_pre"])[0]
+            _, p_ref = scipy.signal.welch(x, fs, nperseg=tomie.N_FFT)
+            _, p_mm = welch_incremental.welch(
+                wav_mmap.abrir(caso["wav_pre"]), fs, tomie.N_FFT
+            )
+            check(
+                "welch memory-map vs scipy",
+                np.max(np.abs(p_mm - p_ref)) / p_ref.max(),
+                1e-9,
+            )
+
+            # 5. Máscara por perfil guardado vs cálculo directo (dB)
+            x_post = sf.read(caso["wav_post"])[0]
+            perfil = tomie.perfil_de_audio(x, fs)
+            _, m_perfil = tomie.calcular_mascara_perfil(perfil, x_post, fs)
+            m_directa = np.clip(
+                tomie.suavizar_curva(
+                    tomie.calcular_perfil_espectral(x, fs)[1]
+                    - tomie.calcular_perfil_espectral(x_post, fs)[1]
+                ),
+                tomie.MASCARA_MIN_DB,
+                tomie.MASCARA_MAX_DB,
+            )
+            check(
+                "máscara perfil vs directa (dB)",
+                np.max(np.abs(m_perfil - m_directa)),
+                1e-9,
+            )
+
+            # 6. Motor FIR (fase lineal) vs STFT
+            f_mask, mask_db = tomie.calcular_mascara(x, fs, x_post, fs)
+            y_stft = tomie.aplicar_mascara_stft(x_post, fs, f_mask, mask_db)
+            salida = os.path.join(tmp, "fir.wav")
+            tomie.aplicar_mascara_fir(caso["wav_post"], salida, f_mask, mask_db)
+            y_fir = sf.read(salida)[0]
+            n = len(y_fir)
+            err = np.sqrt(np.mean((y_fir - y_stft[:n]) ** 2) / np.mean(y_stft[:n] ** 2))
+            check("restauración FIR vs STFT (RMS rel)", err, fir.TOLERANCIA_RMS)
+
+            # 7. Pista de F0 (YIN por FFT) vs el F0 con vibrato de la síntesis
+            pista = f0.seguir(caso["pre"], fs)
+            verdad = 140.0 * (1 + 0.03 * np.sin(2 * np.pi * 5.0 * pista["tiempo"]))
+            rel = (
+                np.abs(pista["f0"] - verdad)[pista["sonora"]] / verdad[pista["sonora"]]
+            )
+            err = np.percentile(rel, 95) if len(rel) else np.inf
+            check("F0 YIN vs síntesis (p95 rel)", err, 0.01)
+
+            # 8. Máscara de restauración a la tasa de análisis reducida vs a
+            #    la tasa completa (la rejilla en Hz cambia un poco: se compara
+            #    la curva suavizada que de verdad se aplica)
+            precision.configurar(fs_analisis=16000)
+            try:
+                f_red, m_red = tomie.calcular_mascara(x, fs, x_post, fs)
+            finally:
+                precision.configurar(fs_analisis=0)
+            banda = (f_mask >= 80) & (f_mask <= 5000)
+            err = np.max(np.abs(np.interp(f_mask, f_red, m_red) - mask_db)[banda])
+            check("máscara 16 kHz vs completa (dB)", err, 0.5)
+
+            # 9. Welch solo con voz (segmentos de utils.vad) vs scipy por tramo
+            x = x.copy()
+            x[fs : 2 * fs] = 0  # Dos pausas: al menos tres tramos
+            x[3 * fs : int(3.5 * fs)] = 0
+            segmentos = vad.detectar(x, fs)
+            _, p_voz = welch_incremental.welch(x, fs, tomie.N_FFT, segmentos)
+            suma, pesos = 0, 0
+            for inicio, fin in segmentos:
+                if fin - inicio >= tomie.N_FFT:
+                    _, p = scipy.signal.welch(x[inicio:fin], fs, nperseg=tomie.N_FFT)
+                    k = (fin - inicio - tomie.N_FFT) // (tomie.N_FFT // 2) + 1
+                    suma, pesos = suma + k * p, pesos + k
+            check(
+                "welch con VAD vs scipy por tramo",
+                np.max(np.abs(p_voz - suma / pesos)) / np.max(suma / pesos),
+                1e-9,
+            )
+
+        # 10. Primera llamada al kernel desde dos hilos a la vez (como
+        #     init.py): en un proceso nuevo, sin calentar, y con tiempo
+        #     límite porque el fallo conocido es que el proceso no termina
+        if wiener.usa_numba():
+            check("ganancia Wiener desde dos hilos", _wiener_en_hilos(), 1e-12)
+    return checks
+
+
+_SONDA_HILOS = """
+from concurrent.futures import ThreadPoolExecutor
+import os
+import numpy as np
+from utils import wiener
+
+rng = np.random.default_rng(0)
+Z = rng.standard_normal((513, 400)) + 1j * rng.standard_normal((513, 400))
+ruido = np.full((513, 1), 0.5)
+with ThreadPoolExecutor(max_workers=2) as pool:
+    ys = list(pool.map(lambda _: wiener.aplicar_ganancia(Z, ruido, 2.0), range(2)))
+os.environ["CORDECTOMIA_NUMBA"] = "0"
+ref = wiener.aplicar_ganancia(Z, ruido, 2.0)
+print(max(np.max(np.abs(y - ref)) / np.max(np.abs(ref)) for y in ys))
+"""
+
+
+def _wiener_en_hilos(limite=120):
+    """Error relativo de la sonda de hilos; inf si se cuelga o falla."""
+    import subprocess
+
+    try:
+        sonda = subprocess.run(
+            [sys.executable, "-c", _SONDA_HILOS],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=limite,
+        )
+    except subprocess.TimeoutExpired:
+        return np.inf
+    if sonda.returncode != 0:
+        return np.inf
+    return float(sonda.stdout.split()[-1])
+
+
+def imprimir_verificacion(checks):
+    for nombre, error, cota, ok in checks:
+        estado = "OK" if ok else "FALLA"
+        print(f" [{estado:<5}] {nombre:<38} error {error:.2e}  (cota {cota:.1e})")
+
+
+# --- ARRANQUE DE LA CLI ---
+
+# Argumentos mínimos para que cada subcomando pase el parser
+_ARGS_ARRANQUE = {
+    "--help": ["--help"],
+    "normalize": ["--solo-importar", "normalize"],
+    "denoise": ["--solo-importar", "denoise"],
+    "analyze": ["--solo-importar", "analyze"],
+    "restore": ["--solo-importar", "restore", "x", "--perfil", "x"],
+    "compare": ["--solo-importar", "compare", "x"],
+    "features": ["--solo-importar", "features"],
+    "watch": ["--solo-importar", "watch"],
+}
+PESADOS = ("numpy", "scipy", "matplotlib", "numba", "soxr", "soundfile")
+
+_SONDA_HELP = """
+import runpy, sys
+sys.argv = ["cordectomia.py", "--help"]
+with open("/dev/null", "w") as nulo:
+    sys.stdout = nulo
+    try:
+        runpy.run_path("cordectomia.py", run_name="__main__")
+    except SystemExit:
+        pass
+    sys.stdout = sys.__stdout__
+print(" ".join(m for m in {pesados!r} if m in sys.modules))
+"""
+
+
+def arranque(repeticiones=5):
+    """
+    [(comando, segundos mínimos, presupuesto, ok)] midiendo procesos
+    nuevos, más la lista de módulos pesados que carga --help (debe ir vacía).
+    """
+    import subprocess
+
+    sys.path.insert(0, BASE_DIR)
+    from cordectomia import PRESUPUESTO_ARRANQUE
+
+    filas = []
+    for comando, args in _ARGS_ARRANQUE.items():
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "cordectomia.py", *args],
+                cwd=BASE_DIR,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+            tiempos.append(time.perf_counter() - inicio)
+        limite = PRESUPUESTO_ARRANQUE[comando]
+        filas.append((comando, min(tiempos), limite, min(tiempos) <= limite))
+
+    sonda = subprocess.run(
+        [sys.executable, "-c", _SONDA_HELP.format(pesados=PESADOS)],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return filas, sonda.stdout.split()
+
+
+def imprimir_arranque(filas, pesados_en_help):
+    print(f"{'Comando':<12} {'min(s)':>8} {'límite':>8}")
+    for comando, segundos, limite, ok in filas:
+        estado = "OK" if ok else "EXCEDE"
+        print(f"{comando:<12} {segundos:>8.3f} {limite:>8.2f}  [{estado}]")
+    if pesados_en_help:
+        print(f" [FALLA] --help importa: {', '.join(pesados_en_help)}")
+    else:
+        print(" [OK] --help no importa ningún módulo pesado")
+
+
+def _ruta_por_defecto():
+    return os.path.join(DIR_BENCH, time.strftime("bench_%Y%m%d_%H%M%S.json"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de las etapas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_correr = sub.add_parser("correr", help="Medir todas las etapas")
+    p_correr.add_argument("--duraciones", nargs="+", type=float, default=DURACIONES)
+    p_correr.add_argument("--fs", nargs="+", type=int, default=FRECUENCIAS)
+    p_correr.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    p_correr.add_argument("--etapas", nargs="+", choices=ETAPAS, default=ETAPAS)
+    p_correr.add_argument("--salida", default=None, help="JSON de resultados")
+    p_correr.add_argument(
+        "--base", default=None, help="Comparar al terminar contra esta línea base"
+    )
+
+    p_comparar = sub.add_parser("comparar", help="Comparar contra una línea base")
+    p_comparar.add_argument("base")
+    p_comparar.add_argument("nuevo")
+    p_comparar.add_argument("--umbral", type=float, default=UMBRAL)
+
+    sub.add_parser("verificar", help="Golden checks de las rutas rápidas")
+
+    p_arranque = sub.add_parser("arranque", help="Arranque de cordectomia.py")
+    p_arranque.add_argument("--repeticiones", type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.comando == "correr":
+        datos = correr(args.duraciones, args.fs, args.repeticiones, args.etapas)
+        ruta = args.salida or _ruta_por_defecto()
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2)
+        print(f" [BENCH] Resultados en: {ruta}")
+        if args.base:
+            with open(args.base, "r", encoding="utf-8") as f:
+                base = json.load(f)
+            hallazgos = comparar(base, datos)
+            imprimir_comparacion(base, datos, hallazgos)
+            sys.exit(1 if hallazgos else 0)
+
+    elif args.comando == "comparar":
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.nuevo, "r", encoding="utf-8") as f:
+            nuevo = json.load(f)
+        hallazgos = comparar(base, nuevo, args.umbral)
+        imprimir_comparacion(base, nuevo, hallazgos)
+        sys.exit(1 if hallazgos else 0)
+
+    elif args.comando == "arranque":
+        filas, pesados = arranque(args.repeticiones)
+        imprimir_arranque(filas, pesados)
+        sys.exit(0 if all(f[-1] for f in filas) and not pesados else 1)
+
+    else:
+        checks = verificar()
+        imprimir_verificacion(checks)
+        sys.exit(0 if all(ok for *_, ok in checks) else 1)
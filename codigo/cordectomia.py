@@ -0,0 +1,339 @@
+# Punto de entrada único para todas las etapas, con arranque rápido
+#
+#   python cordectomia.py normalize                 (0_normalizar)
+#   python cordectomia.py denoise  [RUTA]           (1_denoiser, modo batch)
+#   python cordectomia.py analyze  --par PRE POST   (2_cordie, modo reporte)
+#   python cordectomia.py restore  RUTA --referencia AUDIO | --perfil NOMBRE
+#   python cordectomia.py compare  AUDIO AUDIO [...] (distancias PSD, sin gráficas)
+#   python cordectomia.py features RUTA [...]      (tabla en data/3_analysis)
+#   python cordectomia.py watch    [--una-vez]     (vigilante de data/0_raw/ogg)
+#
+# Aquí solo se importa la biblioteca estándar: numpy, scipy, matplotlib,
+# numba, soxr... los importa la etapa que se ejecuta y solo esa. "--help"
+# y los errores de argumentos no cargan nada pesado, y "compare" no paga
+# matplotlib. PRESUPUESTO_ARRANQUE es el tiempo máximo (s) de un proceso
+# nuevo hasta tener lista su etapa; lo mide "python benchmark.py arranque".
+import argparse
+import importlib
+import os
+import sys
+
+from utils import precision, traza
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Medido en 1 núcleo, disco caliente: --help ~0.05 s, normalize ~0.16 s,
+# compare ~0.6 s, features ~0.9 s (matplotlib.mlab), analyze ~1.2 s
+# (matplotlib), denoise/restore ~1.2-1.5 s (scipy.signal, que usan de
+# verdad; numba no cuenta: utils.wiener lo carga al filtrar el primer
+# archivo), watch ~2.0 s (las tres primeras etapas). El presupuesto deja
+# margen para máquinas más lentas.
+PRESUPUESTO_ARRANQUE = {
+    "--help": 0.15,
+    "normalize": 0.5,
+    "denoise": 2.0,
+    "analyze": 2.0,
+    "restore": 2.0,
+    "compare": 1.0,
+    "features": 1.5,
+    "watch": 2.5,
+}
+
+FASES_FIR = ("lineal", "minima")  # Igual que utils.fir.FASES (sin importarlo)
+MOTORES = ("stft", "fir", "armonico")  # Igual que 3_tomie.MOTORES
+
+# Subcomando -> módulos que carga antes de procesar el primer archivo
+MODULOS = {
+    "normalize": ("0_normalizar",),
+    "denoise": ("1_denoiser",),
+    "analyze": ("2_cordie", "matplotlib.pyplot"),
+    "restore": ("3_tomie",),
+    "compare": ("2_cordie",),
+    "features": ("2_cordie", "matplotlib.mlab"),
+    "watch": ("vigilante", "0_normalizar", "1_denoiser", "2_cordie"),
+}
+
+
+def etapa(nombre):
+    """Importa (la primera vez) el módulo de una etapa."""
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    return importlib.import_module(nombre)
+
+
+# --- SUBCOMANDOS ---
+
+
+def cmd_normalize(args):
+    print("--- INICIO DE NORMALIZACIÓN (ETAPA 0) ---")
+    resultados = etapa("0_normalizar").normalizar(
+        max_workers=args.workers or os.cpu_count() or 1, forzar=args.forzar
+    )
+    print("--- FIN ---")
+    return 0 if all(r[2] for r in resultados) else 1
+
+
+def cmd_denoise(args):
+    denoiser = etapa("1_denoiser")
+    resultados = denoiser.batch_main(
+        args.ruta or denoiser.INPUT_DIR,
+        workers=args.workers,
+        forzar=args.forzar,
+        streaming=args.streaming,
+        noise_mode=args.ruido,
+    )
+    return 0 if resultados and all(r["ok"] for r in resultados) else 1
+
+
+def cmd_analyze(args):
+    cordie = etapa("2_cordie")
+    pares = [tuple(p) for p in args.par or []]
+    if args.rutas:
+        pares += cordie.pares_de(cordie.listar_audios(args.rutas), args.matriz)
+    pares = list(dict.fromkeys(pares))
+    if not pares:
+        print("[ERROR] Se necesitan al menos 2 audios para comparar.")
+        return 1
+    cordie.generar_reportes(pares, workers=args.workers, dir_salida=args.salida)
+    return 0
+
+
+def cmd_restore(args):
+    tomie = etapa("3_tomie")
+    objetivos = tomie.listar_objetivos(args.ruta)
+    if not objetivos:
+        print(f" [!] No hay archivos .wav en: {args.ruta}")
+        return 1
+    resultados = tomie.restaurar_lote(
+        objetivos,
+        archivo_sano=args.referencia,
+        perfil=args.perfil,
+        workers=args.workers,
+        forzar=args.forzar,
+        indice=args.indice,
+        motor=args.motor,
+        fase=args.fase,
+    )
+    return 0 if resultados and all(r["ok"] for r in resultados) else 1
+
+
+def cmd_compare(args):
+    """Distancia espectral (RMS de la diferencia de PSD en dB, 80-5000 Hz)."""
+    cordie = etapa("2_cordie")
+    rutas = cordie.listar_audios(args.rutas)
+    if len(rutas) < 2:
+        print("[ERROR] Se necesitan al menos 2 audios para comparar.")
+        return 1
+    espectros = {}
+    for ruta in rutas:
+        y, fs = cordie.cargar_audio(ruta)
+        if y is None:
+            return 1
+        freqs, psd_db = cordie.calcular_espectro_medio(y, fs)
+        espectros[ruta] = {"freqs": freqs, "psd_db": psd_db}
+
+    nombres = [os.path.basename(r) for r in rutas]
+    ancho = max(len(n) for n in nombres)
+    print(" " * ancho + "  " + " ".join(f"{i:>8}" for i in range(len(rutas))))
+    for i, ruta in enumerate(rutas):
+        fila = [
+            cordie.distancia_espectral(espectros[ruta], espectros[otra])
+            for otra in rutas
+        ]
+        print(f"{nombres[i]:<{ancho}}  " + " ".join(f"{d:>8.2f}" for d in fila))
+    print("(dB RMS; columna j = audio j en el orden de las filas)")
+    return 0
+
+
+def cmd_features(args):
+    cordie = etapa("2_cordie")
+    rutas = cordie.listar_audios(args.rutas)
+    pares = [tuple(p) for p in args.par or []]
+    if not rutas and not pares:
+        print("[ERROR] No hay audios que analizar.")
+        return 1
+    filas, _ = cordie.extraer_descriptores(
+        rutas,
+        pares=pares,
+        workers=args.workers,
+        dir_salida=args.salida,
+        forzar=args.forzar,
+    )
+    if args.cohorte and rutas:
+        if cordie.guardar_cohorte(rutas, dir_salida=args.salida) is None:
+            return 1
+    return 0 if filas else 1
+
+
+def cmd_watch(args):
+    vigilante = etapa("vigilante")
+    if args.estado:
+        vigilante.imprimir_estado()
+        return 0
+    try:
+        errores = vigilante.vigilar(
+            una_vez=args.una_vez,
+            dir_origen=args.origen or vigilante.DIR_ORIGEN,
+            workers=args.workers,
+            intervalo=args.intervalo,
+            max_cola=args.max_cola,
+            max_intentos=args.reintentos,
+            streaming=args.streaming,
+            noise_mode=args.ruido,
+        )
+    except vigilante.cola_trabajos.ColaOcupada as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0 if errores == 0 else 1
+
+
+# --- ARGUMENTOS ---
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="cordectomia",
+        description="Pipeline de análisis y restauración de voz post-cordectomía",
+    )
+    parser.add_argument(
+        "--solo-importar", action="store_true", help=argparse.SUPPRESS
+    )  # Para medir el arranque (benchmark.py arranque)
+    sub = parser.add_subparsers(dest="comando", metavar="COMANDO")
+
+    def subcomando(nombre, ayuda, funcion, workers=True):
+        p = sub.add_parser(nombre, help=ayuda, description=ayuda)
+        p.set_defaults(funcion=funcion)
+        if workers:
+            p.add_argument(
+                "-j",
+                "--workers",
+                type=int,
+                default=None,
+                help="Procesos en paralelo (default: número de núcleos)",
+            )
+        precision.agregar_argumentos(p)
+        traza.agregar_argumentos(p)
+        return p
+
+    p = subcomando("normalize", "Etapa 0: OGG -> WAV mono 44.1 kHz", cmd_normalize)
+    p.add_argument("--forzar", action="store_true", help="Reconvertir todo")
+
+    p = subcomando("denoise", "Etapa 1: reducción de ruido (batch)", cmd_denoise)
+    p.add_argument(
+        "ruta", nargs="?", help="Directorio o patrón glob (default: data/1_input)"
+    )
+    p.add_argument("--forzar", action="store_true", help="Ignorar el manifiesto")
+    p.add_argument(
+        "--streaming", action="store_true", help="Memoria acotada (por bloques)"
+    )
+    p.add_argument(
+        "--ruido",
+        choices=("percentile", "adaptive"),
+        default="percentile",
+        help="Estimador de ruido",
+    )
+
+    p = subcomando("analyze", "Etapa 2: figuras comparativas (reporte)", cmd_analyze)
+    p.add_argument(
+        "rutas", nargs="*", help="Audios, directorios o globs: todos contra todos"
+    )
+    p.add_argument(
+        "--par",
+        nargs=2,
+        action="append",
+        metavar=("PRE", "POST"),
+        help="Par específico (se puede repetir)",
+    )
+    p.add_argument("--matriz", action="store_true", help="Todos los pares N x N")
+    p.add_argument("--salida", default=None, help="Carpeta de imágenes")
+
+    p = subcomando("restore", "Etapa 3: restauración espectral (lote)", cmd_restore)
+    p.add_argument("ruta", help="Directorio o patrón glob de audios a restaurar")
+    referencia = p.add_mutually_exclusive_group(required=True)
+    referencia.add_argument("--referencia", metavar="AUDIO", help="Audio sano")
+    referencia.add_argument("--perfil", metavar="NOMBRE", help="Perfil guardado")
+    p.add_argument("--forzar", action="store_true", help="Ignorar el manifiesto")
+    p.add_argument("--indice", metavar="JSON", default=None, help="Índice del lote")
+    p.add_argument("--motor", choices=MOTORES, default="stft")
+    p.add_argument("--fase", choices=FASES_FIR, default="lineal")
+
+    p = subcomando(
+        "compare",
+        "Distancias espectrales entre audios (sin gráficas)",
+        cmd_compare,
+        workers=False,
+    )
+    p.add_argument("rutas", nargs="+", help="Audios, directorios o globs")
+
+    p = subcomando(
+        "features", "Etapa 2: tabla de descriptores por archivo", cmd_features
+    )
+    p.add_argument("rutas", nargs="*", help="Audios, directorios o globs")
+    p.add_argument(
+        "--par",
+        nargs=2,
+        action="append",
+        metavar=("PRE", "POST"),
+        help="Par para diferencias.csv (se puede repetir)",
+    )
+    p.add_argument("--forzar", action="store_true", help="Recalcular todo")
+    p.add_argument(
+        "--cohorte",
+        action="store_true",
+        help="Además, el espectro medio de todos los audios (cohorte.csv)",
+    )
+    p.add_argument("--salida", default=None, help="Carpeta (default: data/3_analysis)")
+
+    p = subcomando(
+        "watch",
+        "Vigilar la carpeta de OGG: normalize -> denoise -> features por archivo",
+        cmd_watch,
+    )
+    p.add_argument(
+        "--origen", default=None, help="Carpeta a vigilar (default: data/0_raw/ogg)"
+    )
+    p.add_argument(
+        "--intervalo", type=float, default=5.0, help="Segundos entre sondeos"
+    )
+    p.add_argument(
+        "--max-cola",
+        type=int,
+        default=32,
+        help="Trabajos activos como máximo; el resto espera en la carpeta",
+    )
+    p.add_argument(
+        "--reintentos", type=int, default=3, help="Intentos por etapa antes de error"
+    )
+    p.add_argument(
+        "--una-vez", action="store_true", help="Procesar lo que haya y terminar"
+    )
+    p.add_argument("--estado", action="store_true", help="Mostrar la cola y salir")
+    p.add_argument(
+        "--streaming", action="store_true", help="Denoise con memoria acotada"
+    )
+    p.add_argument(
+        "--ruido",
+        choices=("percentile", "adaptive"),
+        default="percentile",
+        help="Estimador de ruido",
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    if args.comando is None:
+        parser.print_help()
+        return 2
+    precision.configurar_desde_args(args)
+    traza.configurar_desde_args(args)
+    if args.solo_importar:
+        for modulo in MODULOS[args.comando]:
+            etapa(modulo)
+        return 0
+    return args.funcion(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+# Caché en disco de transformadas espectrales compartida por todas las etapas
+#
+# Clave = hash del contenido de las muestras + frecuencia de muestreo +
+#         transformada + parámetros + dtype.
+# Cada entrada es una carpeta con un .npy por arreglo, así se pueden abrir
+# con np.load(mmap_mode="r") sin copiar nada a memoria.
+# Política de expulsión: LRU (por mtime de la carpeta) con un tope de tamaño.
+# Una entrada de más de FRACCION_MAX_ENTRADA del tope (p. ej. la STFT
+# compleja de una grabación larga) no se guarda: escribirla solo para
+# expulsarla después a ella y a todo lo demás sería E/S sin aciertos.
+#
+# Transformadas cubiertas:
+#   "welch"    -> 2_cordie (nperseg 4096) y 3_tomie (nperseg 2048); con
+#                 --vad, solo los segmentos con voz (utils.vad)
+#   "stft"     -> 1_denoiser y 3_tomie (nperseg 2048, noverlap 1536: ¡la misma!)
+#   "specgram" -> 2_cordie (NFFT 4096, noverlap 3000)
+#   "remuestreo" -> copia a la tasa de análisis (--fs-analisis), con soxr
+#
+# Con un WAV mapeado (utils.wav_mmap) la huella se calcula sobre los bytes
+# PCM del mapa y las muestras solo se convierten a float si hay que
+# calcular (un acierto de caché no toca la señal).
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from utils import vad, wav_mmap, welch_incremental
+from utils.precision import dtype_real, fs_analisis, sesion_fft, usar_vad
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_CACHE = os.path.normpath(
+    os.path.join(BASE_DIR, "..", "..", "data", "cache", "espectral")
+)
+
+FS_REFERENCIA = 44100  # Tasa para la que están pensadas las ventanas
+CALIDAD_REMUESTREO = "HQ"
+BLOQUE_REMUESTREO = 1 << 18  # Muestras por bloque al remuestrear
+
+LIMITE_MB_DEFAULT = 2048
+FRACCION_MAX_ENTRADA = 0.5
+_ENV_LIMITE = "CORDECTOMIA_CACHE_MB"
+_ENV_ACTIVA = "CORDECTOMIA_CACHE"  # "0" para desactivar
+
+
+def hash_muestras(data, fs):
+    """Huella del contenido de audio (muestras + fs + dtype)."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(data, wav_mmap.SenalMapeada):
+        # El resultado depende también del dtype al que se convierte
+        crudo = data.raw
+        h.update(
+            f"{fs}|mmap|{crudo.dtype.str}|{crudo.shape}|"
+            f"{np.dtype(dtype_real()).str}".encode()
+        )
+        h.update(data.huella())
+        return h.hexdigest()
+    data = np.ascontiguousarray(data)
+    h.update(f"{fs}|{data.dtype.str}|{data.shape}".encode())
+    h.update(data.view(np.uint8))
+    return h.hexdigest()
+
+
+class CacheEspectral:
+    """Almacén LRU de arreglos .npy memory-mappeables."""
+
+    def __init__(self, directorio=DIR_CACHE, limite_bytes=None):
+        self.directorio = directorio
+        if limite_bytes is None:
+            limite_bytes = (
+                int(os.environ.get(_ENV_LIMITE, LIMITE_MB_DEFAULT)) * 1024 * 1024
+            )
+        self.limite_bytes = limite_bytes
+
+    def clave(self, huella, transformada, params):
+        texto = json.dumps([huella, transformada, params], sort_keys=True)
+        return f"{transformada}_{hashlib.sha1(texto.encode()).hexdigest()}"
+
+    def obtener(self, clave):
+        """Regresa {nombre: arreglo mmap} o None si no está."""
+        ruta = os.path.join(self.directorio, clave)
+        if not os.path.isdir(ruta):
+            return None
+        try:
+            arreglos = {
+                os.path.splitext(f)[0]: np.load(os.path.join(ruta, f), mmap_mode="r")
+                for f in os.listdir(ruta)
+                if f.endswith(".npy")
+            }
+            os.utime(ruta)  # Marca de uso para el LRU
+        except (OSError, ValueError):
+            return None
+        return arreglos or None
+
+    def guardar(self, clave, **arreglos):
+        """
+        Escritura atómica: carpeta temporal + rename. Regresa False si la
+        entrada es demasiado grande para la caché y no se guardó.
+        """
+        destino = os.path.join(self.directorio, clave)
+        if os.path.isdir(destino):
+            return True
+        tamano = sum(np.asarray(a).nbytes for a in arreglos.values())
+        if tamano > self.limite_bytes * FRACCION_MAX_ENTRADA:
+            return False
+        os.makedirs(self.directorio, exist_ok=True)
+        tmp = os.path.join(self.directorio, f".tmp_{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        for nombre, arreglo in arreglos.items():
+            np.save(os.path.join(tmp, f"{nombre}.npy"), np.asarray(arreglo))
+        try:
+            os.rename(tmp, destino)
+        except OSError:
+            # Otro proceso la escribió primero
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.expulsar()
+        return True
+
+    def tamano(self):
+        return sum(t for _, _, t in self._entradas())
+
+    def _entradas(self):
+        if not os.path.isdir(self.directorio):
+            return []
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if nombre.startswith(".") or not os.path.isdir(ruta):
+                continue
+            try:
+                tam = sum(
+                    os.path.getsize(os.path.join(ruta, f)) for f in os.listdir(ruta)
+                )
+                entradas.append((os.path.getmtime(ruta), ruta, tam))
+            except OSError:
+                continue
+        return entradas
+
+    def expulsar(self):
+        """Borra las entradas menos usadas hasta quedar bajo el límite."""
+        entradas = sorted(self._entradas())
+        total = sum(t for _, _, t in entradas)
+        for _, ruta, tam in entradas:
+            if total <= self.limite_bytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tam
+
+    def obtener_o_calcular(self, data, fs, transformada, params, calcular):
+        """
+        Busca (data, fs, transformada, params) en la caché; si no está,
+        llama a calcular() -> dict de arreglos, lo guarda y lo regresa.
+        """
+        huella = hash_muestras(data, fs)
+        clave = self.clave(huella, transformada, params)
+        arreglos = self.obtener(clave)
+        if arreglos is not None:
+            return arreglos
+        arreglos = calcular()
+        try:
+            self.guardar(clave, **arreglos)
+        except OSError as e:
+            print(f" [AVISO] No se pudo escribir la caché espectral: {e}")
+        return arreglos
+
+
+_cache = None
+
+
+def cache_por_defecto():
+    """Instancia compartida, o None si la caché está desactivada."""
+    global _cache
+    if os.environ.get(_ENV_ACTIVA, "1") == "0":
+        return None
+    if _cache is None:
+        _cache = CacheEspectral()
+    return _cache
+
+
+def _con_cache(data, fs, transformada, params, calcular):
+    cache = cache_por_defecto()
+    if cache is None:
+        return calcular()
+    return cache.obtener_o_calcular(data, fs, transformada, params, calcular)
+
+
+# --- Transformadas con caché ----------------------------------------------
+
+
+def welch(data, fs, nperseg, segmentos=None):
+    """
+    scipy.signal.welch con caché. Con segmentos ([inicio, fin) en
+    muestras) promedia solo esos tramos. Regresa (freqs, psd) lineal.
+    """
+
+    def calcular():
+        if segmentos is not None:
+            freqs, psd = welch_incremental.welch(
+                wav_mmap.como_senal(data), fs, nperseg, segmentos
+            )
+        elif isinstance(data, wav_mmap.SenalMapeada):
+            # Por bloques sobre el mapa, sin convertir el archivo completo
+            freqs, psd = welch_incremental.welch(data, fs, nperseg)
+        else:
+            import scipy.signal
+
+            with sesion_fft():
+                freqs, psd = scipy.signal.welch(data, fs, nperseg=nperseg)
+        return {"freqs": freqs, "psd": psd}
+
+    params = {"nperseg": nperseg}
+    if segmentos is not None:
+        params["segmentos"] = hashlib.sha1(
+            np.ascontiguousarray(segmentos, dtype=np.int64)
+        ).hexdigest()
+    r = _con_cache(data, fs, "welch", params, calcular)
+    return r["freqs"], r["psd"]
+
+
+def welch_analisis(data, fs, nperseg):
+    """
+    Welch como lo piden las etapas: a la tasa de análisis (--fs-analisis)
+    con la ventana escalada y, con --vad, solo sobre los segmentos con voz.
+    Regresa (freqs, psd) lineal.
+    """
+    segmentos = vad.segmentos(data, fs) if usar_vad() else None
+    data_a, fs_a = para_analisis(data, fs)
+    if segmentos is not None:
+        segmentos = vad.escalar(segmentos, fs, fs_a)
+    return welch(wav_mmap.como_senal(data_a), fs_a, ventana(nperseg, fs_a), segmentos)
+
+
+def stft(data, fs, nperseg, noverlap):
+    """scipy.signal.stft con caché. Regresa (freqs, times, Zxx)."""
+
+    def calcular():
+        import scipy.signal  # Lento de importar: solo si no está en caché
+
+        with sesion_fft():
+            freqs, times, Zxx = scipy.signal.stft(
+                np.asarray(data), fs=fs, nperseg=nperseg, noverlap=noverlap
+            )
+        return {"freqs": freqs, "times": times, "Zxx": Zxx}
+
+    params = {"nperseg": nperseg, "noverlap": noverlap}
+    r = _con_cache(data, fs, "stft", params, calcular)
+    return r["freqs"], r["times"], r["Zxx"]
+
+
+def specgram(data, fs, NFFT, noverlap):
+    """
+    El mismo cálculo que hace ax.specgram (mlab.specgram, PSD por
+    segmento). Regresa (Pxx, freqs, bins).
+    """
+
+    from matplotlib import mlab  # Solo quien grafica paga el import
+
+    def calcular():
+        Pxx, freqs, bins = mlab.specgram(
+            np.asarray(data), NFFT=NFFT, Fs=fs, noverlap=noverlap
+        )
+        return {"Pxx": Pxx, "freqs": freqs, "bins": bins}
+
+    params = {"NFFT": NFFT, "noverlap": noverlap}
+    r = _con_cache(data, fs, "specgram", params, calcular)
+    return r["Pxx"], r["freqs"], r["bins"]
+
+
+def remuestrear(data, fs, fs_destino):
+    """
+    Copia de 'data' a fs_destino (soxr, por bloques), guardada en la caché:
+    se calcula una vez por audio y las siguientes se abre como memmap.
+    Regresa (y, fs_destino).
+    """
+
+    def calcular():
+        import soxr  # Solo quien remuestrea paga el import
+
+        dtype = dtype_real()
+        flujo = soxr.ResampleStream(
+            fs, fs_destino, 1, dtype=np.dtype(dtype).name, quality=CALIDAD_REMUESTREO
+        )
+        senal = wav_mmap.como_senal(data)
+        partes = [
+            flujo.resample_chunk(
+                np.asarray(senal[i : i + BLOQUE_REMUESTREO], dtype=dtype)
+            )
+            for i in range(0, len(senal), BLOQUE_REMUESTREO)
+        ]
+        partes.append(flujo.resample_chunk(np.zeros(0, dtype=dtype), last=True))
+        return {"y": np.concatenate(partes)}
+
+    params = {"fs": fs_destino, "calidad": CALIDAD_REMUESTREO}
+    return _con_cache(data, fs, "remuestreo", params, calcular)["y"], fs_destino
+
+
+def para_analisis(data, fs):
+    """
+    (data, fs) a la tasa de análisis configurada (--fs-analisis). Sin
+    configurar, o si el audio ya está a esa tasa o por debajo, lo regresa
+    tal cual.
+    """
+    destino = fs_analisis()
+    if destino is None or fs <= destino:
+        return data, fs
+    return remuestrear(data, fs, destino)
+
+
+def ventana(n, fs):
+    """
+    Largo de ventana para un análisis pensado con n muestras a 44.1 kHz.
+    Con tasa de análisis se escala con fs (misma resolución en Hz y en
+    segundos, ~fs/44100 del costo); sin ella, n tal cual, como siempre.
+    """
+    if fs_analisis() is None:
+        return n
+    return _largo_rapido(max(16, int(round(n * fs / FS_REFERENCIA))))
+
+
+def _largo_rapido(n):
+    """
+    Siguiente largo par con factores 2, 3 y 5 (1486 -> 1500): una FFT de
+    largo con un primo grande (1486 = 2 * 743) es varias veces más lenta.
+    """
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1 and n % 2 == 0:
+            return n
+        n += 1
+
+
+# Opción de debugeo
+if __name__ == "__main__":
+    c = CacheEspectral()
+    print(f"Caché en: {c.directorio}")
+    print(f"Entradas: {len(c._entradas())}  Tamaño: {c.tamano() / 1e6:.1f} MB")
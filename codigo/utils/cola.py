@@ -0,0 +1,226 @@
+# Cola de trabajos persistente (JSON) para el vigilante de carpeta
+#
+# Un trabajo = un audio crudo que recorre las etapas en orden:
+#   normalizar -> denoise -> analisis
+# Tras cada etapa la cola se guarda (archivo temporal + os.replace), así
+# que si el proceso muere se retoma en la etapa donde iba: lo que estaba
+# "en_proceso" vuelve a "pendiente" al abrir la cola. Repetir una etapa
+# es seguro porque cada una consulta su manifiesto.
+#
+# Estados: pendiente -> en_proceso -> (pendiente, siguiente etapa) ... -> hecho
+#          un fallo vuelve a "pendiente" con espera exponencial hasta
+#          max_intentos; después queda en "error" hasta que el audio cambie.
+#
+# Un solo proceso escribe la cola (el vigilante); un candado de archivo
+# impide abrir dos vigilantes sobre la misma cola.
+import json
+import os
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_DATA = os.path.normpath(os.path.join(BASE_DIR, "..", "..", "data"))
+RUTA_COLA = os.path.join(DIR_DATA, "cola.json")
+
+VERSION = 1
+ETAPAS = ("normalizar", "denoise", "analisis")
+ESTADOS = ("pendiente", "en_proceso", "hecho", "error")
+ESPERA_BASE = 5.0  # s antes del primer reintento (luego x2 cada vez)
+ESPERA_MAX = 600.0
+VENTANA_RITMO = 300.0  # s de historia para archivos/min y xRT
+
+
+class ColaOcupada(RuntimeError):
+    """Otro vigilante ya tiene abierta esta cola."""
+
+
+class ColaTrabajos:
+    """
+    Cola persistente de trabajos por archivo.
+
+    Estructura (cola.json):
+        {"version": 1,
+         "trabajos": {clave: {"huella", "estado", "etapa",
+                              "intentos", "proximo", "error", "wav",
+                              "creado", "terminado", "segundos_audio"}},
+         "estadisticas": {...}}   # la última foto, para --estado
+
+    La clave es la ruta relativa a data/ (manifiesto.ruta_relativa).
+    """
+
+    def __init__(self, ruta=RUTA_COLA, bloquear=True):
+        self.ruta = ruta
+        self._candado = None
+        if bloquear:
+            self._bloquear()
+        self.datos = {"version": VERSION, "trabajos": {}, "estadisticas": {}}
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    datos = json.load(f)
+                if datos.get("version") == VERSION:
+                    self.datos = datos
+            except (OSError, ValueError) as e:
+                print(f" [AVISO] Cola ilegible, se empieza de cero: {e}")
+        self._terminados = deque()  # (instante, segundos de audio)
+        self.recuperados = 0
+        if bloquear:
+            # Lo que estaba en proceso cuando murió el vigilante anterior
+            for t in self.trabajos.values():
+                if t["estado"] == "en_proceso":
+                    t["estado"] = "pendiente"
+                    self.recuperados += 1
+
+    def _bloquear(self):
+        if fcntl is None:
+            return
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        self._candado = open(self.ruta + ".lock", "w")
+        try:
+            # lockf (no flock): los hijos del pool no heredan el candado
+            fcntl.lockf(self._candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._candado.close()
+            self._candado = None
+            raise ColaOcupada(f"Otro vigilante está usando {self.ruta}")
+
+    def cerrar(self):
+        self.guardar()
+        if self._candado is not None:
+            self._candado.close()
+            self._candado = None
+
+    @property
+    def trabajos(self):
+        return self.datos["trabajos"]
+
+    def guardar(self):
+        """Escritura atómica: archivo temporal + os.replace."""
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        tmp = self.ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.ruta)
+
+    # --- Altas ---------------------------------------------------------
+
+    def conoce(self, clave, huella):
+        """True si el archivo ya está en la cola con esta misma huella."""
+        t = self.trabajos.get(clave)
+        return t is not None and t["huella"] == huella
+
+    def agregar(self, clave, huella, etapa=ETAPAS[0], **datos):
+        """Alta (o re-alta si el archivo cambió) de un trabajo pendiente."""
+        self.trabajos[clave] = {
+            "huella": huella,
+            "estado": "pendiente",
+            "etapa": etapa,
+            "intentos": 0,
+            "proximo": 0.0,
+            "error": "",
+            "wav": None,
+            "creado": time.time(),
+            "terminado": None,
+            "segundos_audio": 0.0,
+            **datos,
+        }
+
+    # --- Avance --------------------------------------------------------
+
+    def listos(self, ahora=None):
+        """Claves pendientes cuya espera ya pasó, en orden de llegada."""
+        ahora = time.time() if ahora is None else ahora
+        listos = [
+            (t["creado"], clave)
+            for clave, t in self.trabajos.items()
+            if t["estado"] == "pendiente" and t["proximo"] <= ahora
+        ]
+        return [clave for _, clave in sorted(listos)]
+
+    def iniciar(self, clave):
+        self.trabajos[clave]["estado"] = "en_proceso"
+
+    def avanzar(self, clave, **datos):
+        """
+        Etapa actual terminada: pasa a la siguiente (pendiente) o, si era
+        la última, a "hecho". Regresa True si el trabajo quedó terminado.
+        """
+        t = self.trabajos[clave]
+        t.update(datos)
+        t["intentos"] = 0
+        t["error"] = ""
+        i = ETAPAS.index(t["etapa"])
+        if i + 1 < len(ETAPAS):
+            t["etapa"] = ETAPAS[i + 1]
+            t["estado"] = "pendiente"
+            return False
+        t["estado"] = "hecho"
+        t["terminado"] = time.time()
+        self._terminados.append((t["terminado"], t.get("segundos_audio", 0.0)))
+        return True
+
+    def fallar(self, clave, error, max_intentos):
+        """
+        Registra un fallo. Vuelve a "pendiente" con espera exponencial o,
+        agotados los intentos, queda en "error". Regresa True si se reintenta.
+        """
+        t = self.trabajos[clave]
+        t["intentos"] += 1
+        t["error"] = str(error)
+        if t["intentos"] >= max_intentos:
+            t["estado"] = "error"
+            return False
+        espera = min(ESPERA_MAX, ESPERA_BASE * 2 ** (t["intentos"] - 1))
+        t["estado"] = "pendiente"
+        t["proximo"] = time.time() + espera
+        return True
+
+    # --- Estadísticas --------------------------------------------------
+
+    def conteo(self):
+        """{estado: n} más la profundidad por etapa de lo pendiente."""
+        conteo = dict.fromkeys(ESTADOS, 0)
+        por_etapa = dict.fromkeys(ETAPAS, 0)
+        for t in self.trabajos.values():
+            conteo[t["estado"]] += 1
+            if t["estado"] in ("pendiente", "en_proceso"):
+                por_etapa[t["etapa"]] += 1
+        conteo["por_etapa"] = por_etapa
+        return conteo
+
+    def ritmo(self, ahora=None):
+        """(archivos por minuto, segundos de audio por segundo) recientes."""
+        ahora = time.time() if ahora is None else ahora
+        while self._terminados and self._terminados[0][0] < ahora - VENTANA_RITMO:
+            self._terminados.popleft()
+        if not self._terminados:
+            return 0.0, 0.0
+        ventana = max(ahora - self._terminados[0][0], 1.0)
+        audio = sum(s for _, s in self._terminados)
+        return len(self._terminados) * 60 / ventana, audio / ventana
+
+    def foto(self, **extra):
+        """Guarda (en memoria) y regresa las estadísticas actuales."""
+        por_minuto, xrt = self.ritmo()
+        foto = {
+            "instante": time.time(),
+            **self.conteo(),
+            "archivos_por_minuto": round(por_minuto, 3),
+            "segundos_audio_por_segundo": round(xrt, 3),
+            **extra,
+        }
+        self.datos["estadisticas"] = foto
+        return foto
+
+
+def leer_estadisticas(ruta=RUTA_COLA):
+    """Última foto guardada y conteo actual, sin tomar el candado."""
+    if not os.path.exists(ruta):
+        return None
+    cola = ColaTrabajos(ruta, bloquear=False)
+    return {"conteo": cola.conteo(), "foto": cola.datos.get("estadisticas", {})}
@@ -0,0 +1,110 @@
+# Motor de decodificación EN PROCESO (sin lanzar ffmpeg por archivo)
+# OGG/Vorbis/Opus/FLAC/WAV -> WAV mono 44100 Hz usando soundfile + soxr
+import subprocess
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+FS_SALIDA = 44100  # Frecuencia estándar del proyecto
+BLOQUE = 65536  # Muestras por bloque (memoria constante)
+
+
+def decodificar_a_wav(ruta_entrada, ruta_salida, fs_salida=FS_SALIDA, bloque=BLOQUE):
+    """
+    Lee el archivo bloque por bloque con libsndfile, lo baja a mono y lo
+    remuestrea con soxr en streaming. Nunca carga el audio completo.
+    Lanza sf.LibsndfileError si libsndfile no reconoce el formato.
+    """
+    with sf.SoundFile(ruta_entrada) as f_in:
+        fs_entrada = f_in.samplerate
+
+        resampler = None
+        if fs_entrada != fs_salida:
+            resampler = soxr.ResampleStream(
+                fs_entrada, fs_salida, 1, dtype="float32", quality="HQ"
+            )
+
+        with sf.SoundFile(
+            ruta_salida, "w", samplerate=fs_salida, channels=1, subtype="PCM_16"
+        ) as f_out:
+            for datos in f_in.blocks(blocksize=bloque, dtype="float32", always_2d=True):
+                # Downmix a mono (promedio de canales)
+                mono = datos.mean(axis=1)
+                if resampler is not None:
+                    mono = resampler.resample_chunk(mono, last=False)
+                f_out.write(np.clip(mono, -1.0, 1.0))
+
+            # Vaciar la cola interna del resampler
+            if resampler is not None:
+                cola = resampler.resample_chunk(np.zeros(0, dtype="float32"), last=True)
+                f_out.write(np.clip(cola, -1.0, 1.0))
+
+
+def decodificar_a_memoria(ruta_entrada, fs_salida=FS_SALIDA, bloque=BLOQUE):
+    """
+    Igual que decodificar_a_wav, pero regresa el arreglo float32 mono en
+    lugar de escribirlo (para el pipeline en memoria de init.py).
+    """
+    partes = []
+    with sf.SoundFile(ruta_entrada) as f_in:
+        resampler = None
+        if f_in.samplerate != fs_salida:
+            resampler = soxr.ResampleStream(
+                f_in.samplerate, fs_salida, 1, dtype="float32", quality="HQ"
+            )
+        for datos in f_in.blocks(blocksize=bloque, dtype="float32", always_2d=True):
+            mono = datos.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=False)
+            partes.append(mono)
+        if resampler is not None:
+            partes.append(
+                resampler.resample_chunk(np.zeros(0, dtype="float32"), last=True)
+            )
+    if not partes:
+        return np.zeros(0, dtype="float32")
+    return np.clip(np.concatenate(partes), -1.0, 1.0)
+
+
+def decodificar_con_ffmpeg(ruta_entrada, ruta_salida, fs_salida=FS_SALIDA):
+    """Respaldo para formatos que libsndfile no sabe leer (m4a, mp4, etc.)."""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-i",
+            ruta_entrada,
+            "-ac",
+            "1",  # Mono
+            "-ar",
+            str(fs_salida),  # Estandarizar frecuencia
+            ruta_salida,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def convertir_a_wav(ruta_entrada, ruta_salida, fs_salida=FS_SALIDA):
+    """
+    Intenta primero la ruta en proceso y solo si falla usa ffmpeg.
+    Regresa el nombre del motor usado ("soundfile" o "ffmpeg").
+    """
+    try:
+        decodificar_a_wav(ruta_entrada, ruta_salida, fs_salida)
+        return "soundfile"
+    except sf.LibsndfileError:
+        decodificar_con_ffmpeg(ruta_entrada, ruta_salida, fs_salida)
+        return "ffmpeg"
+
+
+# Opción de debugeo
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Uso: python decodificador.py entrada.ogg salida.wav")
+    else:
+        print(f"Motor usado: {convertir_a_wav(sys.argv[1], sys.argv[2])}")
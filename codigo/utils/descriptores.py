@@ -0,0 +1,278 @@
+# Descriptores de voz por trama y por archivo, vectorizados
+#
+# Todo sale de dos cálculos que 2_cordie ya hace (y guarda en la caché
+# espectral): el espectrograma de banda estrecha (mlab.specgram, NFFT
+# 4096) y la PSD de Welch. Cada función opera sobre el último eje, así que
+# lo mismo sirve para una trama, para todas las tramas de un archivo
+# (Pxx.T) o para una pila de PSD de varios archivos.
+#
+#   energías por banda -> dB de la potencia integrada en BANDAS
+#   centroide          -> sum(f * P) / sum(P), Hz
+#   planitud           -> media geométrica / media aritmética (0..1)
+#   HNR                -> autocorrelación normalizada (Boersma 1993) en el
+#                         rango de pitch, calculada con irfft de la PSD de
+#                         la trama (Wiener-Khinchin): ninguna FFT extra
+#
+# Tabla de salida (data/3_analysis):
+#   descriptores.csv   una fila por archivo (ruta, sha256, resúmenes)
+#   tramas/*.npz       una columna por descriptor, una fila por trama,
+#                      más la PSD media del archivo (para diferencias)
+#   diferencias.csv    una fila por par (pre - post)
+# Se consultan sin volver a decodificar ningún audio.
+import csv
+import os
+import uuid
+
+import numpy as np
+
+from utils.f0 import F0_MAX, F0_MIN
+
+# Bandas de voz (Hz): fundamental, F1, F2, F3, sibilantes, aire
+BANDAS = (
+    (80, 300),
+    (300, 1000),
+    (1000, 2000),
+    (2000, 3500),
+    (3500, 5000),
+    (5000, 8000),
+)
+RANGO_ACTIVO_DB = 40  # Tramas a más de 40 dB bajo la más fuerte = silencio
+BLOQUE_TRAMAS = 512  # Tramas por lote en el HNR (acota los temporales)
+PISO = 1e-20
+
+
+def nombre_banda(banda):
+    return f"e_{banda[0]}_{banda[1]}"
+
+
+def columnas_banda(bandas=BANDAS):
+    return [nombre_banda(b) for b in bandas]
+
+
+# --- DESCRIPTORES (último eje = frecuencia) ---
+
+
+def energias_banda(P, freqs, bandas=BANDAS):
+    """
+    Potencia integrada por banda, en dB. P: (..., n_freqs) lineal.
+    Regresa (..., n_bandas); las bandas fuera de fs/2 quedan en NaN.
+    """
+    P = np.asarray(P)
+    df = freqs[1] - freqs[0]
+    salida = np.full(P.shape[:-1] + (len(bandas),), np.nan)
+    for k, (lo, hi) in enumerate(bandas):
+        i0, i1 = np.searchsorted(freqs, (lo, hi))
+        if i1 > i0:
+            salida[..., k] = 10 * np.log10(P[..., i0:i1].sum(axis=-1) * df + PISO)
+    return salida
+
+
+def centroide(P, freqs):
+    P = np.asarray(P)
+    total = P.sum(axis=-1)
+    return np.divide(
+        P @ freqs, total, out=np.full(total.shape, np.nan), where=total > 0
+    )
+
+
+def planitud(P):
+    """Planitud espectral (Wiener) sin el bin de DC."""
+    P = np.asarray(P)[..., 1:] + PISO
+    return np.exp(np.mean(np.log(P), axis=-1)) / np.mean(P, axis=-1)
+
+
+def _autocorrelacion_ventana(nfft):
+    ventana = np.hanning(nfft)  # La misma que usa mlab.specgram
+    r = np.fft.irfft(np.abs(np.fft.rfft(ventana)) ** 2, n=nfft)
+    return r / r[0]
+
+
+def hnr(Pxx, fs, nfft, f0_min=F0_MIN, f0_max=F0_MAX):
+    """
+    HNR (dB) por trama a partir del espectrograma de mlab.specgram
+    (n_freqs x n_tramas, un solo lado). La autocorrelación de cada trama
+    es la irfft de su periodograma; se divide entre la de la ventana
+    (Boersma) y se toma el máximo en el rango de pitch.
+    """
+    r_ventana = _autocorrelacion_ventana(nfft)
+    lag_min = max(1, int(fs / f0_max))
+    lag_max = min(nfft // 2, int(np.ceil(fs / f0_min)))
+    n_tramas = Pxx.shape[1]
+    salida = np.full(n_tramas, np.nan)
+    if lag_max <= lag_min:
+        return salida
+
+    for t0 in range(0, n_tramas, BLOQUE_TRAMAS):
+        # mlab duplica los bins que no son DC ni Nyquist: se deshace
+        P = np.array(Pxx[:, t0 : t0 + BLOQUE_TRAMAS].T, dtype=np.float64)
+        P[:, 1 : nfft // 2] /= 2
+        r = np.fft.irfft(P, n=nfft, axis=1)[:, : lag_max + 1]
+        energia = r[:, :1]
+        r = np.divide(r, energia, out=np.zeros_like(r), where=energia > 0)
+        r /= r_ventana[: lag_max + 1]
+        pico = np.clip(r[:, lag_min : lag_max + 1].max(axis=1), 1e-6, 1 - 1e-6)
+        salida[t0 : t0 + len(P)] = np.where(
+            energia[:, 0] > 0, 10 * np.log10(pico / (1 - pico)), np.nan
+        )
+    return salida
+
+
+def descriptores_tramas(Pxx, freqs, bins, fs, nfft, bandas=BANDAS):
+    """
+    Columnas por trama de un espectrograma (n_freqs x n_tramas):
+    {"tiempo", "energia_db", "centroide", "planitud", "hnr", "e_lo_hi"...}.
+    """
+    P = np.asarray(Pxx).T
+    columnas = {
+        "tiempo": np.asarray(bins, dtype=np.float64),
+        "energia_db": 10 * np.log10(P.sum(axis=1) * (freqs[1] - freqs[0]) + PISO),
+        "centroide": centroide(P, freqs),
+        "planitud": planitud(P),
+        "hnr": hnr(Pxx, fs, nfft),
+    }
+    energias = energias_banda(P, freqs, bandas)
+    for k, banda in enumerate(bandas):
+        columnas[nombre_banda(banda)] = energias[:, k]
+    return columnas
+
+
+def tramas_activas(energia_db, rango_db=RANGO_ACTIVO_DB):
+    """Máscara de tramas con voz (por energía, relativa a la más fuerte)."""
+    if len(energia_db) == 0:
+        return np.zeros(0, dtype=bool)
+    return energia_db >= np.max(energia_db) - rango_db
+
+
+def _media(x):
+    x = x[np.isfinite(x)]
+    return float(np.mean(x)) if len(x) else float("nan")
+
+
+def _mediana(x):
+    x = x[np.isfinite(x)]
+    return float(np.median(x)) if len(x) else float("nan")
+
+
+def resumen_archivo(columnas, freqs_psd, psd, voz=None, bandas=BANDAS):
+    """
+    Fila por archivo: descriptores de las tramas activas (media; HNR con
+    mediana, que es robusta a las transiciones) y energías por banda de
+    la PSD de Welch. 'voz' (máscara por trama de utils.vad) deja fuera
+    además las pausas.
+    """
+    activas = tramas_activas(columnas["energia_db"])
+    if voz is not None:
+        activas &= voz
+    fila = {
+        "tramas": int(len(activas)),
+        "tramas_activas": int(activas.sum()),
+        "centroide": _media(columnas["centroide"][activas]),
+        "planitud": _media(columnas["planitud"][activas]),
+        "hnr": _mediana(columnas["hnr"][activas]),
+    }
+    energias = energias_banda(psd, freqs_psd, bandas)
+    fila.update(zip(columnas_banda(bandas), map(float, energias)))
+    return fila
+
+
+def diferencias(psd_pre, psd_post, freqs, fmin=80, fmax=5000, bandas=BANDAS):
+    """
+    Diferencia espectral pre - post para N pares a la vez.
+    psd_pre, psd_post: (n_pares, n_freqs) en dB sobre la misma rejilla.
+    Regresa {"distancia_rms": (n,), "dif_e_lo_hi": (n,)...}.
+    """
+    psd_pre = np.atleast_2d(psd_pre)
+    psd_post = np.atleast_2d(psd_post)
+    banda = (freqs >= fmin) & (freqs <= fmax)
+    diff = psd_pre[:, banda] - psd_post[:, banda]
+    salida = {"distancia_rms": np.sqrt(np.mean(diff**2, axis=1))}
+    e_pre = energias_banda(10 ** (psd_pre / 10), freqs, bandas)
+    e_post = energias_banda(10 ** (psd_post / 10), freqs, bandas)
+    for k, nombre in enumerate(columnas_banda(bandas)):
+        salida[f"dif_{nombre}"] = e_pre[:, k] - e_post[:, k]
+    return salida
+
+
+# --- TABLAS ---
+
+
+def guardar_tramas(ruta, columnas, freqs_psd, psd_db, pista=None, **meta):
+    """
+    npz columnar por archivo (escritura atómica). 'pista' es la de
+    utils.f0.seguir (otra rejilla de tiempo, por eso va aparte).
+    """
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    tmp = os.path.join(directorio, f".tmp_{uuid.uuid4().hex}.npz")
+    np.savez(
+        tmp,
+        freqs_psd=np.asarray(freqs_psd, dtype=np.float64),
+        psd_db=np.asarray(psd_db, dtype=np.float64),
+        **{f"t_{k}": np.asarray(v) for k, v in columnas.items()},
+        **{f"f0_{k}": np.asarray(v) for k, v in (pista or {}).items()},
+        **{f"m_{k}": np.array(v) for k, v in meta.items()},
+    )
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def cargar_tramas(ruta):
+    """
+    Regresa {"columnas": {...}, "pista": {...}, "freqs_psd", "psd_db",
+    "meta": {...}}.
+    """
+    with np.load(ruta, allow_pickle=False) as f:
+        return {
+            "columnas": {k[2:]: f[k] for k in f.files if k.startswith("t_")},
+            "pista": {k[3:]: f[k] for k in f.files if k.startswith("f0_")},
+            "freqs_psd": f["freqs_psd"],
+            "psd_db": f["psd_db"],
+            "meta": {k[2:]: f[k].item() for k in f.files if k.startswith("m_")},
+        }
+
+
+def leer_tabla(ruta):
+    """Filas (dicts de str) de un CSV, o [] si no existe."""
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def escribir_tabla(ruta, columnas, filas):
+    """Reescribe el CSV completo (archivo temporal + os.replace)."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=columnas, extrasaction="ignore")
+        escritor.writeheader()
+        escritor.writerows(_formatear(fila) for fila in filas)
+    os.replace(tmp, ruta)
+
+
+def agregar_filas(ruta, columnas, filas, clave):
+    """
+    Agrega filas al CSV. Una fila nueva con la misma 'clave' (función
+    fila -> valor) que una existente la reemplaza. Si el encabezado
+    cambió (otra versión, otras bandas), la tabla se regenera.
+    Regresa todas las filas resultantes.
+    """
+    existentes = leer_tabla(ruta)
+    if existentes and list(existentes[0].keys()) != list(columnas):
+        print(f" [AVISO] {os.path.basename(ruta)}: columnas distintas, se regenera")
+        existentes = []
+    nuevas = {clave(f): f for f in filas}
+    reemplaza = any(clave(f) in nuevas for f in existentes)
+    if not existentes or reemplaza:
+        todas = [f for f in existentes if clave(f) not in nuevas] + list(filas)
+        escribir_tabla(ruta, columnas, todas)
+        return todas
+    # Solo filas nuevas: append sin reescribir lo anterior
+    with open(ruta, "a", encoding="utf-8", newline="") as f:
+        escritor = csv.DictWriter(f, fieldnames=columnas, extrasaction="ignore")
+        escritor.writerows(_formatear(fila) for fila in filas)
+    return existentes + list(filas)
+
+
+def _formatear(fila):
+    return {k: f"{v:.6g}" if isinstance(v, float) else v for k, v in fila.items()}
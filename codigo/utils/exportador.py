@@ -0,0 +1,185 @@
+# Exportación WAV + MP3 en UNA sola llamada a ffmpeg, alimentada por pipe
+#
+# Antes: sf.write(WAV) -> ffmpeg relee ese WAV del disco -> MP3 (bloqueante).
+# Ahora: las muestras float32 entran por stdin a un solo proceso ffmpeg que
+# escribe las dos salidas a la vez. Con ColaExportacion la codificación
+# corre en segundo plano mientras se procesa el siguiente archivo.
+import queue
+import subprocess
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import soundfile as sf
+
+MP3_BITRATE = "192k"
+BLOQUE = 65536  # Muestras por escritura al pipe
+
+
+class EscritorFfmpeg:
+    """
+    Objeto con .write(muestras) (como sf.SoundFile) que manda audio mono
+    float a ffmpeg por stdin y produce WAV (PCM_16) y/o MP3.
+
+    Si ffmpeg no está instalado, escribe el WAV con soundfile y avisa que
+    el MP3 no se pudo generar (self.error).
+    """
+
+    def __init__(self, sample_rate, wav_path=None, mp3_path=None, bitrate=MP3_BITRATE):
+        if wav_path is None and mp3_path is None:
+            raise ValueError("Se necesita al menos una salida (WAV o MP3)")
+        self.sample_rate = sample_rate
+        self.wav_path = wav_path
+        self.mp3_path = mp3_path
+        self.error = None
+        self._proc = None
+        self._respaldo = None
+
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "f32le",  # Muestras crudas float32 little-endian
+            "-ar",
+            str(sample_rate),
+            "-ac",
+            "1",
+            "-i",
+            "pipe:0",
+        ]
+        if wav_path is not None:
+            cmd += ["-c:a", "pcm_s16le", wav_path]
+        if mp3_path is not None:
+            cmd += ["-b:a", bitrate, mp3_path]
+
+        try:
+            self._proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            self.error = "ffmpeg no encontrado. Instálalo con: sudo pacman -S ffmpeg"
+            if wav_path is not None:
+                self._respaldo = sf.SoundFile(
+                    wav_path, "w", samplerate=sample_rate, channels=1
+                )
+
+    def write(self, muestras):
+        muestras = np.clip(np.asarray(muestras, dtype=np.float32), -1.0, 1.0)
+        if self._proc is not None:
+            try:
+                self._proc.stdin.write(muestras.astype("<f4").tobytes())
+            except BrokenPipeError:
+                pass  # ffmpeg murió; close() reporta el error
+        elif self._respaldo is not None:
+            self._respaldo.write(muestras)
+
+    def close(self):
+        """Cierra el pipe y espera a ffmpeg. Regresa True si todo salió bien."""
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            stderr = self._proc.stderr.read().decode(errors="replace").strip()
+            if self._proc.wait() != 0:
+                self.error = f"ffmpeg falló: {stderr or self._proc.returncode}"
+            self._proc.stderr.close()
+            self._proc = None
+        if self._respaldo is not None:
+            self._respaldo.close()
+            self._respaldo = None
+        return self.error is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def exportar(samples, sample_rate, wav_path=None, mp3_path=None, bitrate=MP3_BITRATE):
+    """
+    Exporta un arreglo completo a WAV y/o MP3 con una sola invocación de
+    ffmpeg. Regresa None si todo salió bien o el mensaje de error.
+    """
+    escritor = EscritorFfmpeg(sample_rate, wav_path, mp3_path, bitrate)
+    samples = np.asarray(samples)
+    for i in range(0, len(samples), BLOQUE):
+        escritor.write(samples[i : i + BLOQUE])
+    escritor.close()
+    return escritor.error
+
+
+def wav_a_mp3(wav_path, mp3_path, bitrate=MP3_BITRATE):
+    """
+    Convierte un archivo existente a MP3 leyéndolo por bloques con
+    soundfile y mandándolo por pipe (mismo camino que exportar()).
+    """
+    escritor = EscritorFfmpeg(sf.info(wav_path).samplerate, None, mp3_path, bitrate)
+    for bloque in sf.blocks(
+        wav_path, blocksize=BLOQUE, dtype="float32", always_2d=True
+    ):
+        escritor.write(bloque.mean(axis=1))
+    escritor.close()
+    return escritor.error
+
+
+class ColaExportacion:
+    """
+    Cola de codificación en segundo plano.
+
+    encolar() regresa de inmediato un Future (resultado = None o mensaje de
+    error). La cola tiene tamaño máximo: si el DSP va más rápido que la
+    codificación, encolar() espera (contrapresión) en lugar de acumular
+    audios sin límite en memoria.
+    """
+
+    def __init__(self, max_pendientes=4, hilos=1):
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._hilos = [
+            threading.Thread(target=self._trabajar, daemon=True) for _ in range(hilos)
+        ]
+        for h in self._hilos:
+            h.start()
+
+    def _trabajar(self):
+        while True:
+            tarea = self._cola.get()
+            if tarea is None:
+                self._cola.task_done()
+                break
+            futuro, args = tarea
+            if futuro.set_running_or_notify_cancel():
+                try:
+                    futuro.set_result(exportar(*args))
+                except Exception as e:
+                    futuro.set_exception(e)
+            self._cola.task_done()
+
+    def encolar(self, samples, sample_rate, wav_path=None, mp3_path=None):
+        futuro = Future()
+        self._cola.put((futuro, (samples, sample_rate, wav_path, mp3_path)))
+        return futuro
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def cerrar(self):
+        """Espera a que termine todo lo encolado."""
+        for _ in self._hilos:
+            self._cola.put(None)
+        for h in self._hilos:
+            h.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
@@ -0,0 +1,180 @@
+# Seguimiento de F0 y armonicidad (YIN) vectorizado con FFT
+#
+# La historia de todo el análisis es la pérdida de estructura armónica
+# ("Escalera vs Niebla"); aquí se mide por trama en lugar de a ojo.
+#
+# YIN (de Cheveigné y Kawahara, 2002) por trama, con ventana de
+# integración W = periodo máximo:
+#
+#   d(tau)  = sum_j (x_j - x_{j+tau})^2 = E_0 + E_tau - 2 r(tau)
+#   d'(tau) = d(tau) * tau / sum_{k<=tau} d(k)      (CMNDF)
+#
+# r(tau) es la correlación cruzada de los primeros W puntos con la trama
+# completa: UNA rfft/irfft por trama, todas las tramas de un bloque a la
+# vez. E_tau sale de una suma acumulada de x^2. El periodo es el primer
+# mínimo local de d' bajo UMBRAL (si no hay, la trama es sorda), con
+# interpolación parabólica. periodicidad = 1 - d'(periodo) (0 = ruido,
+# 1 = periódica), la misma idea que el HNR de utils.descriptores.
+#
+# La señal se lee por bloques de tramas (sirve un WAV mapeado de
+# utils.wav_mmap sin convertirlo completo): memoria acotada. 60 s a
+# 44.1 kHz tardan ~0.4 s en un núcleo, sin la búsqueda HMM de pyin.
+import numpy as np
+import scipy.fft
+
+from utils.precision import fft_workers
+
+F0_MIN = 75  # Hz
+F0_MAX = 500
+HOP_SEGUNDOS = 0.010
+UMBRAL = 0.15  # CMNDF bajo este valor = trama sonora
+RANGO_SILENCIO_DB = 50  # Tramas a más de 50 dB bajo la más fuerte = silencio
+BLOQUE_TRAMAS = 1024  # Tramas transformadas a la vez
+
+
+def parametros(fs, f0_min=F0_MIN, f0_max=F0_MAX, hop_segundos=HOP_SEGUNDOS):
+    """(tau_min, tau_max, W, largo de trama, hop, n_fft) en muestras."""
+    tau_min = max(2, int(fs / f0_max))
+    tau_max = int(np.ceil(fs / f0_min))
+    ventana = tau_max
+    largo = ventana + tau_max + 1
+    hop = max(1, int(round(hop_segundos * fs)))
+    return tau_min, tau_max, ventana, largo, hop, scipy.fft.next_fast_len(largo)
+
+
+def cmndf(tramas, ventana, tau_max, n_fft):
+    """
+    d'(tau) para tau = 0..tau_max de cada fila de 'tramas'
+    (n_tramas x largo). También regresa la energía E_0 de cada trama.
+    """
+    a = scipy.fft.rfft(tramas[:, :ventana], n=n_fft, axis=1, workers=fft_workers())
+    b = scipy.fft.rfft(tramas, n=n_fft, axis=1, workers=fft_workers())
+    a = np.conj(a, out=a)
+    a *= b
+    r = scipy.fft.irfft(a, n=n_fft, axis=1, workers=fft_workers())[:, : tau_max + 1]
+
+    acumulada = np.zeros((len(tramas), tramas.shape[1] + 1))
+    np.cumsum(tramas**2, axis=1, out=acumulada[:, 1:])
+    energia = (
+        acumulada[:, ventana : ventana + tau_max + 1] - acumulada[:, : tau_max + 1]
+    )
+    d = energia[:, :1] + energia - 2 * r
+    d[:, 0] = 0
+    np.maximum(d, 0, out=d)  # Redondeo de la FFT
+
+    suma = np.cumsum(d[:, 1:], axis=1)
+    tau = np.arange(1, tau_max + 1)
+    salida = np.ones_like(d)
+    np.divide(d[:, 1:] * tau, suma, out=salida[:, 1:], where=suma > 0)
+    return salida, energia[:, 0]
+
+
+def elegir_periodo(dp, tau_min, umbral=UMBRAL):
+    """
+    Primer mínimo local de d' bajo el umbral en [tau_min, tau_max] (o el
+    mínimo global si ninguno cruza). Regresa (periodo fraccionario,
+    d' en el periodo, cruzó el umbral).
+    """
+    rango = dp[:, tau_min:]
+    n, m = rango.shape
+    bajo = rango < umbral
+    cruza = bajo.any(axis=1)
+    primero = np.argmax(bajo, axis=1)
+
+    # Desde el primer cruce se baja hasta que d' vuelve a subir
+    minimo_local = np.ones_like(bajo)
+    minimo_local[:, :-1] = rango[:, 1:] >= rango[:, :-1]
+    columnas = np.arange(m)
+    candidato = minimo_local & (columnas >= primero[:, None])
+    indice = np.where(cruza, np.argmax(candidato, axis=1), np.argmin(rango, axis=1))
+
+    filas = np.arange(n)
+    valor = rango[filas, indice]
+    # Interpolación parabólica (en los bordes no hay vecinos)
+    interior = (indice > 0) & (indice < m - 1)
+    i = np.clip(indice, 1, m - 2)
+    izq, centro, der = rango[filas, i - 1], rango[filas, i], rango[filas, i + 1]
+    curvatura = izq - 2 * centro + der
+    delta = np.divide(
+        izq - der,
+        2 * curvatura,
+        out=np.zeros(n),
+        where=interior & (curvatura > 0),
+    )
+    return tau_min + indice + np.clip(delta, -1, 1), valor, cruza
+
+
+def seguir(data, fs, f0_min=F0_MIN, f0_max=F0_MAX, umbral=UMBRAL):
+    """
+    Pista de F0 de una señal mono (arreglo o utils.wav_mmap.SenalMapeada).
+    Regresa columnas por trama:
+        {"tiempo": s (centro), "f0": Hz (NaN si sorda),
+         "periodicidad": 0..1, "sonora": bool}
+    """
+    tau_min, tau_max, ventana, largo, hop, n_fft = parametros(fs, f0_min, f0_max)
+    n = len(data)
+    n_tramas = 0 if n < largo else 1 + (n - largo) // hop
+    periodo = np.full(n_tramas, np.nan)
+    periodicidad = np.zeros(n_tramas)
+    cruza = np.zeros(n_tramas, dtype=bool)
+    energia = np.zeros(n_tramas)
+
+    for t0 in range(0, n_tramas, BLOQUE_TRAMAS):
+        t1 = min(n_tramas, t0 + BLOQUE_TRAMAS)
+        x = np.asarray(data[t0 * hop : (t1 - 1) * hop + largo], dtype=np.float64)
+        tramas = np.lib.stride_tricks.sliding_window_view(x, largo)[::hop]
+        dp, e = cmndf(tramas, ventana, tau_max, n_fft)
+        p, valor, c = elegir_periodo(dp, tau_min, umbral)
+        periodo[t0:t1] = p
+        periodicidad[t0:t1] = np.clip(1 - valor, 0, 1)
+        cruza[t0:t1] = c
+        energia[t0:t1] = e
+
+    nivel = 10 * np.log10(energia / ventana + 1e-20)
+    audible = nivel >= nivel.max() - RANGO_SILENCIO_DB if n_tramas else cruza
+    sonora = cruza & audible
+    return {
+        "tiempo": (np.arange(n_tramas) * hop + largo / 2) / fs,
+        "f0": np.where(sonora, fs / periodo, np.nan),
+        "periodicidad": np.where(audible, periodicidad, 0.0),
+        "sonora": sonora,
+    }
+
+
+def resumen(pista):
+    """F0 mediana, dispersión (semitonos), fracción sonora y periodicidad."""
+    f0 = pista["f0"][pista["sonora"]]
+    if len(f0) == 0:
+        return {
+            "f0_mediana": float("nan"),
+            "f0_desv_st": float("nan"),
+            "frac_sonora": 0.0,
+            "periodicidad": (
+                float(np.mean(pista["periodicidad"]))
+                if len(pista["periodicidad"])
+                else float("nan")
+            ),
+        }
+    mediana = float(np.median(f0))
+    return {
+        "f0_mediana": mediana,
+        "f0_desv_st": float(np.std(12 * np.log2(f0 / mediana))),
+        "frac_sonora": float(np.mean(pista["sonora"])),
+        "periodicidad": float(np.mean(pista["periodicidad"])),
+    }
+
+
+def pesos_sonoridad(pista, tiempos, suavizado=0.05):
+    """
+    Peso 0..1 por instante de 'tiempos' (p. ej. las tramas de una STFT):
+    la periodicidad de las tramas sonoras (0 en las sordas), suavizada
+    con una media móvil de 'suavizado' segundos para no meter clicks.
+    """
+    if len(pista["tiempo"]) == 0:
+        return np.zeros(len(tiempos))
+    peso = np.where(pista["sonora"], pista["periodicidad"], 0.0)
+    if len(pista["tiempo"]) > 1:
+        paso = pista["tiempo"][1] - pista["tiempo"][0]
+        k = max(1, int(round(suavizado / paso)))
+        peso = np.convolve(peso, np.ones(k) / k, mode="same")
+    return np.interp(tiempos, pista["tiempo"], peso)
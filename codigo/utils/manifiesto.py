@@ -0,0 +1,139 @@
+# Manifiesto de procesamiento incremental
+# Guarda, por etapa, qué archivo de entrada (hash + mtime) produjo qué salida,
+# para no repetir trabajo si nada cambió.
+import hashlib
+import json
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# data/ -> el manifiesto vive junto a data/1_input
+DIR_DATA = os.path.normpath(os.path.join(BASE_DIR, "..", "..", "data"))
+RUTA_MANIFIESTO = os.path.join(DIR_DATA, "manifiesto.json")
+
+VERSION = 1
+TAM_LECTURA = 1 << 20  # 1 MiB por lectura al calcular el hash
+
+
+def hash_archivo(ruta):
+    """SHA-256 del contenido, leyendo por bloques (memoria constante)."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(TAM_LECTURA), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def ruta_relativa(ruta):
+    """Clave portable: ruta relativa a data/ con '/' como separador."""
+    rel = os.path.relpath(os.path.abspath(ruta), DIR_DATA)
+    return rel.replace(os.sep, "/")
+
+
+class Manifiesto:
+    """
+    Registro persistente (JSON) de entradas -> salidas por etapa.
+
+    Estructura:
+        {"version": 1,
+         "etapas": {"normalizar": {clave: registro}, "denoiser": {...}, ...}}
+
+    Cada registro guarda la huella (hash, mtime, tamaño) de sus entradas,
+    las rutas de sus salidas y los parámetros con los que se generó.
+    """
+
+    def __init__(self, ruta=RUTA_MANIFIESTO):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self.datos = {"version": VERSION, "etapas": {}}
+        if os.path.exists(ruta):
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    datos = json.load(f)
+                if datos.get("version") == VERSION:
+                    self.datos = datos
+            except (OSError, ValueError) as e:
+                print(f" [AVISO] Manifiesto ilegible, se empieza de cero: {e}")
+
+    # --- Huellas ---------------------------------------------------------
+
+    def huella(self, ruta, previa=None):
+        """
+        Huella de un archivo. Si mtime y tamaño coinciden con la huella
+        previa se reutiliza su hash (evita releer archivos sin cambios).
+        """
+        st = os.stat(ruta)
+        if (
+            previa is not None
+            and previa.get("mtime") == st.st_mtime
+            and previa.get("tamano") == st.st_size
+        ):
+            return dict(previa)
+        return {"hash": hash_archivo(ruta), "mtime": st.st_mtime, "tamano": st.st_size}
+
+    # --- Consultas -------------------------------------------------------
+
+    def etapa(self, nombre):
+        return self.datos["etapas"].setdefault(nombre, {})
+
+    def registro(self, etapa, clave):
+        return self.datos["etapas"].get(etapa, {}).get(clave)
+
+    def esta_al_dia(self, etapa, clave, entradas, salidas, params=None):
+        """
+        True si ya existe un registro para 'clave' cuyas entradas no han
+        cambiado (mismo hash), cuyos parámetros coinciden y cuyas salidas
+        siguen en disco.
+        """
+        reg = self.registro(etapa, clave)
+        if reg is None or reg.get("params") != params:
+            return False
+
+        if [ruta_relativa(s) for s in salidas] != reg.get("salidas"):
+            return False
+        if not all(os.path.exists(s) for s in salidas):
+            return False
+
+        previas = reg.get("entradas", {})
+        for ruta in entradas:
+            previa = previas.get(ruta_relativa(ruta))
+            if previa is None or not os.path.exists(ruta):
+                return False
+            if self.huella(ruta, previa)["hash"] != previa["hash"]:
+                return False
+        return True
+
+    # --- Escritura -------------------------------------------------------
+
+    def registrar(self, etapa, clave, entradas, salidas, params=None, huellas=None):
+        """
+        Guarda (en memoria) el registro de una ejecución exitosa.
+        'huellas' permite pasar huellas ya calculadas {ruta: huella}.
+        """
+        huellas = huellas or {}
+        reg = {
+            "entradas": {
+                ruta_relativa(r): huellas.get(r) or self.huella(r) for r in entradas
+            },
+            "salidas": [ruta_relativa(s) for s in salidas],
+            "params": params,
+        }
+        with self._lock:
+            self.etapa(etapa)[clave] = reg
+
+    def guardar(self):
+        """Escritura atómica: archivo temporal + os.replace."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            tmp = self.ruta + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.datos, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.ruta)
+
+
+# Opción de debugeo
+if __name__ == "__main__":
+    m = Manifiesto()
+    for nombre, registros in m.datos["etapas"].items():
+        print(f"[{nombre}] {len(registros)} registros")
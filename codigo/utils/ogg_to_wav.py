@@ -1,7 +1,8 @@
 # Módulo para descomprimir ogg en wav EN MASA
-from pydub import AudioSegment
 import glob
 
+from decodificador import convertir_a_wav
+
 # Variables de rutas
 ruta = "../audios/ogg/"
 nombres_nuevos = "audio_ruidoso"
@@ -16,10 +17,8 @@ def normalizar():
     """
     contador = 0
     for i in archivos:
-        audio = AudioSegment.from_file(i)
-        audio.export(
-            "../audios/wav/" + nombres_nuevos + f"{contador + 1}.wav", format="wav"
-        )
+        # Decodificación en proceso (soundfile + soxr), ffmpeg solo como respaldo
+        convertir_a_wav(i, "../audios/wav/" + nombres_nuevos + f"{contador + 1}.wav")
         contador += 1
 
 
@@ -0,0 +1,84 @@
+# Almacén de perfiles espectrales de referencia (data/perfiles/<nombre>.npz)
+#
+# Un perfil es el PSD en dB de una referencia sana (un archivo o una
+# cohorte), ya suavizado, junto con su rejilla de frecuencias y los
+# parámetros con los que se calculó. Se calcula una vez y se carga por
+# nombre en cada restauración (3_tomie), en lugar de re-analizar la
+# referencia cada vez.
+import json
+import os
+import re
+import uuid
+
+import numpy as np
+
+from utils.manifiesto import DIR_DATA, hash_archivo, ruta_relativa
+
+DIR_PERFILES = os.path.join(DIR_DATA, "perfiles")
+
+_NOMBRE_VALIDO = re.compile(r"^[\w.\-]+$")
+
+
+def ruta_perfil(nombre, directorio=DIR_PERFILES):
+    if not _NOMBRE_VALIDO.match(nombre):
+        raise ValueError(f"Nombre de perfil inválido: {nombre!r}")
+    return os.path.join(directorio, f"{nombre}.npz")
+
+
+def fuentes_con_huella(rutas):
+    """[{ruta, sha256}] de los audios de los que sale un perfil."""
+    return [{"ruta": ruta_relativa(r), "sha256": hash_archivo(r)} for r in rutas]
+
+
+def guardar(nombre, freqs, perfil_db, suavizado_db, params, directorio=DIR_PERFILES):
+    """Escritura atómica (archivo temporal + os.replace). Regresa la ruta."""
+    ruta = ruta_perfil(nombre, directorio)
+    os.makedirs(directorio, exist_ok=True)
+    tmp = os.path.join(directorio, f".tmp_{uuid.uuid4().hex}.npz")
+    np.savez(
+        tmp,
+        freqs=np.asarray(freqs, dtype=np.float64),
+        perfil_db=np.asarray(perfil_db, dtype=np.float64),
+        suavizado_db=np.asarray(suavizado_db, dtype=np.float64),
+        params=np.array(json.dumps(params, sort_keys=True)),
+    )
+    os.replace(tmp, ruta)
+    return ruta
+
+
+def cargar(nombre, directorio=DIR_PERFILES):
+    """
+    Regresa {"nombre", "freqs", "perfil_db", "suavizado_db", "params"}.
+    Lanza FileNotFoundError si el perfil no existe.
+    """
+    ruta = ruta_perfil(nombre, directorio)
+    with np.load(ruta, allow_pickle=False) as f:
+        return {
+            "nombre": nombre,
+            "freqs": f["freqs"],
+            "perfil_db": f["perfil_db"],
+            "suavizado_db": f["suavizado_db"],
+            "params": json.loads(str(f["params"])),
+        }
+
+
+def listar(directorio=DIR_PERFILES):
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(
+        os.path.splitext(f)[0]
+        for f in os.listdir(directorio)
+        if f.endswith(".npz") and not f.startswith(".")
+    )
+
+
+def esta_vigente(perfil):
+    """
+    True si todos los audios fuente siguen existiendo con el mismo
+    contenido (para avisar si la referencia cambió desde que se guardó).
+    """
+    for fuente in perfil["params"].get("fuentes", []):
+        ruta = os.path.join(DIR_DATA, fuente["ruta"])
+        if not os.path.exists(ruta) or hash_archivo(ruta) != fuente["sha256"]:
+            return False
+    return True
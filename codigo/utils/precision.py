@@ -0,0 +1,141 @@
+# Configuración de precisión numérica y de hilos FFT para TODAS las etapas
+#
+# "float64" (default): como siempre, float64 / complex128.
+# "float32": muestras en float32 y espectros en complex64 desde la carga
+#            hasta la escritura. La mitad de memoria y de ancho de banda.
+#
+# Cota de error documentada (float32 vs float64, mismas entradas):
+#   - Muestras de salida (denoiser, streaming y tomie): error absoluto
+#     <= 1e-6 (≈ -120 dBFS). Medido: ~1e-7 sobre data/1_input.
+#     Al escribir en PCM_16 la diferencia es, como mucho, 1 LSB (3.05e-5).
+#   - PSD de Welch en dB (cordie/tomie): <= 1e-3 dB. Medido: ~2e-5 dB.
+#
+# Tasa de análisis (--fs-analisis, p. ej. 16000): PSD, espectrogramas,
+# perfiles y F0 se calculan sobre una copia remuestreada (y guardada en la
+# caché espectral, ver cache_espectral.para_analisis). La voz que importa
+# está en 0-5 kHz, así que a 16 kHz cada transformada cuesta ~1/2.8. El
+# audio que se escribe (denoiser, restauración) sigue a su tasa original.
+#
+# Detector de voz (--vad, ver utils/vad.py): las etapas saltan las pausas
+# y los silencios (índice de segmentos junto a cada audio).
+#
+# La configuración se guarda también en variables de entorno para que los
+# procesos hijos (pools de batch) hereden la misma precisión.
+#
+# Este módulo no importa numpy/scipy al cargarse (solo al usarse): la CLI
+# (cordectomia.py) arma sus opciones sin pagar esos imports en --help.
+import os
+from contextlib import contextmanager
+
+PRECISIONES = ("float64", "float32")
+COTA_ERROR_FLOAT32 = 1e-6  # Error máximo por muestra vs float64
+
+_ENV_PRECISION = "CORDECTOMIA_PRECISION"
+_ENV_WORKERS = "CORDECTOMIA_FFT_WORKERS"
+_ENV_FS_ANALISIS = "CORDECTOMIA_FS_ANALISIS"  # "0" o ausente = tasa completa
+_ENV_VAD = "CORDECTOMIA_VAD"  # "1" = solo segmentos con voz
+
+
+def configurar(precision=None, fft_workers=None, fs_analisis=None, vad=None):
+    """
+    Fija la precisión, los hilos FFT, la tasa de análisis y el detector de
+    voz (y los exporta a procesos hijos). fs_analisis=0 vuelve a la tasa
+    completa.
+    """
+    if precision is not None:
+        if precision not in PRECISIONES:
+            raise ValueError(f"Precisión inválida: {precision} (usa {PRECISIONES})")
+        os.environ[_ENV_PRECISION] = precision
+    if fft_workers is not None:
+        os.environ[_ENV_WORKERS] = str(int(fft_workers))
+    if fs_analisis is not None:
+        if int(fs_analisis) < 0:
+            raise ValueError(f"Tasa de análisis inválida: {fs_analisis}")
+        os.environ[_ENV_FS_ANALISIS] = str(int(fs_analisis))
+    if vad is not None:
+        os.environ[_ENV_VAD] = "1" if vad else "0"
+
+
+def precision():
+    return os.environ.get(_ENV_PRECISION, "float64")
+
+
+def dtype_real():
+    import numpy as np
+
+    return np.float32 if precision() == "float32" else np.float64
+
+
+def dtype_complejo():
+    import numpy as np
+
+    return np.complex64 if precision() == "float32" else np.complex128
+
+
+def fft_workers():
+    """Hilos para scipy.fft (default: todos los núcleos; -1 en scipy)."""
+    return int(os.environ.get(_ENV_WORKERS, -1))
+
+
+def fs_analisis():
+    """Tasa (Hz) a la que se analiza, o None = la de cada archivo."""
+    return int(os.environ.get(_ENV_FS_ANALISIS, 0)) or None
+
+
+def usar_vad():
+    """True si las etapas deben procesar solo los segmentos con voz."""
+    return os.environ.get(_ENV_VAD, "0") == "1"
+
+
+def como_real(x):
+    """Convierte (sin copiar si ya coincide) al dtype real configurado."""
+    import numpy as np
+
+    return np.asarray(x, dtype=dtype_real())
+
+
+@contextmanager
+def sesion_fft():
+    """
+    Todo scipy.fft / scipy.signal (stft, istft, welch) dentro de este
+    bloque usa fft_workers() hilos.
+    """
+    import scipy.fft
+
+    with scipy.fft.set_workers(fft_workers()):
+        yield
+
+
+def agregar_argumentos(parser):
+    """Opciones de línea de comandos comunes a todas las etapas."""
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONES,
+        default=None,
+        help="float32 = mitad de memoria (error <= 1e-6 por muestra vs float64)",
+    )
+    parser.add_argument(
+        "--fft-workers",
+        type=int,
+        default=None,
+        help="Hilos para las FFT de scipy (default: todos los núcleos)",
+    )
+    parser.add_argument(
+        "--fs-analisis",
+        type=int,
+        default=None,
+        metavar="HZ",
+        help="Analizar (PSD, espectrogramas, perfiles, F0) a esta tasa, p. ej. "
+        "16000; el audio de salida no cambia (default: tasa del archivo)",
+    )
+    parser.add_argument(
+        "--vad",
+        action="store_true",
+        default=None,
+        help="Saltar silencios y pausas: perfiles solo con voz, pausas sin "
+        "filtrar (índice <audio>.vad.json)",
+    )
+
+
+def configurar_desde_args(args):
+    configurar(args.precision, args.fft_workers, args.fs_analisis, args.vad)
@@ -0,0 +1,328 @@
+# Instrumentación por etapa: tiempo, E/S y memoria de cada paso, en JSON lines
+#
+# Apagada por default: paso() solo imprime su mensaje de progreso y regresa
+# un contexto vacío (una comparación por paso, nada más). Se activa con
+# --traza RUTA en cualquier etapa, o con la variable de entorno
+# CORDECTOMIA_TRAZA=RUTA, que heredan los procesos hijos de los pools.
+#
+# Cada archivo procesado deja UNA línea en RUTA:
+#   {"etapa": "denoiser", "archivo": "1_input/x.wav", "ok": true,
+#    "wall": 1.93, "cpu": 3.41, "bytes_leidos": ..., "bytes_escritos": ...,
+#    "pico_mb": ..., "rss_max_mb": ..., "pid": ..., "inicio": <epoch>,
+#    "pasos": [{"paso": "denoise/stft", "wall": ..., "cpu": ...,
+#               "arreglos": {"Zxx": {"forma": [1025, 870], ...}}}, ...],
+#    "eventos": ["[ERROR] ..."]}
+# Los pasos fuera de un archivo (p. ej. cargar un perfil) salen como
+# líneas sueltas con "archivo": null.
+#
+# Los mensajes de progreso (" -> Exportando WAV ...") salen de los mismos
+# eventos: paso(nombre, mensaje) imprime el mensaje y, con la traza
+# activa, además mide.
+#
+# Memoria: "rss_max_mb" (ru_maxrss del proceso) va siempre. Con
+# --traza-memoria se usa además tracemalloc para el pico de asignaciones
+# (Python + NumPy) de cada paso; es más caro (~1.5-2x en pasos con muchos
+# arreglos chicos), por eso va aparte.
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+_ENV_RUTA = "CORDECTOMIA_TRAZA"
+_ENV_MEMORIA = "CORDECTOMIA_TRAZA_MEMORIA"
+
+_NULO = contextlib.nullcontext()
+_local = threading.local()
+
+_ruta = os.environ.get(_ENV_RUTA) or None
+_memoria = os.environ.get(_ENV_MEMORIA) == "1"
+
+
+def configurar(ruta=None, memoria=None):
+    """Activa la traza hacia 'ruta' (y la exporta a procesos hijos)."""
+    global _ruta, _memoria
+    if ruta is not None:
+        _ruta = os.path.abspath(ruta)
+        os.environ[_ENV_RUTA] = _ruta
+    if memoria is not None:
+        _memoria = bool(memoria)
+        os.environ[_ENV_MEMORIA] = "1" if _memoria else "0"
+
+
+def activa():
+    return _ruta is not None
+
+
+def agregar_argumentos(parser):
+    parser.add_argument(
+        "--traza",
+        metavar="RUTA",
+        default=None,
+        help="Registrar tiempo/E-S/memoria por archivo y paso (JSON lines)",
+    )
+    parser.add_argument(
+        "--traza-memoria",
+        action="store_true",
+        help="Con --traza: medir también el pico de asignaciones (tracemalloc)",
+    )
+
+
+def configurar_desde_args(args):
+    if args.traza:
+        configurar(args.traza, args.traza_memoria or None)
+
+
+# --- ESCRITURA ---
+
+
+def _emitir(registro):
+    # Una sola escritura O_APPEND por línea: los procesos de un pool
+    # pueden compartir el archivo sin mezclar líneas
+    linea = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+    fd = os.open(_ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, linea.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def _pila():
+    pila = getattr(_local, "pila", None)
+    if pila is None:
+        pila = _local.pila = []
+    return pila
+
+
+def _rss_max_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _Marco:
+    """Un archivo o un paso en curso (tiempos, E/S, memoria)."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.bytes_leidos = 0
+        self.bytes_escritos = 0
+        self.arreglos = {}
+        self.datos = {}
+        self.pasos = []
+        self.eventos = []
+        self.pico = 0
+        self.base = 0
+        if _memoria and tracemalloc.is_tracing():
+            pila = _pila()
+            actual, pico = tracemalloc.get_traced_memory()
+            # El pico del marco de arriba se guarda antes de reiniciarlo
+            if pila:
+                pila[-1].pico = max(pila[-1].pico, pico)
+            tracemalloc.reset_peak()
+            self.base = actual
+        self.inicio = time.time()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    def cerrar(self):
+        datos = {
+            **self.datos,
+            "wall": time.perf_counter() - self.wall,
+            "cpu": time.process_time() - self.cpu,
+        }
+        if self.bytes_leidos:
+            datos["bytes_leidos"] = self.bytes_leidos
+        if self.bytes_escritos:
+            datos["bytes_escritos"] = self.bytes_escritos
+        if self.arreglos:
+            datos["arreglos"] = self.arreglos
+        if _memoria and tracemalloc.is_tracing():
+            self.pico = max(self.pico, tracemalloc.get_traced_memory()[1])
+            datos["pico_mb"] = (self.pico - self.base) / 1e6
+        return datos
+
+
+class _MarcoPaso(_Marco):
+    pass
+
+
+def _subir(marco, padre):
+    """Suma la E/S y el pico de memoria de un marco al de arriba."""
+    padre.bytes_leidos += marco.bytes_leidos
+    padre.bytes_escritos += marco.bytes_escritos
+    padre.pico = max(padre.pico, marco.pico)
+
+
+# --- API ---
+
+
+@contextlib.contextmanager
+def _archivo(etapa, ruta, datos):
+    if _memoria and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    pila = _pila()
+    marco = _Marco(etapa)
+    pila.append(marco)
+    ok, error = True, ""
+    try:
+        yield marco
+    except BaseException as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        pila.remove(marco)
+        if pila:
+            _subir(marco, pila[-1])
+        registro = {"etapa": etapa, "archivo": ruta, **datos}
+        registro["ok"] = ok and not any(e.startswith("[ERROR]") for e in marco.eventos)
+        if error:
+            registro["error"] = error
+        registro.update(marco.cerrar())
+        registro.update(
+            pid=os.getpid(),
+            inicio=marco.inicio,
+            rss_max_mb=_rss_max_mb(),
+            pasos=marco.pasos,
+        )
+        if marco.eventos:
+            registro["eventos"] = marco.eventos
+        _emitir(registro)
+
+
+def archivo(etapa, ruta, **datos):
+    """
+    Contexto de UN archivo de una etapa: todo paso() dentro se acumula en
+    su registro, que se escribe al salir (aunque haya excepción).
+    'datos' se agregan tal cual al registro (p. ej. referencia=...).
+    """
+    if _ruta is None:
+        return _NULO
+    return _archivo(etapa, ruta, datos)
+
+
+@contextlib.contextmanager
+def _paso(nombre, datos):
+    pila = _pila()
+    if pila and isinstance(pila[-1], _MarcoPaso):
+        nombre = f"{pila[-1].nombre}/{nombre}"
+    marco = _MarcoPaso(nombre)
+    pila.append(marco)
+    try:
+        yield marco
+    finally:
+        pila.remove(marco)
+        registro = {"paso": marco.nombre, **datos, **marco.cerrar()}
+        dueno = next((m for m in reversed(pila) if not isinstance(m, _MarcoPaso)), None)
+        if pila:
+            _subir(marco, pila[-1])
+        if dueno is not None:
+            dueno.pasos.append(registro)
+        else:
+            _emitir({"etapa": None, "archivo": None, "pid": os.getpid(), **registro})
+
+
+def paso(nombre, mensaje=None, **datos):
+    """
+    Contexto de un paso (cargar, stft, exportar...). Imprime 'mensaje'
+    siempre, como los print de progreso de antes. Los pasos se pueden
+    anidar ("denoise/stft").
+    """
+    if mensaje is not None:
+        print(mensaje)
+    if _ruta is None:
+        return _NULO
+    return _paso(nombre, datos)
+
+
+def avisar(mensaje):
+    """
+    print() de un aviso o error que además queda en "eventos" del
+    registro del archivo en curso. Los que empiezan con [ERROR] marcan el
+    registro como ok=false.
+    """
+    print(mensaje)
+    if _ruta is None:
+        return
+    for m in reversed(_pila()):
+        if not isinstance(m, _MarcoPaso):
+            m.eventos.append(mensaje.strip())
+            return
+
+
+def leido(*rutas):
+    """Suma el tamaño de los archivos leídos al paso en curso."""
+    if _ruta is None or not _pila():
+        return
+    _pila()[-1].bytes_leidos += sum(_tamano(r) for r in rutas)
+
+
+def escrito(*rutas):
+    """Suma el tamaño de los archivos escritos al paso en curso."""
+    if _ruta is None or not _pila():
+        return
+    _pila()[-1].bytes_escritos += sum(_tamano(r) for r in rutas)
+
+
+def arreglo(nombre, x):
+    """Anota forma, dtype y tamaño de un arreglo en el paso en curso."""
+    if _ruta is None or not _pila():
+        return
+    _pila()[-1].arreglos[nombre] = {
+        "forma": list(getattr(x, "shape", ())),
+        "dtype": str(getattr(x, "dtype", type(x).__name__)),
+        "mb": getattr(x, "nbytes", 0) / 1e6,
+    }
+
+
+def anotar(**datos):
+    """Agrega campos al paso en curso (p. ej. el motor que se usó)."""
+    if _ruta is None or not _pila():
+        return
+    _pila()[-1].datos.update(datos)
+
+
+def _tamano(ruta):
+    try:
+        return os.path.getsize(ruta)
+    except (OSError, TypeError):
+        return 0
+
+
+def leer(ruta):
+    """Registros de un archivo de traza."""
+    with open(ruta, "r", encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def resumen(registros):
+    """
+    Totales por (etapa, paso): [(etapa, paso, n, wall, cpu, bytes E/S)],
+    de mayor a menor tiempo. Responde "¿en qué se va el tiempo del lote?".
+    """
+    totales = {}
+    for r in registros:
+        for p in r.get("pasos", []) if r.get("archivo") is not None else [r]:
+            t = totales.setdefault((r.get("etapa") or "-", p["paso"]), [0, 0.0, 0.0, 0])
+            t[0] += 1
+            t[1] += p["wall"]
+            t[2] += p["cpu"]
+            t[3] += p.get("bytes_leidos", 0) + p.get("bytes_escritos", 0)
+    filas = [(etapa, paso, *t) for (etapa, paso), t in totales.items()]
+    return sorted(filas, key=lambda f: -f[3])
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Uso: python -m utils.traza RUTA.jsonl")
+        sys.exit(2)
+    filas = resumen(leer(sys.argv[1]))
+    print(
+        f"{'Etapa':<10} {'Paso':<28} {'n':>5} {'wall(s)':>9} {'cpu(s)':>9} {'E/S(MB)':>9}"
+    )
+    for etapa, paso_, n, wall, cpu, io in filas:
+        print(
+            f"{etapa:<10} {paso_:<28} {n:>5} {wall:>9.3f} {cpu:>9.3f} {io / 1e6:>9.1f}"
+        )
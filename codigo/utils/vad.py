@@ -0,0 +1,261 @@
+# Detector de actividad de voz (VAD) por energía y planitud espectral
+#
+# Las notas de voz de WhatsApp traen silencio al inicio, al final y entre
+# frases. Con --vad las etapas lo saltan: las PSD de Welch (2_cordie,
+# 3_tomie) promedian solo tramas con voz, el denoiser estima el ruido en
+# las pausas y no corre Wiener en ellas, y la restauración las deja pasar
+# sin ecualizar.
+#
+# Por trama (20 ms, hop 10 ms), en la banda de voz 80-4000 Hz:
+#   energía  -> dB sobre el piso de ruido (percentil 10 del archivo)
+#   planitud -> media geométrica / aritmética del periodograma: ~0.56 en
+#               ruido blanco, < 0.3 en voz armónica aunque sea suave
+#   voz = audible y (energía > piso + UMBRAL_DB  o  planitud < PLANITUD_VOZ)
+# Luego: se descartan ráfagas de menos de MIN_VOZ, se rellenan pausas de
+# menos de MIN_PAUSA y cada segmento se amplía MARGEN por lado (no cortar
+# ataques ni colas).
+#
+# El índice es un JSON junto al audio (<audio>.vad.json) con segmentos
+# [inicio, fin) en muestras; se recalcula si cambia el audio (mtime,
+# tamaño) o algún parámetro. 60 s a 44.1 kHz tardan ~0.05 s.
+import json
+import os
+import uuid
+
+import numpy as np
+import scipy.fft
+
+from utils import wav_mmap
+
+VERSION = 1
+TRAMA_SEGUNDOS = 0.020
+HOP_SEGUNDOS = 0.010
+BANDA_VOZ = (80, 4000)  # Hz
+UMBRAL_DB = 10  # Sobre el piso de ruido
+PLANITUD_VOZ = 0.3
+RANGO_SILENCIO_DB = 50  # Más de 50 dB bajo la trama más fuerte = silencio
+PERCENTIL_PISO = 10
+MIN_VOZ = 0.10  # s
+MIN_PAUSA = 0.25
+MARGEN = 0.10
+BLOQUE_TRAMAS = 2048
+SUAVIZADO = 0.05  # s, rampa de pesos_tiempo
+EXTENSION = ".vad.json"
+PISO = 1e-20
+
+
+def _params():
+    return {
+        "trama": TRAMA_SEGUNDOS,
+        "hop": HOP_SEGUNDOS,
+        "banda": list(BANDA_VOZ),
+        "umbral_db": UMBRAL_DB,
+        "planitud": PLANITUD_VOZ,
+        "rango_db": RANGO_SILENCIO_DB,
+        "min_voz": MIN_VOZ,
+        "min_pausa": MIN_PAUSA,
+        "margen": MARGEN,
+    }
+
+
+# --- DETECCIÓN ---
+
+
+def caracteristicas(data, fs):
+    """
+    (energía en dB, planitud) por trama en la banda de voz. 'data' puede
+    ser un arreglo o una SenalMapeada: se lee por bloques de tramas.
+    Regresa también (largo de trama, hop) en muestras.
+    """
+    largo = max(16, int(round(TRAMA_SEGUNDOS * fs)))
+    hop = max(1, int(round(HOP_SEGUNDOS * fs)))
+    n_fft = scipy.fft.next_fast_len(largo)
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / fs)
+    i0, i1 = np.searchsorted(freqs, BANDA_VOZ)
+    i1 = max(i1, i0 + 1)
+    ventana = np.hanning(largo)
+
+    n = len(data)
+    n_tramas = 0 if n < largo else 1 + (n - largo) // hop
+    energia = np.empty(n_tramas)
+    planitud = np.empty(n_tramas)
+    for t0 in range(0, n_tramas, BLOQUE_TRAMAS):
+        t1 = min(n_tramas, t0 + BLOQUE_TRAMAS)
+        x = np.asarray(data[t0 * hop : (t1 - 1) * hop + largo], dtype=np.float64)
+        tramas = np.lib.stride_tricks.sliding_window_view(x, largo)[::hop]
+        tramas = (tramas - tramas.mean(axis=1, keepdims=True)) * ventana
+        P = np.abs(scipy.fft.rfft(tramas, n=n_fft, axis=1)[:, i0:i1]) ** 2 + PISO
+        media = P.mean(axis=1)
+        energia[t0:t1] = 10 * np.log10(media)
+        planitud[t0:t1] = np.exp(np.log(P).mean(axis=1)) / media
+    return energia, planitud, largo, hop
+
+
+def _rachas(mascara):
+    """Inicios y fines [a, b) de las rachas de True."""
+    borde = np.diff(np.concatenate([[False], mascara, [False]]).astype(np.int8))
+    return np.flatnonzero(borde == 1), np.flatnonzero(borde == -1)
+
+
+def detectar(data, fs):
+    """
+    Segmentos con voz de una señal mono: arreglo (n, 2) int64 de
+    [inicio, fin) en muestras, ordenados y sin traslape.
+    """
+    energia, planitud, largo, hop = caracteristicas(data, fs)
+    if len(energia) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    piso = np.percentile(energia, PERCENTIL_PISO)
+    audible = energia >= energia.max() - RANGO_SILENCIO_DB
+    voz = audible & ((energia > piso + UMBRAL_DB) | (planitud < PLANITUD_VOZ))
+
+    # Ráfagas cortas fuera, pausas cortas dentro (en tramas)
+    inicios, fines = _rachas(voz)
+    largos = fines - inicios
+    minimo = int(np.ceil(MIN_VOZ / HOP_SEGUNDOS))
+    inicios, fines = inicios[largos >= minimo], fines[largos >= minimo]
+    if len(inicios) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    pausa = int(np.ceil(MIN_PAUSA / HOP_SEGUNDOS))
+    sigue = inicios[1:] - fines[:-1] >= pausa
+    inicios = inicios[np.concatenate([[True], sigue])]
+    fines = fines[np.concatenate([sigue, [True]])]
+
+    # Tramas -> muestras, con margen, y se funden los que se tocan
+    margen = int(round(MARGEN * fs))
+    a = np.maximum(inicios * hop - margen, 0)
+    b = np.minimum((fines - 1) * hop + largo + margen, len(data))
+    junta = a[1:] <= b[:-1]
+    a = a[np.concatenate([[True], ~junta])]
+    b = b[np.concatenate([~junta, [True]])]
+    return np.stack([a, b], axis=1).astype(np.int64)
+
+
+# --- ÍNDICE EN DISCO ---
+
+
+def ruta_indice(ruta_audio):
+    return ruta_audio + EXTENSION
+
+
+def _leer(ruta, st):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        datos.get("version") != VERSION
+        or datos.get("mtime_ns") != st.st_mtime_ns
+        or datos.get("tamano") != st.st_size
+        or datos.get("params") != _params()
+    ):
+        return None
+    return datos
+
+
+def indice(ruta_audio, data=None, fs=None):
+    """
+    Índice de voz de un archivo: {"fs", "muestras", "segmentos" (n, 2)}.
+    Lo lee de <audio>.vad.json si sigue vigente; si no, lo calcula (con
+    'data'/'fs' si ya se cargó el audio) y lo escribe. Si la carpeta no
+    se puede escribir, solo avisa.
+    """
+    st = os.stat(ruta_audio)
+    ruta = ruta_indice(ruta_audio)
+    datos = _leer(ruta, st)
+    if datos is None:
+        if data is None:
+            data = wav_mmap.abrir(ruta_audio)
+            if data is not None:
+                fs = data.samplerate
+            else:
+                import soundfile as sf
+
+                data, fs = sf.read(ruta_audio, dtype="float64", always_2d=True)
+                data = data.mean(axis=1)
+        segmentos = detectar(data, fs)
+        datos = {
+            "version": VERSION,
+            "mtime_ns": st.st_mtime_ns,
+            "tamano": st.st_size,
+            "params": _params(),
+            "fs": int(fs),
+            "muestras": int(len(data)),
+            "segmentos": segmentos.tolist(),
+        }
+        tmp = os.path.join(os.path.dirname(ruta), f".tmp_{uuid.uuid4().hex}.json")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(datos, f)
+            os.replace(tmp, ruta)
+        except OSError as e:
+            print(f" [AVISO] No se pudo escribir el índice de voz {ruta}: {e}")
+    return {
+        "fs": datos["fs"],
+        "muestras": datos["muestras"],
+        "segmentos": np.array(datos["segmentos"], dtype=np.int64).reshape(-1, 2),
+    }
+
+
+def segmentos(data, fs):
+    """
+    Segmentos con voz de lo que cargan las etapas: con una SenalMapeada
+    se usa (o se crea) el índice junto al WAV; un arreglo se analiza en
+    memoria.
+    """
+    if isinstance(data, wav_mmap.SenalMapeada):
+        return indice(data.ruta, data, fs)["segmentos"]
+    return detectar(data, fs)
+
+
+# --- CONSULTAS ---
+
+
+def escalar(segmentos, fs, fs_destino):
+    """Segmentos en muestras a fs -> en muestras a fs_destino."""
+    if fs_destino == fs:
+        return segmentos
+    return np.round(np.asarray(segmentos) * (fs_destino / fs)).astype(np.int64)
+
+
+def fraccion(segmentos, n_muestras):
+    """Fracción del audio marcada como voz."""
+    if n_muestras == 0:
+        return 0.0
+    return float(np.sum(np.diff(segmentos, axis=1))) / n_muestras
+
+
+def mascara(segmentos, posiciones):
+    """True donde la posición (en muestras) cae dentro de un segmento."""
+    posiciones = np.asarray(posiciones)
+    if len(segmentos) == 0:
+        return np.zeros(posiciones.shape, dtype=bool)
+    i = np.searchsorted(segmentos[:, 0], posiciones, side="right") - 1
+    return (i >= 0) & (posiciones < segmentos[np.maximum(i, 0), 1])
+
+
+def rangos(mascara):
+    """[(inicio, fin, valor)] de las rachas de una máscara booleana."""
+    mascara = np.asarray(mascara, dtype=bool)
+    if len(mascara) == 0:
+        return []
+    cortes = np.flatnonzero(np.diff(mascara.astype(np.int8))) + 1
+    bordes = np.concatenate([[0], cortes, [len(mascara)]])
+    return [
+        (int(a), int(b), bool(mascara[a])) for a, b in zip(bordes[:-1], bordes[1:])
+    ]
+
+
+def pesos_tiempo(segmentos, tiempos, fs, suavizado=SUAVIZADO):
+    """
+    Peso 0..1 por instante (s), p. ej. las tramas de una STFT: 1 dentro
+    de los segmentos, 0 fuera, con rampas de 'suavizado' segundos para no
+    meter clicks (misma idea que utils.f0.pesos_sonoridad).
+    """
+    tiempos = np.asarray(tiempos)
+    peso = mascara(segmentos, tiempos * fs).astype(np.float64)
+    if len(tiempos) > 1:
+        k = max(1, int(round(suavizado / (tiempos[1] - tiempos[0]))))
+        peso = np.convolve(peso, np.ones(k) / k, mode="same")
+    return peso
@@ -0,0 +1,102 @@
+# Lector de WAV por memory-map (sin copiar ni decodificar el archivo)
+#
+# scipy.io.wavfile.read(mmap=True) mapea el bloque 'data' del WAV PCM. Las
+# muestras se convierten a float (mono) SOLO cuando se pide un rango, así
+# que la PSD de Welch (utils.welch_incremental) recorre el archivo por
+# pedazos sin tener nunca la señal completa en float64. Varios procesos
+# que abren el mismo archivo comparten las páginas del page cache.
+import os
+import warnings
+
+import numpy as np
+from scipy.io import wavfile
+
+from utils.precision import como_real, dtype_real
+
+# Escala a [-1, 1) igual que soundfile
+_ESCALAS = {
+    np.dtype("int16"): 1.0 / 32768.0,
+    np.dtype("int32"): 1.0 / 2147483648.0,
+}
+
+
+class SenalMapeada:
+    """
+    Vista perezosa de un WAV mapeado en memoria.
+
+    senal[a:b]          -> float mono (dtype configurado) solo de ese rango
+    senal.bloques(n)    -> generador de bloques float de n muestras
+    np.asarray(senal)   -> conversión completa (cuando de verdad se necesita)
+    """
+
+    def __init__(self, ruta):
+        with warnings.catch_warnings():
+            # Chunks desconocidos (LIST, etc.) generan avisos inofensivos
+            warnings.simplefilter("ignore", wavfile.WavFileWarning)
+            self.samplerate, self.raw = wavfile.read(ruta, mmap=True)
+        self.ruta = ruta
+        self.frames = self.raw.shape[0]
+        self.channels = 1 if self.raw.ndim == 1 else self.raw.shape[1]
+
+    def __len__(self):
+        return self.frames
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def shape(self):
+        return (self.frames,)
+
+    def _convertir(self, crudo, dtype):
+        if crudo.dtype == np.uint8:  # WAV de 8 bits: sin signo
+            x = (crudo.astype(dtype) - 128.0) / 128.0
+        elif crudo.dtype.kind == "f":
+            x = crudo.astype(dtype, copy=False)
+        else:
+            x = crudo.astype(dtype) * dtype(_ESCALAS[crudo.dtype])
+        if x.ndim > 1:
+            x = x.mean(axis=1, dtype=dtype)
+        return x
+
+    def __getitem__(self, rango):
+        if not isinstance(rango, slice):
+            raise TypeError("SenalMapeada solo acepta rangos (slices)")
+        return self._convertir(self.raw[rango], dtype_real())
+
+    def __array__(self, dtype=None, copy=None):
+        return self._convertir(self.raw, np.dtype(dtype or dtype_real()).type)
+
+    def bloques(self, tamano, solapamiento=0):
+        paso = tamano - solapamiento
+        for inicio in range(0, self.frames, paso):
+            yield self[inicio : inicio + tamano]
+            if inicio + tamano >= self.frames:
+                break
+
+    def huella(self):
+        """Bytes crudos (sin copiar) para calcular hashes de contenido."""
+        return np.ascontiguousarray(self.raw).reshape(-1).view(np.uint8)
+
+
+def abrir(ruta):
+    """
+    Regresa SenalMapeada si el archivo es un WAV mapeable (PCM 8/16/32 bits
+    o float); None en cualquier otro caso (24 bits, OGG, FLAC...), para que
+    el llamador use sf.read.
+    """
+    if not ruta.lower().endswith(".wav") or not os.path.isfile(ruta):
+        return None
+    try:
+        senal = SenalMapeada(ruta)
+    except (ValueError, OSError):
+        return None
+    if senal.raw.dtype not in _ESCALAS and senal.raw.dtype.kind not in "fu":
+        return None
+    return senal
+
+
+def como_senal(x):
+    """Deja pasar una SenalMapeada tal cual; cualquier otra cosa -> como_real."""
+    return x if isinstance(x, SenalMapeada) else como_real(x)
@@ -1,27 +1,27 @@
-# Módulo para descomprimir ogg en wav EN MASA
-from pydub import AudioSegment
+# Módulo para convertir wav a mp3 EN MASA
 import glob
 
+from exportador import wav_a_mp3
+
 # Variables de rutas
-ruta = "../audios/ogg/"
-nombres_nuevos = "audio_ruidoso"
+ruta = "../audios/wav/"
+ruta_mp3 = "../audios/mp3/"
+
 
-# audio = AudioSegment.from_file("./assets/audios/antes_cordectomia.ogg")
-archivos = glob.glob(ruta + "*.ogg")
+archivos = glob.glob(ruta + "*.wav")
 
 
-def normalizar():
+def convertir():
     """
-    Función que convierte y normaliza automáticamente los audios que se ubiquen en el directorio /audios/ogg
+    Función que convierte a MP3 todos los audios que se ubiquen en el directorio /audios/wav
+    (las muestras van por pipe a ffmpeg, igual que en 1_denoiser.py)
     """
-    contador = 0
     for i in archivos:
-        audio = AudioSegment.from_file(i)
-        audio.export(
-            "../audios/wav/" + nombres_nuevos + f"{contador + 1}.wav", format="wav"
-        )
-        contador += 1
+        nombre = i.replace("\\", "/").split("/")[-1].rsplit(".", 1)[0]
+        error = wav_a_mp3(i, ruta_mp3 + nombre + ".mp3")
+        if error:
+            print(f"[ERROR] {i}: {error}")
 
 
 if __name__ == "__main__":
-    normalizar()
+    convertir()
@@ -0,0 +1,236 @@
+# PSD de Welch incremental: bloques de cualquier número de archivos,
+# promedio y varianza disponibles en cualquier momento, memoria constante.
+#
+# Sirve para perfiles de cohorte: p. ej. una referencia "voz sana"
+# promediada sobre decenas de grabaciones pre-operatorias, sin concatenar
+# todo en RAM. Con un solo archivo da lo mismo que scipy.signal.welch
+# (Hann, 50 % de traslape, detrend 'constant', densidad, un solo lado).
+# Con segmentos de voz (utils.vad) solo se acumulan esos tramos, y ningún
+# segmento de Welch cruza una pausa.
+#
+# Estadísticos que se llevan (Welford/Chan por lotes, por frecuencia):
+#   - por segmento: todos los periodogramas pesan igual
+#   - por archivo:  cada archivo aporta su PSD de Welch como una muestra,
+#                   así una grabación larga no domina a la cohorte
+import numpy as np
+import scipy.fft
+import soundfile as sf
+
+from utils import vad, wav_mmap
+from utils.precision import dtype_real, fft_workers
+
+SEGMENTOS_POR_BLOQUE = 256  # Segmentos transformados a la vez
+BLOQUE_LECTURA = 1 << 20  # Muestras por lectura en agregar_archivo
+
+
+def ventana_hann(n):
+    """
+    Hann periódica, bit a bit igual a scipy.signal.get_window("hann", n),
+    sin importar scipy.signal (~1 s de arranque en frío).
+    """
+    fac = np.linspace(-np.pi, np.pi, n + 1)[:-1]
+    return 0.5 + 0.5 * np.cos(fac)
+
+
+class _Welford:
+    """Media y varianza por frecuencia, fusionando lotes (Chan et al.)."""
+
+    def __init__(self, n_freqs):
+        self.n = 0
+        self.media = np.zeros(n_freqs)
+        self.m2 = np.zeros(n_freqs)
+
+    def agregar_lote(self, muestras):
+        n_b = muestras.shape[0]
+        if n_b == 0:
+            return
+        media_b = muestras.mean(axis=0)
+        m2_b = np.sum((muestras - media_b) ** 2, axis=0)
+        n = self.n + n_b
+        delta = media_b - self.media
+        self.media += delta * (n_b / n)
+        self.m2 += m2_b + delta**2 * (self.n * n_b / n)
+        self.n = n
+
+    def varianza(self, ddof=0):
+        if self.n - ddof <= 0:
+            return np.full_like(self.media, np.nan)
+        return self.m2 / (self.n - ddof)
+
+
+class AcumuladorWelch:
+    """
+    Acumulador de PSD de Welch.
+
+        acc = AcumuladorWelch(fs, nperseg=2048)
+        for bloque in bloques_de_un_archivo:
+            acc.agregar(bloque)
+        acc.cerrar_archivo()          # los segmentos no cruzan archivos
+        freqs, psd = acc.promedio()   # en cualquier momento
+        _, var = acc.varianza()
+    """
+
+    def __init__(self, fs, nperseg, segmentos_por_bloque=SEGMENTOS_POR_BLOQUE):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.paso = nperseg - nperseg // 2
+        self.segmentos_por_bloque = segmentos_por_bloque
+        self.freqs = np.fft.rfftfreq(nperseg, 1.0 / fs)
+
+        self._ventana = ventana_hann(nperseg).astype(dtype_real())
+        # Escala de densidad + doblado de un solo lado (DC y Nyquist no)
+        escala = np.full(
+            len(self.freqs), 2.0 / (fs * np.sum(self._ventana.astype(np.float64) ** 2))
+        )
+        escala[0] /= 2
+        if nperseg % 2 == 0:
+            escala[-1] /= 2
+        self._escala = escala
+
+        self._segmentos = _Welford(len(self.freqs))
+        self._archivos = _Welford(len(self.freqs))
+        self._cola = np.zeros(0, dtype=dtype_real())
+        self._suma_archivo = np.zeros(len(self.freqs))
+        self._n_archivo = 0
+
+    @property
+    def n_segmentos(self):
+        return self._segmentos.n
+
+    @property
+    def n_archivos(self):
+        return self._archivos.n
+
+    def agregar(self, bloque):
+        """Agrega muestras mono consecutivas del archivo actual."""
+        x = np.concatenate([self._cola, np.asarray(bloque, dtype=dtype_real())])
+        if len(x) < self.nperseg:
+            self._cola = x
+            return
+        m_total = (len(x) - self.nperseg) // self.paso + 1
+        for s0 in range(0, m_total, self.segmentos_por_bloque):
+            m = min(self.segmentos_por_bloque, m_total - s0)
+            inicio = s0 * self.paso
+            trozo = x[inicio : inicio + (m - 1) * self.paso + self.nperseg]
+            segs = np.lib.stride_tricks.sliding_window_view(trozo, self.nperseg)
+            segs = segs[:: self.paso][:m]
+            segs = segs - segs.mean(axis=1, keepdims=True)
+            espectro = scipy.fft.rfft(
+                segs * self._ventana, axis=1, workers=fft_workers()
+            )
+            periodogramas = (np.abs(espectro) ** 2).astype(np.float64) * self._escala
+            self._segmentos.agregar_lote(periodogramas)
+            self._suma_archivo += periodogramas.sum(axis=0)
+            self._n_archivo += m
+        # Lo que sobra empieza en el siguiente segmento
+        self._cola = x[m_total * self.paso :].copy()
+
+    def cortar(self):
+        """
+        Descarta la cola sin cerrar el archivo: lo siguiente que se agregue
+        no es contiguo (p. ej. el próximo segmento con voz de utils.vad) y
+        ningún segmento de Welch debe cruzar el hueco.
+        """
+        self._cola = np.zeros(0, dtype=dtype_real())
+
+    def cerrar_archivo(self):
+        """
+        Termina el archivo actual: descarta la cola (menos de un segmento,
+        igual que scipy) y suma su PSD a los estadísticos por archivo.
+        Un archivo más corto que nperseg no aporta nada.
+        """
+        if self._n_archivo > 0:
+            psd_archivo = self._suma_archivo / self._n_archivo
+            self._archivos.agregar_lote(psd_archivo[np.newaxis, :])
+        self._cola = np.zeros(0, dtype=dtype_real())
+        self._suma_archivo[:] = 0
+        self._n_archivo = 0
+
+    def agregar_archivo(self, ruta, bloque=BLOQUE_LECTURA, segmentos=None):
+        """
+        Recorre un archivo por bloques (memory-map si es WAV PCM, soundfile
+        si no) y lo cierra. Todos los archivos deben tener la misma fs.
+        Con segmentos ([inicio, fin) en muestras, utils.vad) solo se leen
+        esos tramos.
+        """
+        senal = wav_mmap.abrir(ruta)
+        fs = senal.samplerate if senal is not None else sf.info(ruta).samplerate
+        if fs != self.fs:
+            raise ValueError(
+                f"{ruta}: fs={fs} Hz, el acumulador es de {self.fs} Hz "
+                "(normaliza primero con 0_normalizar.py)"
+            )
+        for inicio, fin in [(0, None)] if segmentos is None else segmentos:
+            if senal is not None:
+                fin = senal.frames if fin is None else fin
+                bloques = (
+                    senal[i : min(i + bloque, fin)] for i in range(inicio, fin, bloque)
+                )
+            else:
+                bloques = (
+                    b.mean(axis=1)
+                    for b in sf.blocks(
+                        ruta,
+                        blocksize=bloque,
+                        start=inicio,
+                        stop=fin,
+                        dtype=dtype_real().__name__,
+                        always_2d=True,
+                    )
+                )
+            for b in bloques:
+                self.agregar(b)
+            self.cortar()
+        self.cerrar_archivo()
+
+    def _stats(self, por_archivo):
+        stats = self._archivos if por_archivo else self._segmentos
+        if stats.n == 0:
+            raise ValueError("El acumulador está vacío (ningún segmento completo)")
+        return stats
+
+    def promedio(self, por_archivo=False):
+        """(freqs, psd): promedio por segmento o por archivo."""
+        return self.freqs, self._stats(por_archivo).media.copy()
+
+    def varianza(self, por_archivo=False, ddof=0):
+        """(freqs, varianza) de los periodogramas o de las PSD por archivo."""
+        return self.freqs, self._stats(por_archivo).varianza(ddof)
+
+
+def welch(senal, fs, nperseg, segmentos=None):
+    """
+    Equivalente a scipy.signal.welch(x, fs, nperseg=nperseg) para un solo
+    archivo (SenalMapeada o arreglo), recorrido por bloques. Con segmentos
+    ([inicio, fin) en muestras, utils.vad) promedia solo esos tramos; si
+    ninguno alcanza nperseg, usa todo el audio.
+    """
+    nperseg = min(nperseg, len(senal))
+    acumulador = AcumuladorWelch(fs, nperseg)
+    for inicio, fin in [(0, len(senal))] if segmentos is None else segmentos:
+        for s0 in range(inicio, fin, BLOQUE_LECTURA):
+            acumulador.agregar(senal[s0 : min(s0 + BLOQUE_LECTURA, fin)])
+        acumulador.cortar()
+    if acumulador.n_segmentos == 0 and segmentos is not None:
+        return welch(senal, fs, nperseg)
+    freqs, psd = acumulador.promedio()
+    return freqs, psd.astype(dtype_real())
+
+
+def perfil_cohorte(rutas, nperseg, fs=None, con_vad=False):
+    """
+    Acumula todos los archivos en una pasada. Si fs es None se toma la del
+    primer archivo. Con con_vad solo entran los segmentos con voz de cada
+    archivo (su índice de utils.vad). Regresa el AcumuladorWelch listo
+    para consultar.
+    """
+    rutas = list(rutas)
+    if not rutas:
+        raise ValueError("Se necesita al menos un archivo")
+    if fs is None:
+        fs = sf.info(rutas[0]).samplerate
+    acumulador = AcumuladorWelch(fs, nperseg)
+    for ruta in rutas:
+        segmentos = vad.indice(ruta)["segmentos"] if con_vad else None
+        acumulador.agregar_archivo(ruta, segmentos=segmentos)
+    return acumulador
@@ -0,0 +1,130 @@
+# Ganancia de Wiener aplicada directo sobre la STFT compleja, en una pasada
+#
+# Antes, denoise_audio hacía |Z|, angle(Z), |Z|², la resta, la división,
+# magnitud * ganancia y exp(1j * fase): siete arreglos del tamaño del
+# espectrograma, y la velocidad la ponía el ancho de banda de memoria.
+# Como |Z| * exp(1j * angle(Z)) == Z, basta con Z * ganancia(|Z|²), que
+# aquí se calcula muestra por muestra sin separar magnitud y fase:
+#
+#   limpia   = max(|Z|² - alpha * ruido, 0)
+#   ganancia = limpia / (limpia + ruido + 1e-10)
+#   salida   = Z * ganancia
+#
+# Con numba (requirements.txt) es un kernel compilado, paralelo por filas
+# (utils.wiener_numba, importado en la primera llamada: numba tarda en
+# cargar), que escribe en su lugar si Z se puede escribir. Sin numba (o con
+# CORDECTOMIA_NUMBA=0) se usa NumPy con operaciones in-place: dos
+# temporales reales en lugar de siete. Ambas rutas dan lo mismo que la
+# fórmula de 1_denoiser.wiener_gain (error relativo ~1e-16).
+#
+# Hilos (init.py limpia PRE y POST en un ThreadPoolExecutor): si está
+# instalada, numba elige TBB por defecto, y sus hilos lanzados desde un
+# hilo que no es el principal dejan colgado el proceso al salir. Se fija
+# la capa "workqueue" (siempre disponible; se respeta NUMBA_THREADING_LAYER
+# si el usuario la define), que no admite llamadas simultáneas: por eso
+# cada llamada a un kernel pasa por _CANDADO. Cada una ya usa todos los
+# núcleos, así que serializar no quita paralelismo.
+import os
+import threading
+
+import numpy as np
+
+_ENV_NUMBA = "CORDECTOMIA_NUMBA"  # "0" para forzar la ruta NumPy
+PISO = 1e-10  # Evita 0/0 en la ganancia (mismo que wiener_gain)
+_CANDADO = threading.Lock()
+
+_kernels = None
+
+
+def _kernels_numba():
+    """Módulo utils.wiener_numba, o None sin numba o con CORDECTOMIA_NUMBA=0."""
+    global _kernels
+    if os.environ.get(_ENV_NUMBA, "1") == "0":
+        return None
+    if _kernels is None:
+        try:
+            from utils import wiener_numba
+        except ImportError:  # numba es opcional: sin él se usa NumPy
+            wiener_numba = False
+        _kernels = wiener_numba
+    return _kernels or None
+
+
+def usa_numba():
+    return _kernels_numba() is not None
+
+
+def _como_2d(ruido, Z):
+    """Ruido con las reglas de broadcasting de NumPy, llevado a 2-D."""
+    ruido = np.asarray(ruido)
+    ruido = ruido.reshape((1,) * (Z.ndim - ruido.ndim) + ruido.shape)
+    for eje in range(2):
+        if ruido.shape[eje] not in (1, Z.shape[eje]):
+            raise ValueError(
+                f"El ruido {ruido.shape} no es compatible con la STFT {Z.shape}"
+            )
+    return ruido
+
+
+def _en_orden_de_memoria(*arreglos):
+    """
+    Si la STFT está en orden Fortran (p. ej. la transpuesta que regresa
+    scipy), el kernel recorre las vistas transpuestas: el ciclo interno
+    siempre va sobre memoria contigua.
+    """
+    Z = arreglos[0]
+    if Z.flags.f_contiguous and not Z.flags.c_contiguous:
+        return [a.T for a in arreglos]
+    return list(arreglos)
+
+
+def _salida_para(Z, salida):
+    if salida is not None:
+        return salida
+    # Los aciertos de la caché espectral son memmaps de solo lectura
+    return Z if Z.flags.writeable else np.empty_like(Z)
+
+
+def aplicar_ganancia(Z, ruido, alpha, salida=None):
+    """
+    Z * ganancia de Wiener(|Z|², ruido) sin arreglos intermedios del
+    tamaño de Z. 'ruido' es la PSD del ruido, broadcastable a Z (por
+    frecuencia o por trama). Escribe en 'salida' (default: sobre Z si es
+    escribible) y la regresa.
+    """
+    Z = np.asarray(Z)
+    if Z.ndim != 2:
+        raise ValueError(f"Se esperaba una STFT 2-D, llegó {Z.shape}")
+    ruido = _como_2d(ruido, Z)
+    salida = _salida_para(Z, salida)
+
+    kernels = _kernels_numba()
+    if kernels is not None:
+        z, r, s = _en_orden_de_memoria(Z, ruido, salida)
+        with _CANDADO:
+            kernels.ganancia(z, r, alpha, s)
+        return salida
+
+    ganancia = potencia(Z)
+    ganancia -= alpha * ruido
+    np.maximum(ganancia, 0, out=ganancia)
+    denominador = ganancia + ruido
+    denominador += PISO
+    ganancia /= denominador
+    np.multiply(Z, ganancia, out=salida)
+    return salida
+
+
+def potencia(Z):
+    """|Z|² como arreglo real nuevo, sin pasar por np.abs."""
+    Z = np.asarray(Z)
+    salida = np.empty_like(Z, dtype=Z.real.dtype)
+    kernels = _kernels_numba()
+    if kernels is not None and Z.ndim == 2:
+        z, s = _en_orden_de_memoria(Z, salida)
+        with _CANDADO:
+            kernels.potencia(z, s)
+        return salida
+    np.multiply(Z.real, Z.real, out=salida)
+    salida += Z.imag * Z.imag
+    return salida
@@ -0,0 +1,37 @@
+# Kernels numba de utils.wiener
+#
+# Van en su propio módulo porque "import numba" cuesta ~1.5 s: wiener lo
+# importa en la primera llamada que de verdad usa un kernel, así que
+# quien carga 1_denoiser sin filtrar nada (o con CORDECTOMIA_NUMBA=0) no
+# lo paga. Ver en wiener.py la fórmula y por qué se fija la capa de hilos.
+import os
+
+import numba
+
+from utils.wiener import PISO
+
+if "NUMBA_THREADING_LAYER" not in os.environ:
+    numba.config.THREADING_LAYER = "workqueue"
+
+
+@numba.njit(parallel=True, cache=True)
+def ganancia(Z, ruido, alpha, salida):
+    filas, columnas = Z.shape
+    # Paso 0 sobre un eje de tamaño 1 = broadcasting
+    paso_fila = 1 if ruido.shape[0] != 1 else 0
+    paso_columna = 1 if ruido.shape[1] != 1 else 0
+    for i in numba.prange(filas):
+        for j in range(columnas):
+            z = Z[i, j]
+            n = ruido[i * paso_fila, j * paso_columna]
+            limpia = max(z.real * z.real + z.imag * z.imag - alpha * n, 0.0)
+            salida[i, j] = z * (limpia / (limpia + n + PISO))
+
+
+@numba.njit(parallel=True, cache=True)
+def potencia(Z, salida):
+    filas, columnas = Z.shape
+    for i in numba.prange(filas):
+        for j in range(columnas):
+            z = Z[i, j]
+            salida[i, j] = z.real * z.real + z.imag * z.imag
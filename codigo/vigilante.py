@@ -0,0 +1,428 @@
+# Vigilante de carpeta: procesa cada audio que llega a data/0_raw/ogg
+#
+#   python cordectomia.py watch               (hasta Ctrl+C / SIGTERM)
+#   python cordectomia.py watch --una-vez     (lo que haya y termina)
+#   python cordectomia.py watch --estado      (profundidad de la cola)
+#
+# Cada OGG nuevo o modificado es un trabajo en la cola persistente
+# (utils/cola.py, data/cola.json) que recorre:
+#   normalizar (0_normalizar) -> denoise (1_denoiser) -> analisis (2_cordie,
+#   fila en data/3_analysis/descriptores.csv del WAV limpio)
+# Las etapas corren en un pool de procesos; el manifiesto, la tabla de
+# descriptores y la cola los escribe solo este proceso. Una etapa que el
+# manifiesto da por hecha se salta, así que reiniciar el vigilante retoma
+# lo pendiente sin reprocesar nada.
+#
+# Se usa sondeo (os.scandir cada --intervalo s) en lugar de inotify: no
+# agrega dependencias y funciona igual en carpetas de red. Un archivo
+# entra a la cola cuando lleva ESTABLE_SEGUNDOS sin cambiar (copia o
+# descarga terminada).
+#
+# Contrapresión: nunca hay más trabajos en vuelo que procesos en el pool,
+# y no se admiten archivos nuevos mientras la cola tenga --max-cola
+# trabajos activos; el resto espera en la carpeta al siguiente sondeo.
+import importlib
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import cola as cola_trabajos
+from utils.manifiesto import DIR_DATA, Manifiesto, ruta_relativa
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_ORIGEN = os.path.join(DIR_DATA, "0_raw", "ogg")
+EXTENSION = ".ogg"  # Lo mismo que busca 0_normalizar
+
+INTERVALO = 5.0  # s entre sondeos de la carpeta
+ESTABLE_SEGUNDOS = 2.0  # s sin cambios antes de admitir un archivo
+MAX_COLA = 32  # Trabajos activos (pendientes + en proceso) como máximo
+MAX_INTENTOS = 3
+ESTADISTICAS_SEGUNDOS = 30.0  # Cada cuánto se imprime la línea de estado
+TIC = 1.0  # s máximos de espera por vuelta (para atender señales)
+
+
+def _modulo(nombre):
+    """Importa (la primera vez) el módulo de una etapa."""
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    return importlib.import_module(nombre)
+
+
+# --- EN LOS PROCESOS DEL POOL ---
+
+
+def _inicializar_trabajador():
+    # Ctrl+C lo atiende el vigilante: los hijos terminan lo que tienen
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _trabajar(etapa, entrada, salida, streaming=False, noise_mode="percentile"):
+    """Una etapa de un trabajo. Regresa un dict con ok/error y resultados."""
+    inicio = time.perf_counter()
+    resultado = {}
+    try:
+        if etapa == "normalizar":
+            ok, error = _modulo("0_normalizar").convertir_archivo(entrada, salida)
+        elif etapa == "denoise":
+            r = _modulo("1_denoiser")._batch_worker(entrada, streaming, noise_mode)
+            ok, error = r["ok"], r["error"]
+            resultado["segundos_audio"] = r["segundos_audio"]
+        else:
+            _, fila = _modulo("2_cordie")._descriptores_archivo(entrada, salida)
+            ok, error = fila is not None, "no se pudo cargar"
+            resultado["fila"] = fila
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+    return {
+        "ok": ok,
+        "error": "" if ok else error,
+        "segundos_proceso": time.perf_counter() - inicio,
+        **resultado,
+    }
+
+
+# --- EN EL VIGILANTE ---
+
+
+def _huella(entrada):
+    st = entrada.stat()
+    return {"mtime_ns": st.st_mtime_ns, "tamano": st.st_size}
+
+
+class Vigilante:
+    """Sondeo de la carpeta + despacho de la cola al pool."""
+
+    def __init__(
+        self,
+        dir_origen=DIR_ORIGEN,
+        workers=None,
+        intervalo=INTERVALO,
+        max_cola=MAX_COLA,
+        max_intentos=MAX_INTENTOS,
+        streaming=False,
+        noise_mode="percentile",
+        ruta_cola=cola_trabajos.RUTA_COLA,
+    ):
+        self.dir_origen = dir_origen
+        self.workers = workers or os.cpu_count() or 1
+        self.intervalo = intervalo
+        self.max_cola = max_cola
+        self.max_intentos = max_intentos
+        self.streaming = streaming
+        self.noise_mode = noise_mode
+        self.cola = cola_trabajos.ColaTrabajos(ruta_cola)
+        self.manifiesto = Manifiesto()
+        self.en_vuelo = {}  # futuro -> (clave, datos para registrar)
+        self.esperando = 0  # Archivos listos que no cupieron en la cola
+        self.detener = threading.Event()
+        self.sucio = False
+        self.norm = _modulo("0_normalizar")
+        self.den = _modulo("1_denoiser")
+        self.cordie = _modulo("2_cordie")
+
+    # --- Sondeo ---
+
+    def escanear(self):
+        """Admite los OGG nuevos o modificados que ya terminaron de llegar."""
+        try:
+            entradas = sorted(
+                (e for e in os.scandir(self.dir_origen) if e.name.endswith(EXTENSION)),
+                key=lambda e: e.name,
+            )
+        except FileNotFoundError:
+            return
+        conteo = self.cola.conteo()
+        activos = conteo["pendiente"] + conteo["en_proceso"]
+        ahora = time.time()
+        self.esperando = 0
+        for entrada in entradas:
+            try:
+                huella = _huella(entrada)
+            except FileNotFoundError:
+                continue
+            clave = ruta_relativa(entrada.path)
+            t = self.cola.trabajos.get(clave)
+            if self.cola.conoce(clave, huella) or (t and t["estado"] == "en_proceso"):
+                continue  # Ya está (o cambió a media etapa: el siguiente sondeo)
+            if ahora - huella["mtime_ns"] / 1e9 < ESTABLE_SEGUNDOS:
+                continue  # Todavía se está escribiendo
+            reactiva = t is not None and t["estado"] == "pendiente"
+            if not reactiva and activos >= self.max_cola:
+                self.esperando += 1
+                continue
+            self.cola.agregar(clave, huella)
+            activos += not reactiva
+            self.sucio = True
+            print(f" [COLA] + {entrada.name}")
+
+    # --- Despacho ---
+
+    def _listo(self, clave):
+        """Etapa actual resuelta sin el pool (el manifiesto ya la tiene)."""
+        self.cola.avanzar(clave)
+        self.sucio = True
+        if self.cola.trabajos[clave]["estado"] == "hecho":
+            print(f" [HECHO] {os.path.basename(clave)}")
+
+    def _fallar(self, clave, error):
+        t = self.cola.trabajos[clave]
+        reintenta = self.cola.fallar(clave, error, self.max_intentos)
+        self.sucio = True
+        nombre = os.path.basename(clave)
+        if reintenta:
+            print(
+                f" [REINTENTO {t['intentos']}/{self.max_intentos}] {nombre} "
+                f"({t['etapa']}): {error}"
+            )
+        else:
+            print(f" [ERROR] {nombre} ({t['etapa']}): {error}")
+
+    def _preparar(self, clave):
+        """
+        Resuelve la etapa actual del trabajo: None si no hizo falta el pool
+        (o falló aquí), o (argumentos de _trabajar, datos para registrar).
+        """
+        t = self.cola.trabajos[clave]
+        ogg = os.path.join(DIR_DATA, clave)
+
+        if t["etapa"] == "normalizar":
+            if not os.path.exists(ogg):
+                self.cola.fallar(clave, "el archivo ya no existe", 1)
+                self.sucio = True
+                return None
+            reservados = {
+                o["wav"]
+                for o in self.cola.trabajos.values()
+                if o["estado"] == "en_proceso" and o["etapa"] == "normalizar"
+            }
+            trabajos, omitidos = self.norm.asignar_nombres(
+                [ogg], self.manifiesto, reservados=reservados
+            )
+            if omitidos:
+                t["wav"] = omitidos[0][1]
+                self._listo(clave)
+                return None
+            _, t["wav"], huella = trabajos[0]
+            destino = os.path.join(self.norm.DIR_DESTINO, t["wav"])
+            return ("normalizar", ogg, destino), {"huella": huella}
+
+        entrada = os.path.join(self.den.INPUT_DIR, t["wav"])
+        if t["etapa"] == "denoise":
+            params = self.den.manifest_params(self.noise_mode)
+            salidas = self.den.salidas_en_disco(entrada)
+            if self.manifiesto.esta_al_dia(
+                "denoiser", ruta_relativa(entrada), [entrada], salidas, params
+            ):
+                self._listo(clave)
+                return None
+            args = ("denoise", entrada, None, self.streaming, self.noise_mode)
+            return args, {"params": params}
+
+        # analisis: descriptores del WAV limpio (el MP3 no hace falta)
+        limpio = self.den.output_paths(entrada)[0]
+        dir_salida = self.cordie.DIR_DATA_OUT
+        previas = self.cordie.leer_previas(dir_salida)
+        if os.path.exists(limpio) and self.cordie._esta_al_dia(
+            previas.get(ruta_relativa(limpio)), limpio, dir_salida
+        ):
+            self._listo(clave)
+            return None
+        return ("analisis", limpio, os.path.join(dir_salida, "tramas")), {
+            "previas": previas
+        }
+
+    def despachar(self, pool):
+        """Llena los lugares libres del pool con los trabajos listos."""
+        ocupados = {clave for clave, _ in self.en_vuelo.values()}
+        while len(self.en_vuelo) < self.workers and not self.detener.is_set():
+            listos = [c for c in self.cola.listos() if c not in ocupados]
+            if not listos:
+                return
+            clave = listos[0]
+            preparado = self._preparar(clave)
+            if preparado is None:
+                continue  # Avanzó (o falló) sin el pool: volver a mirar
+            args, datos = preparado
+            self.cola.iniciar(clave)
+            self.sucio = True
+            ocupados.add(clave)
+            futuro = pool.submit(_trabajar, *args)
+            self.en_vuelo[futuro] = (clave, {"args": args, **datos})
+
+    def terminar(self, futuro):
+        """Registra el resultado de una etapa que regresó del pool."""
+        clave, datos = self.en_vuelo.pop(futuro)
+        try:
+            r = futuro.result()
+        except Exception as e:  # BrokenProcessPool, etc.
+            r = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if not r["ok"]:
+            self._fallar(clave, r["error"])
+            return isinstance(futuro.exception(), BrokenProcessPool)
+
+        etapa, entrada, salida = datos["args"][:3]
+        if etapa == "normalizar":
+            salidas = [salida]
+        elif etapa == "denoise":
+            salidas = self.den.output_paths(entrada)[:1]  # Sin ffmpeg no hay MP3
+        else:
+            salidas = []
+        faltan = [os.path.basename(p) for p in salidas if not os.path.exists(p)]
+        if faltan:
+            # No registrar ni avanzar: se reintenta esta misma etapa
+            self._fallar(clave, f"faltan salidas: {', '.join(faltan)}")
+            return False
+
+        if etapa == "normalizar":
+            self.manifiesto.registrar(
+                "normalizar",
+                clave,
+                [entrada],
+                [salida],
+                huellas={entrada: datos["huella"]},
+            )
+            self.manifiesto.guardar()
+        elif etapa == "denoise":
+            self.manifiesto.registrar(
+                "denoiser",
+                ruta_relativa(entrada),
+                [entrada],
+                self.den.salidas_en_disco(entrada),
+                datos["params"],
+            )
+            self.manifiesto.guardar()
+            self.cola.trabajos[clave]["segundos_audio"] = r["segundos_audio"]
+        else:
+            self.cordie.guardar_descriptores([r["fila"]], previas=datos["previas"])
+        print(
+            f" [OK] {os.path.basename(clave)} {etapa} "
+            f"({r['segundos_proceso']:.2f} s)"
+        )
+        self._listo(clave)
+        return False
+
+    # --- Estado ---
+
+    def linea_estado(self):
+        foto = self.cola.foto(
+            en_vuelo=len(self.en_vuelo), workers=self.workers, esperando=self.esperando
+        )
+        self.sucio = True
+        etapas = ", ".join(f"{e} {n}" for e, n in foto["por_etapa"].items())
+        print(
+            f" [ESTADO] pendientes {foto['pendiente']} ({etapas}) | "
+            f"en proceso {foto['en_proceso']}/{self.workers} | "
+            f"hechos {foto['hecho']} | errores {foto['error']} | "
+            f"esperando {self.esperando} | "
+            f"{foto['archivos_por_minuto']:.1f} archivos/min | "
+            f"{foto['segundos_audio_por_segundo']:.2f} s audio/s"
+        )
+
+    def _ocioso(self):
+        conteo = self.cola.conteo()
+        return (
+            not self.en_vuelo
+            and conteo["pendiente"] == 0
+            and conteo["en_proceso"] == 0
+            and self.esperando == 0
+        )
+
+    def correr(self, una_vez=False):
+        """
+        Bucle principal. Con una_vez=True termina cuando no queda nada
+        (reintentos incluidos). Regresa el número de trabajos en error.
+        """
+        print(
+            f"--- Vigilando {self.dir_origen} ({self.workers} procesos, "
+            f"cola máx. {self.max_cola}) ---"
+        )
+        if self.cola.recuperados:
+            print(f" [COLA] {self.cola.recuperados} trabajos retomados")
+
+        def parar(signum, frame):
+            if self.detener.is_set():
+                raise KeyboardInterrupt  # Segunda señal: salir ya
+            print(" [!] Deteniendo: termino lo que está en proceso...")
+            self.detener.set()
+
+        anteriores = {
+            s: signal.signal(s, parar) for s in (signal.SIGINT, signal.SIGTERM)
+        }
+        pool = ProcessPoolExecutor(self.workers, initializer=_inicializar_trabajador)
+        proximo_sondeo = proximo_estado = 0.0
+        try:
+            while True:
+                ahora = time.monotonic()
+                if ahora >= proximo_sondeo and not self.detener.is_set():
+                    self.escanear()
+                    proximo_sondeo = ahora + self.intervalo
+                self.despachar(pool)
+
+                if self.en_vuelo:
+                    hechos, _ = wait(
+                        list(self.en_vuelo), timeout=TIC, return_when=FIRST_COMPLETED
+                    )
+                    roto = any([self.terminar(f) for f in hechos])
+                    if roto:
+                        # Un hijo murió (p. ej. sin memoria): pool nuevo
+                        for f in list(self.en_vuelo):
+                            self.terminar(f)
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(
+                            self.workers, initializer=_inicializar_trabajador
+                        )
+                else:
+                    self.detener.wait(TIC)
+
+                if self.sucio:
+                    self.cola.guardar()
+                    self.sucio = False
+                if time.monotonic() >= proximo_estado:
+                    self.linea_estado()
+                    proximo_estado = time.monotonic() + ESTADISTICAS_SEGUNDOS
+                if self.detener.is_set() and not self.en_vuelo:
+                    break
+                if una_vez and self._ocioso():
+                    break
+        finally:
+            pool.shutdown(wait=not self.en_vuelo, cancel_futures=True)
+            for s, h in anteriores.items():
+                signal.signal(s, h)
+            self.linea_estado()
+            self.cola.cerrar()
+        return self.cola.conteo()["error"]
+
+
+def vigilar(una_vez=False, **opciones):
+    """Atajo: crea el vigilante y corre. Regresa el número de errores."""
+    return Vigilante(**opciones).correr(una_vez=una_vez)
+
+
+def imprimir_estado(ruta_cola=cola_trabajos.RUTA_COLA):
+    """Resumen de la cola (se puede llamar con el vigilante corriendo)."""
+    estado = cola_trabajos.leer_estadisticas(ruta_cola)
+    if estado is None:
+        print(f"No hay cola en: {ruta_cola}")
+        return
+    conteo, foto = estado["conteo"], estado["foto"]
+    etapas = ", ".join(f"{e} {n}" for e, n in conteo["por_etapa"].items())
+    print(
+        f"Pendientes: {conteo['pendiente']} ({etapas})  En proceso: "
+        f"{conteo['en_proceso']}  Hechos: {conteo['hecho']}  "
+        f"Errores: {conteo['error']}"
+    )
+    if foto:
+        hace = time.time() - foto["instante"]
+        print(
+            f"Última foto hace {hace:.0f} s: {foto['archivos_por_minuto']:.1f} "
+            f"archivos/min, {foto['segundos_audio_por_segundo']:.2f} s audio/s, "
+            f"{foto.get('esperando', 0)} esperando lugar en la cola"
+        )
+    cola = cola_trabajos.ColaTrabajos(ruta_cola, bloquear=False)
+    for clave, t in cola.trabajos.items():
+        if t["estado"] == "error":
+            print(f" [ERROR] {clave} ({t['etapa']}): {t['error']}")
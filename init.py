@@ -1,4 +1,203 @@
 # Dentro de estre script vamos a ejecutar en orden:
+# 0. Normalizar (OGG -> mono 44.1 kHz)
 # 1. noisecanceling
 # 2. Cordie
 # 3. Tomie
+#
+# Todo pasa en memoria: cada etapa recibe el arreglo numpy de la anterior,
+# sin escribir ni releer WAVs intermedios. Solo se escriben a disco los
+# artefactos finales que se pidan (audio restaurado, gráficas, limpios).
+# Las etapas independientes corren al mismo tiempo (p. ej. las gráficas de
+# Cordie mientras Tomie restaura).
+#
+# Con --traza cada etapa deja su propio registro ("etapa": "pipeline",
+# "fase": ...) con los pasos internos de la etapa: la pila de la traza es
+# por hilo, así que un solo registro para todo el par no vería lo que
+# pasa en los hilos del pool.
+import argparse
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIR_CODIGO = os.path.join(BASE_DIR, "codigo")
+DIR_OUTPUT = os.path.join(BASE_DIR, "data", "2_output")
+
+# Los scripts de etapa viven en codigo/ y empiezan con número, así que se
+# importan con importlib en lugar de 'import'
+sys.path.insert(0, DIR_CODIGO)
+
+from utils import traza  # noqa: E402
+from utils.manifiesto import ruta_relativa  # noqa: E402
+from utils.precision import agregar_argumentos, configurar_desde_args  # noqa: E402
+
+
+def cargar_etapas():
+    """Importa los módulos de cada etapa (matplotlib sin ventana)."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    return {
+        "normalizar": importlib.import_module("0_normalizar"),
+        "denoiser": importlib.import_module("1_denoiser"),
+        "cordie": importlib.import_module("2_cordie"),
+        "tomie": importlib.import_module("3_tomie"),
+    }
+
+
+def _etapa(fase, archivo, funcion, *args):
+    """Ejecuta una etapa midiendo su tiempo (con --traza, en su registro)."""
+    inicio = time.perf_counter()
+    with traza.archivo("pipeline", ruta_relativa(archivo), fase=fase):
+        with traza.paso(fase):
+            resultado = funcion(*args)
+    nombre = f"{fase} {os.path.basename(archivo)}"
+    print(f" [PIPELINE] {nombre}: {time.perf_counter() - inicio:.2f} s")
+    return resultado
+
+
+def ejecutar_pipeline(
+    archivo_pre,
+    archivo_post,
+    denoise=True,
+    graficas=False,
+    guardar_restaurado=True,
+    guardar_limpios=False,
+    dir_salida=DIR_OUTPUT,
+):
+    """
+    Pipeline completo para un par (Sano, Post-cordectomía).
+
+    Grafo de dependencias:
+        normalizar(pre) ─> denoise(pre) ─┬─> graficas (Cordie)
+        normalizar(post) ─> denoise(post)┴─> restauración (Tomie)
+
+    Regresa un dict con los buffers finales y las rutas escritas.
+    """
+    etapas = cargar_etapas()
+    norm = etapas["normalizar"]
+    den = etapas["denoiser"]
+    cordie = etapas["cordie"]
+    tomie = etapas["tomie"]
+
+    def preparar(archivo):
+        datos, fs = _etapa("normalizar", archivo, norm.normalizar_en_memoria, archivo)
+        if denoise:
+            limpio = _etapa("denoise", archivo, den.denoise_audio, datos, fs)
+            # La ISTFT agrega relleno al final: volver a la duración original
+            datos = limpio[: len(datos)]
+        return datos, fs
+
+    escritos = []
+    inicio = time.perf_counter()
+
+    # Suficientes hilos para que ninguna etapa espere por un hueco en el pool
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        f_pre = pool.submit(preparar, archivo_pre)
+        f_post = pool.submit(preparar, archivo_post)
+        (y_pre, sr_pre), (y_post, sr_post) = f_pre.result(), f_post.result()
+
+        f_graficas = None
+        if graficas:
+            os.makedirs(cordie.DIR_IMG_OUT, exist_ok=True)
+            f_graficas = pool.submit(
+                _etapa,
+                "graficas",
+                archivo_post,
+                cordie.graficar_analisis,
+                y_pre,
+                sr_pre,
+                y_post,
+                sr_post,
+            )
+        f_restaurado = pool.submit(
+            _etapa,
+            "restauracion",
+            archivo_post,
+            tomie.restaurar_senal,
+            y_pre,
+            sr_pre,
+            y_post,
+            sr_post,
+        )
+
+        y_restaurado = f_restaurado.result()
+        if f_graficas is not None:
+            escritos.extend(f_graficas.result())
+
+    # --- Solo artefactos finales a disco ---
+    os.makedirs(dir_salida, exist_ok=True)
+    base_post = os.path.splitext(os.path.basename(archivo_post))[0]
+    base_pre = os.path.splitext(os.path.basename(archivo_pre))[0]
+
+    with traza.archivo("pipeline", ruta_relativa(archivo_post), fase="exportar"):
+        if guardar_restaurado:
+            ruta = os.path.join(dir_salida, f"{base_post}_RESTAURADO.wav")
+            den.save_audio_wav(ruta, y_restaurado, sr_post)
+            escritos.append(ruta)
+
+        if guardar_limpios and denoise:
+            for base, y, sr in [
+                (base_pre, y_pre, sr_pre),
+                (base_post, y_post, sr_post),
+            ]:
+                ruta = os.path.join(dir_salida, f"{base}_clean.wav")
+                den.save_audio_wav(ruta, y, sr)
+                escritos.append(ruta)
+
+    print(f" [PIPELINE] Total: {time.perf_counter() - inicio:.2f} s")
+    for ruta in escritos:
+        print(f"    -> {ruta}")
+
+    return {
+        "pre": (y_pre, sr_pre),
+        "post": (y_post, sr_post),
+        "restaurado": (y_restaurado, sr_post),
+        "escritos": escritos,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pipeline completo en memoria: normalizar -> denoise -> Cordie/Tomie"
+    )
+    parser.add_argument("pre", help="Audio SANO / referencia (OGG, WAV, FLAC...)")
+    parser.add_argument("post", help="Audio POST-cordectomía a restaurar")
+    parser.add_argument(
+        "--sin-denoise", action="store_true", help="Saltar la reducción de ruido"
+    )
+    parser.add_argument(
+        "--graficas",
+        action="store_true",
+        help="Guardar las gráficas de Cordie en docs/reporte/imagenes",
+    )
+    parser.add_argument(
+        "--guardar-limpios",
+        action="store_true",
+        help="Guardar también los WAV sin ruido de pre y post",
+    )
+    parser.add_argument(
+        "--no-guardar-restaurado",
+        action="store_true",
+        help="No escribir el WAV restaurado (solo medir / graficar)",
+    )
+    parser.add_argument("--salida", default=DIR_OUTPUT, help="Carpeta de salida")
+    agregar_argumentos(parser)
+    traza.agregar_argumentos(parser)
+    args = parser.parse_args()
+    configurar_desde_args(args)
+    traza.configurar_desde_args(args)
+
+    print("--- PIPELINE CORDECTOMÍA (en memoria) ---")
+    ejecutar_pipeline(
+        args.pre,
+        args.post,
+        denoise=not args.sin_denoise,
+        graficas=args.graficas,
+        guardar_restaurado=not args.no_guardar_restaurado,
+        guardar_limpios=args.guardar_limpios,
+        dir_salida=args.salida,
+    )
+    print("--- FIN ---")